@@ -0,0 +1,254 @@
+"""
+Adaptive concurrency for the prediction runner.
+
+Instead of a fixed `--max_concurrency`, a controller samples the host (CPU and
+memory from /proc, disk busy time from /proc/diskstats) and the Docker daemon
+(ping latency) every few seconds and resizes the semaphore that admits
+predictions, AIMD-style: one more slot while the host is healthy and every slot
+is in use, the limit multiplied down as soon as a resource is saturated or a
+container bootstrap times out. Every adjustment is logged with its reason.
+"""
+
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from .docker_client import get_docker_client
+
+
+class ResizableSemaphore:
+    """Counting semaphore whose limit can change while it is in use."""
+
+    def __init__(self, limit: int):
+        self._limit = limit
+        self._in_use = 0
+        self._cond = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        return self._limit
+
+    @property
+    def in_use(self) -> int:
+        return self._in_use
+
+    def acquire(self) -> None:
+        with self._cond:
+            while self._in_use >= self._limit:
+                self._cond.wait()
+            self._in_use += 1
+
+    def release(self) -> None:
+        with self._cond:
+            self._in_use -= 1
+            self._cond.notify()
+
+    def resize(self, limit: int) -> None:
+        """Change the limit; holders above a lowered limit finish normally, new acquirers wait."""
+        with self._cond:
+            self._limit = limit
+            self._cond.notify_all()
+
+
+@dataclass
+class LoadSample:
+    cpu: float | None = None
+    memory: float | None = None
+    disk_busy: float | None = None
+    docker_latency_s: float | None = None
+
+    def describe(self) -> str:
+        parts = []
+        for name, value, fmt in (
+            ("cpu", self.cpu, "{:.0%}"),
+            ("mem", self.memory, "{:.0%}"),
+            ("disk", self.disk_busy, "{:.0%}"),
+            ("docker", self.docker_latency_s, "{:.2f}s"),
+        ):
+            parts.append(f"{name} {fmt.format(value) if value is not None else 'n/a'}")
+        return ", ".join(parts)
+
+
+def _read_cpu_times() -> tuple[int, int] | None:
+    try:
+        with open("/proc/stat", "r") as f:
+            fields = [int(x) for x in f.readline().split()[1:]]
+    except (OSError, ValueError):
+        return None
+    # idle + iowait count as idle
+    idle = fields[3] + (fields[4] if len(fields) > 4 else 0)
+    return sum(fields), idle
+
+
+def _read_memory_used() -> float | None:
+    try:
+        meminfo = {}
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                meminfo[key] = int(value.split()[0])
+        return 1 - meminfo["MemAvailable"] / meminfo["MemTotal"]
+    except (OSError, ValueError, KeyError, ZeroDivisionError):
+        return None
+
+
+def _read_disk_busy_ms() -> dict[str, int] | None:
+    """Milliseconds each physical disk has spent doing I/O, keyed by device."""
+    try:
+        busy = {}
+        with open("/proc/diskstats", "r") as f:
+            for line in f:
+                fields = line.split()
+                name = fields[2]
+                # whole physical devices only: partitions are not in /sys/block, loop/ram/dm are virtual
+                if name.startswith(("loop", "ram", "dm-", "zram")) or not os.path.isdir(f"/sys/block/{name}"):
+                    continue
+                busy[name] = int(fields[12])
+        return busy
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class HostLoadSampler:
+    """Turns successive /proc readings and a Docker ping into utilization fractions."""
+
+    def __init__(self):
+        self._cpu = _read_cpu_times()
+        self._disk = _read_disk_busy_ms()
+        self._at = time.monotonic()
+
+    def sample(self) -> LoadSample:
+        now = time.monotonic()
+        elapsed_ms = max((now - self._at) * 1000, 1.0)
+        sample = LoadSample(memory=_read_memory_used())
+
+        cpu = _read_cpu_times()
+        if cpu and self._cpu and cpu[0] > self._cpu[0]:
+            total, idle = cpu[0] - self._cpu[0], cpu[1] - self._cpu[1]
+            sample.cpu = 1 - idle / total
+        disk = _read_disk_busy_ms()
+        if disk and self._disk:
+            # the busiest disk is the bottleneck; averaging would hide it behind idle ones
+            deltas = [ms - self._disk[name] for name, ms in disk.items() if name in self._disk]
+            if deltas:
+                sample.disk_busy = min(max(deltas) / elapsed_ms, 1.0)
+        self._cpu, self._disk, self._at = cpu, disk, now
+
+        try:
+            started = time.monotonic()
+            get_docker_client().ping()
+            sample.docker_latency_s = time.monotonic() - started
+        except Exception as e:
+            logging.warning(f"Docker ping failed: {e}")
+            sample.docker_latency_s = math.inf
+        return sample
+
+
+class AdaptiveConcurrencyController:
+    """AIMD controller over a `ResizableSemaphore` bounded by [min_concurrency, max_concurrency]."""
+
+    def __init__(
+        self,
+        min_concurrency: int,
+        max_concurrency: int,
+        initial: int | None = None,
+        interval_s: float = 15.0,
+        cpu_high: float = 0.90,
+        memory_high: float = 0.90,
+        disk_high: float = 0.90,
+        docker_latency_high_s: float = 1.0,
+        increase_step: int = 1,
+        decrease_factor: float = 0.5,
+        sampler=None,
+    ):
+        if not 1 <= min_concurrency <= max_concurrency:
+            raise ValueError("Concurrency bounds must satisfy 1 <= min <= max")
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.interval_s = interval_s
+        self.thresholds = {
+            "cpu": cpu_high,
+            "memory": memory_high,
+            "disk_busy": disk_high,
+            "docker_latency_s": docker_latency_high_s,
+        }
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.semaphore = ResizableSemaphore(initial or min_concurrency)
+        self.adjustments: list[tuple[float, int, int, str]] = []
+        self._sampler = sampler
+        self._congestion: list[str] = []
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="adaptive-concurrency", daemon=True)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def start(self):
+        if self._sampler is None:
+            self._sampler = HostLoadSampler()
+        logging.info(
+            f"Adaptive concurrency between {self.min_concurrency} and {self.max_concurrency}, starting at {self.semaphore.limit}"
+        )
+        self._thread.start()
+
+    def close(self):
+        self._closed.set()
+        self._thread.join()
+
+    @contextmanager
+    def slot(self):
+        self.semaphore.acquire()
+        try:
+            yield
+        finally:
+            self.semaphore.release()
+
+    def report_congestion(self, reason: str) -> None:
+        """Signal an overload symptom (e.g. a bootstrap timeout) to act on at the next adjustment."""
+        with self._lock:
+            self._congestion.append(reason)
+
+    def _set_limit(self, limit: int, reason: str) -> None:
+        old = self.semaphore.limit
+        if limit == old:
+            return
+        self.semaphore.resize(limit)
+        self.adjustments.append((time.time(), old, limit, reason))
+        logging.info(f"Adaptive concurrency {old} -> {limit}: {reason}")
+
+    def adjust(self, sample: LoadSample) -> int:
+        """Apply one AIMD step for `sample` and return the new limit."""
+        with self._lock:
+            congestion, self._congestion = self._congestion, []
+        overloaded = [
+            f"{name} {getattr(sample, name):.2f} >= {threshold:.2f}"
+            for name, threshold in self.thresholds.items()
+            if getattr(sample, name) is not None and getattr(sample, name) >= threshold
+        ]
+        if congestion:
+            overloaded.append(f"{len(congestion)} congestion signal(s): {congestion[0]}")
+        limit = self.semaphore.limit
+        if overloaded:
+            new_limit = max(self.min_concurrency, math.floor(limit * self.decrease_factor))
+            self._set_limit(new_limit, "decrease, " + "; ".join(overloaded) + f" ({sample.describe()})")
+        elif self.semaphore.in_use >= limit and limit < self.max_concurrency:
+            new_limit = min(self.max_concurrency, limit + self.increase_step)
+            self._set_limit(new_limit, f"increase, all slots busy and host healthy ({sample.describe()})")
+        return self.semaphore.limit
+
+    def _loop(self):
+        while not self._closed.wait(self.interval_s):
+            try:
+                self.adjust(self._sampler.sample())
+            except Exception as e:
+                logging.warning(f"Adaptive concurrency sampling failed: {e}")
@@ -0,0 +1,298 @@
+"""
+Multiple attempts per instance from one provisioned container (pass@k, prompt comparisons).
+
+Each attempt would otherwise repeat container start, agent TOML install and the
+Qodo CLI bootstrap. `run_attempts` provisions the instance once, commits the
+ready container to a snapshot image and forks every attempt from it with a
+plain `sleep` entrypoint, so an attempt costs a container start plus its solve.
+Attempts run in parallel and each one is evaluated as soon as its patch is
+saved; with early stopping, the first resolved attempt stops the containers of
+the attempts still solving and the ones not started yet are skipped.
+
+Per attempt, `attempts/<instance_id>/attempt<NN>/` holds the session log,
+predictions and harness report; `attempts/<instance_id>/attempts.json`
+summarizes the instance and `<run_id>.attempts.json` the batch, with pass@k.
+"""
+
+import json
+import logging
+import math
+import threading
+import time
+import uuid
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+from .docker_client import get_container, get_docker_client
+from .eval_cache import evaluate_with_cache, patch_sha256
+from .prediction_store import PredictionStore
+from .reports import build_report, load_report, report_statuses, write_report
+from .run_swe_instance import extract_patch, provision_container, save_prediction, solve_instance
+from .tracing import bind_container, traced
+from .utils import remove_container_image, stop_container
+
+SNAPSHOT_REPOSITORY = "sweb.snapshot"
+# containers forked from a snapshot only need to stay up; the bootstrap already ran
+FORK_COMMAND = "sleep 7200"
+
+
+@dataclass
+class AttemptResult:
+    attempt: int
+    status: str
+    patch_sha256: str | None = None
+    solve_s: float | None = None
+    error: str | None = None
+
+
+@dataclass
+class AttemptsOutcome:
+    instance_id: str
+    setup_s: float
+    attempts: list[AttemptResult] = field(default_factory=list)
+
+    @property
+    def resolved(self) -> bool:
+        return any(a.status == "resolved_ids" for a in self.attempts)
+
+    @property
+    def finished(self) -> bool:
+        """Whether any attempt got as far as an evaluation."""
+        return any(a.status not in ("cancelled", "error_ids") for a in self.attempts)
+
+    def to_dict(self) -> dict:
+        return {
+            "instance_id": self.instance_id,
+            "setup_s": self.setup_s,
+            "resolved": self.resolved,
+            "attempts": [asdict(a) for a in self.attempts],
+        }
+
+
+@traced("snapshot")
+def snapshot_container(container_id: str, instance_id: str) -> str:
+    """Commit the provisioned container and return the snapshot image name."""
+    tag = f"{instance_id.lower()}-{uuid.uuid4().hex[:8]}"
+    get_container(container_id).commit(
+        repository=SNAPSHOT_REPOSITORY, tag=tag, message=f"provisioned {instance_id}"
+    )
+    image = f"{SNAPSHOT_REPOSITORY}:{tag}"
+    logging.info(f"Snapshot {image} of {container_id} for {instance_id}")
+    return image
+
+
+@traced("fork")
+def fork_container(snapshot_image: str, instance_id: str, attempt: int) -> str:
+    container = get_docker_client().containers.run(
+        name=f"sweb.qodo.{instance_id}_attempt{attempt:02d}_{uuid.uuid4().hex[:8]}",
+        image=snapshot_image,
+        detach=True,
+        command=FORK_COMMAND,
+    )
+    bind_container(container.id, instance_id)
+    return container.id
+
+
+def pass_at_k(n: int, c: int, k: int) -> float:
+    """Unbiased pass@k estimate from n attempts of which c resolved."""
+    if n - c < k:
+        return 1.0
+    return 1.0 - math.comb(n - c, k) / math.comb(n, k)
+
+
+class _AttemptRunner:
+    def __init__(self, instance_id, snapshot, instance_dir: Path, run_id, early_stop, session_log_options, max_workers, eval_slots=None):
+        self.instance_id = instance_id
+        self.snapshot = snapshot
+        self.instance_dir = instance_dir
+        self.run_id = run_id
+        self.early_stop = early_stop
+        self.session_log_options = session_log_options
+        self.max_workers = max_workers
+        self.eval_slots = eval_slots
+        self.resolved = threading.Event()
+        self._running: dict[int, str] = {}
+        self._cancelled: set[int] = set()
+        # attempts whose container the resolving attempt already stopped
+        self._stopped: set[int] = set()
+        self._lock = threading.Lock()
+
+    def _cancel_running(self, winner: int) -> None:
+        with self._lock:
+            running = dict(self._running)
+            self._cancelled.update(running)
+            self._stopped.update(running)
+        for attempt, container_id in running.items():
+            logging.info(f"Attempt {winner} of {self.instance_id} resolved, stopping attempt {attempt}")
+            stop_container(container_id)
+
+    def run(self, attempt: int) -> AttemptResult:
+        if self.early_stop and self.resolved.is_set():
+            return AttemptResult(attempt, "cancelled")
+        attempt_dir = self.instance_dir / f"attempt{attempt:02d}"
+        container_id = fork_container(self.snapshot, self.instance_id, attempt)
+        with self._lock:
+            self._running[attempt] = container_id
+            # another attempt may have resolved while this container was starting
+            if self.early_stop and self.resolved.is_set():
+                self._cancelled.add(attempt)
+        started = time.monotonic()
+        solve_s = None
+        try:
+            try:
+                if attempt not in self._cancelled:
+                    solve_instance(self.instance_id, container_id, attempt_dir, self.session_log_options)
+            except Exception:
+                # the exec stream breaks when a resolved attempt stops this container
+                with self._lock:
+                    if attempt not in self._cancelled:
+                        raise
+            solve_s = time.monotonic() - started
+            with self._lock:
+                cancelled = attempt in self._cancelled
+            patch = None if cancelled else extract_patch(container_id)
+        finally:
+            with self._lock:
+                self._running.pop(attempt, None)
+                cancelled = attempt in self._cancelled
+                stopped = attempt in self._stopped
+            if not stopped:
+                stop_container(container_id)
+        if cancelled:
+            return AttemptResult(attempt, "cancelled", solve_s=solve_s)
+
+        predictions_path = attempt_dir / "preds.json"
+        save_prediction(self.instance_id, patch, predictions_path)
+        PredictionStore(predictions_path).compact()
+        attempt_run_id = f"{self.run_id}.{self.instance_id}.attempt{attempt:02d}"
+        with self.eval_slots or nullcontext():
+            report_path = evaluate_with_cache(predictions_path, [self.instance_id], attempt_dir, self.max_workers, attempt_run_id)
+        status = "error_ids"
+        if report_path.exists():
+            status = report_statuses(load_report(report_path)).get(self.instance_id, "error_ids")
+        logging.info(f"Attempt {attempt} of {self.instance_id}: {status.removesuffix('_ids')}")
+        if status == "resolved_ids" and not self.resolved.is_set():
+            self.resolved.set()
+            if self.early_stop:
+                self._cancel_running(attempt)
+        return AttemptResult(attempt, status, patch_sha256(patch), solve_s)
+
+
+def run_attempts(
+    instance_id: str,
+    n_attempts: int,
+    output_dir,
+    run_id: str,
+    predictions_path=None,
+    max_parallel: int | None = None,
+    early_stop: bool = True,
+    session_log_options=None,
+    max_workers: int = 1,
+    eval_slots: threading.Semaphore | None = None,
+) -> AttemptsOutcome:
+    """Provision once, snapshot, and run `n_attempts` solves of the instance from the snapshot.
+
+    The patch of the first resolved attempt (else of the last one to finish) is
+    saved to `predictions_path` when given. `eval_slots` bounds the harness runs
+    in flight when several instances run attempts at once.
+    """
+    instance_dir = Path(output_dir) / "attempts" / instance_id
+    instance_dir.mkdir(parents=True, exist_ok=True)
+    started = time.monotonic()
+    container_id = provision_container(instance_id)
+    try:
+        snapshot = snapshot_container(container_id, instance_id)
+    finally:
+        stop_container(container_id)
+    outcome = AttemptsOutcome(instance_id, time.monotonic() - started)
+
+    runner = _AttemptRunner(instance_id, snapshot, instance_dir, run_id, early_stop, session_log_options, max_workers, eval_slots)
+    try:
+        with ThreadPoolExecutor(max_workers=max_parallel or n_attempts) as executor:
+            futures = {executor.submit(runner.run, attempt): attempt for attempt in range(1, n_attempts + 1)}
+            for future in as_completed(futures):
+                try:
+                    outcome.attempts.append(future.result())
+                except Exception as e:
+                    logging.error(f"Attempt {futures[future]} of {instance_id} failed: {e}")
+                    outcome.attempts.append(AttemptResult(futures[future], "error_ids", error=str(e)))
+    finally:
+        remove_container_image(snapshot)
+
+    if predictions_path is not None:
+        # attempts are still in completion order here
+        finished = [a for a in outcome.attempts if a.status not in ("cancelled", "error_ids")]
+        best = next((a for a in finished if a.status == "resolved_ids"), finished[-1] if finished else None)
+        if best is not None:
+            pred = PredictionStore(instance_dir / f"attempt{best.attempt:02d}" / "preds.json").load()[instance_id]
+            save_prediction(instance_id, pred["model_patch"], predictions_path)
+    outcome.attempts.sort(key=lambda a: a.attempt)
+    with open(instance_dir / "attempts.json", "w") as f:
+        json.dump(outcome.to_dict(), f, indent=2)
+    return outcome
+
+
+def summarize_attempts(outcomes: list[AttemptsOutcome], n_attempts: int, early_stop: bool) -> dict:
+    """Batch summary; pass@k is only unbiased when every attempt ran (no early stopping)."""
+    summary = {
+        "attempts_per_instance": n_attempts,
+        "early_stop": early_stop,
+        "resolved": sum(o.resolved for o in outcomes),
+        "instances": len(outcomes),
+        "attempts_run": sum(1 for o in outcomes for a in o.attempts if a.status != "cancelled"),
+        "setup_s": sum(o.setup_s for o in outcomes),
+    }
+    if not early_stop and outcomes:
+        summary["pass_at_k"] = {
+            k: sum(
+                pass_at_k(len(o.attempts), sum(a.status == "resolved_ids" for a in o.attempts), k) for o in outcomes
+            )
+            / len(outcomes)
+            for k in range(1, n_attempts + 1)
+        }
+    summary["per_instance"] = [o.to_dict() for o in outcomes]
+    return summary
+
+
+def run_attempt_batch(
+    instance_ids,
+    n_attempts: int,
+    output_dir,
+    run_id: str,
+    max_concurrency: int = 1,
+    attempt_concurrency: int | None = None,
+    early_stop: bool = True,
+    session_log_options=None,
+    max_workers: int = 1,
+) -> Path:
+    """Run attempts for every instance; writes `<run_id>.attempts.json` and a pass@n `<run_id>.report.json`."""
+    output_dir = Path(output_dir)
+    predictions_path = output_dir / "preds.json"
+    outcomes = []
+    # one harness run in flight per instance slot; each attempt has its own run_id and report_dir
+    eval_slots = threading.Semaphore(max_concurrency)
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        futures = {
+            executor.submit(
+                run_attempts, instance_id, n_attempts, output_dir, run_id, predictions_path,
+                attempt_concurrency, early_stop, session_log_options, max_workers, eval_slots,
+            ): instance_id
+            for instance_id in instance_ids
+        }
+        for future in as_completed(futures):
+            try:
+                outcomes.append(future.result())
+            except Exception as e:
+                logging.error(f"Attempts for {futures[future]} failed: {e}")
+    with open(output_dir / f"{run_id}.attempts.json", "w") as f:
+        json.dump(summarize_attempts(outcomes, n_attempts, early_stop), f, indent=2)
+
+    statuses = {
+        o.instance_id: "resolved_ids" if o.resolved else "unresolved_ids" if o.finished else "error_ids" for o in outcomes
+    }
+    statuses.update({i: "error_ids" for i in instance_ids if i not in statuses})
+    report_path = write_report(output_dir / f"{run_id}.report.json", build_report(statuses, instance_ids))
+    logging.info(f"{len([o for o in outcomes if o.resolved])}/{len(instance_ids)} instances resolved within {n_attempts} attempts")
+    return report_path
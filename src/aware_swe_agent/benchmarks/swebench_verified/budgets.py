@@ -0,0 +1,180 @@
+"""
+Per-instance budgets for agent sessions: wall clock, transcript size and idle time.
+
+`--max_iterations` is the only limit the agent itself enforces, so a runaway
+session can hold a worker slot for hours. A `BudgetGuard` watches the streaming
+exec of one session: the transcript size is checked as output arrives and a
+watchdog thread checks wall-clock and idle time. When a budget runs out, the
+agent processes inside the container are sent SIGTERM (SIGKILL after a grace
+period), which ends the exec stream; the container stays up so the patch is still
+extracted and saved. Every session's duration and size, and every budget hit,
+are recorded for the batch summary (`<run_id>.budgets.json`).
+"""
+
+import json
+import logging
+import math
+import threading
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from .docker_client import get_container
+
+BUDGET_KINDS = ("wall_clock", "transcript_bytes", "idle")
+DEFAULT_STOP_PATTERN = "qodo solve"
+STOP_GRACE_S = 15.0
+_WATCHDOG_INTERVAL_S = 1.0
+
+
+@dataclass
+class SessionBudget:
+    """Limits for one agent session; 0 disables a limit."""
+
+    wall_clock_s: float = 0
+    transcript_bytes: int = 0
+    idle_s: float = 0
+
+    def __bool__(self) -> bool:
+        return bool(self.wall_clock_s or self.transcript_bytes or self.idle_s)
+
+
+@dataclass
+class SessionRecord:
+    instance_id: str
+    duration_s: float
+    transcript_bytes: int
+    budget_hit: str | None = None
+    exit_code: int | None = None
+
+
+_budget = SessionBudget()
+_records: list[SessionRecord] = []
+_records_lock = threading.Lock()
+
+
+def configure_session_budget(budget: SessionBudget) -> None:
+    """Apply `budget` to every agent session started from now on."""
+    global _budget
+    _budget = budget
+
+
+def get_session_budget() -> SessionBudget:
+    return _budget
+
+
+def _stop_script(pattern: str, signal: str) -> str:
+    # pkill is missing from many instance images; match /proc/*/cmdline instead, skipping this shell
+    return (
+        f"for p in /proc/[0-9]*; do pid=${{p#/proc/}}; [ \"$pid\" = \"$$\" ] && continue; "
+        f"cmd=$(tr '\\0' ' ' < $p/cmdline 2>/dev/null); "
+        f"case \"$cmd\" in *'{pattern}'*) kill -{signal} $pid 2>/dev/null;; esac; done"
+    )
+
+
+class BudgetGuard:
+    """Enforces a `SessionBudget` on one streaming exec; feed it with `on_output`."""
+
+    def __init__(self, container_id: str, budget: SessionBudget, instance_id: str | None = None, stop_pattern: str = DEFAULT_STOP_PATTERN, grace_s: float = STOP_GRACE_S):
+        self.container_id = container_id
+        self.budget = budget
+        self.instance_id = instance_id
+        self.stop_pattern = stop_pattern
+        self.grace_s = grace_s
+        self.hit: str | None = None
+        self.bytes = 0
+        self.started = time.monotonic()
+        self._last_output = self.started
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._watch, name=f"budget-{container_id[:12]}", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._done.set()
+        self._thread.join()
+
+    @property
+    def exhausted(self) -> bool:
+        return self.hit is not None
+
+    def on_output(self, size: int) -> None:
+        self.bytes += size
+        self._last_output = time.monotonic()
+        if self.budget.transcript_bytes and self.bytes >= self.budget.transcript_bytes:
+            self._exhaust("transcript_bytes", f"{self.bytes} bytes >= {self.budget.transcript_bytes}")
+
+    def _watch(self) -> None:
+        while not self._done.wait(_WATCHDOG_INTERVAL_S):
+            now = time.monotonic()
+            if self.budget.wall_clock_s and now - self.started >= self.budget.wall_clock_s:
+                self._exhaust("wall_clock", f"{now - self.started:.1f}s >= {self.budget.wall_clock_s:.1f}s")
+            elif self.budget.idle_s and now - self._last_output >= self.budget.idle_s:
+                self._exhaust("idle", f"no output for {now - self._last_output:.0f}s")
+
+    def _exhaust(self, kind: str, detail: str) -> None:
+        with self._lock:
+            if self.hit is not None:
+                return
+            self.hit = kind
+        logging.warning(f"Session budget {kind} exhausted for {self.instance_id or self.container_id} ({detail}), stopping the agent")
+        threading.Thread(target=self._stop, name=f"budget-stop-{self.container_id[:12]}", daemon=True).start()
+
+    def _stop(self) -> None:
+        container = get_container(self.container_id)
+        try:
+            container.exec_run(["sh", "-c", _stop_script(self.stop_pattern, "TERM")])
+            if not self._done.wait(self.grace_s):
+                logging.warning(f"Agent in {self.container_id} ignored SIGTERM for {self.grace_s:.0f}s, killing it")
+                container.exec_run(["sh", "-c", _stop_script(self.stop_pattern, "KILL")])
+        except Exception as e:
+            logging.error(f"Cannot stop the agent in {self.container_id}: {e}")
+
+
+def record_session(record: SessionRecord) -> None:
+    with _records_lock:
+        _records.append(record)
+
+
+def session_records() -> list[SessionRecord]:
+    with _records_lock:
+        return list(_records)
+
+
+def _percentile(sorted_values: list[float], q: float) -> float:
+    # nearest-rank percentile
+    return sorted_values[max(0, math.ceil(q * len(sorted_values)) - 1)]
+
+
+def budget_summary(records: list[SessionRecord] | None = None) -> dict:
+    """Budget hits by kind and session duration percentiles."""
+    records = session_records() if records is None else records
+    durations = sorted(r.duration_s for r in records)
+    summary = {
+        "budget": asdict(_budget),
+        "sessions": len(records),
+        "hits": {kind: sorted(r.instance_id for r in records if r.budget_hit == kind) for kind in BUDGET_KINDS},
+        "duration_s": {},
+        "records": [asdict(r) for r in records],
+    }
+    if durations:
+        summary["duration_s"] = {
+            "p50": _percentile(durations, 0.50),
+            "p95": _percentile(durations, 0.95),
+            "p99": _percentile(durations, 0.99),
+            "max": durations[-1],
+        }
+    return summary
+
+
+def write_budget_summary(path) -> Path:
+    path = Path(path)
+    summary = budget_summary()
+    with open(path, "w") as f:
+        json.dump(summary, f, indent=2)
+    hits = {kind: len(ids) for kind, ids in summary["hits"].items() if ids}
+    logging.info(f"{sum(hits.values())} of {summary['sessions']} sessions hit a budget {hits or ''}; summary written to {path}")
+    return path
@@ -0,0 +1,83 @@
+"""
+Bulk file injection into containers as one streamed tar archive.
+
+`put_files_in_container` sends any number of host files and in-memory blobs in
+a single `put_archive` call. The tar stream is produced by a generator that
+writes each member's header, then reads host files in fixed-size chunks, so the
+upload uses constant memory however large the files are, and parent
+directories are created by the archive itself rather than by extra execs.
+"""
+
+import logging
+import os
+import posixpath
+import tarfile
+import time
+from pathlib import Path
+
+from .docker_client import get_container
+
+CHUNK_SIZE = 1 << 20
+
+
+def _header(name: str, size: int, mode: int, mtime: float, is_dir: bool = False) -> bytes:
+    tarinfo = tarfile.TarInfo(name)
+    tarinfo.size = 0 if is_dir else size
+    tarinfo.mode = mode
+    tarinfo.mtime = int(mtime)
+    tarinfo.type = tarfile.DIRTYPE if is_dir else tarfile.REGTYPE
+    return tarinfo.tobuf(format=tarfile.PAX_FORMAT)
+
+
+def iter_tar_stream(files: dict, chunk_size: int = CHUNK_SIZE):
+    """Yield a tar archive of `files` (archive name -> bytes blob or host path) chunk by chunk."""
+    now = time.time()
+    seen_dirs = set()
+    for name, source in files.items():
+        name = posixpath.normpath(name).lstrip("/")
+        parent = posixpath.dirname(name)
+        missing = []
+        while parent and parent not in seen_dirs:
+            missing.append(parent)
+            parent = posixpath.dirname(parent)
+        for directory in reversed(missing):
+            seen_dirs.add(directory)
+            yield _header(directory, 0, 0o755, now, is_dir=True)
+
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            size = len(source)
+            yield _header(name, size, 0o644, now)
+            for offset in range(0, size, chunk_size):
+                yield bytes(source[offset : offset + chunk_size])
+        else:
+            with open(source, "rb") as f:
+                stat = os.fstat(f.fileno())
+                size = stat.st_size
+                yield _header(name, size, stat.st_mode & 0o777, stat.st_mtime)
+                remaining = size
+                while remaining:
+                    chunk = f.read(min(chunk_size, remaining))
+                    if not chunk:
+                        raise OSError(f"{source} shrank while being copied")
+                    remaining -= len(chunk)
+                    yield chunk
+        padding = -size % tarfile.BLOCKSIZE
+        if padding:
+            yield tarfile.NUL * padding
+    yield tarfile.NUL * (2 * tarfile.BLOCKSIZE)
+
+
+def put_files_in_container(container_id: str, dest_dir: str, files: dict) -> None:
+    """Write `files` (archive name -> bytes blob or host path) under `dest_dir` in one API call."""
+    if not files:
+        return
+    get_container(container_id).put_archive(dest_dir, iter_tar_stream(files))
+    logging.info(f"Put {len(files)} file(s) in {dest_dir} in container id {container_id}")
+
+
+def agent_bundle_files(bundle_dir, prefix: str = "agents") -> dict:
+    """Map every `*.toml` of an agents directory (e.g. swe_plan_and_solve/agents) to `prefix/<name>.toml`."""
+    return {
+        posixpath.join(prefix, path.name): path
+        for path in sorted(Path(bundle_dir).glob("*.toml"))
+    }
@@ -0,0 +1,95 @@
+"""
+Warm pool of instance containers provisioned ahead of the prediction workers.
+
+Starting a container, installing Node.js and the Qodo CLI takes minutes and used
+to sit on the critical path of every instance. The pool walks the instance list
+in submission order and provisions up to `lookahead` containers beyond the ones
+currently in use, so a worker picks up a ready container as soon as it frees up.
+"""
+
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from .run_swe_instance import provision_container
+from .utils import stop_container
+
+
+class WarmContainerPool:
+    """Provision containers for `instance_ids` in order, at most `max_concurrency + lookahead` live at once."""
+
+    def __init__(self, instance_ids, max_concurrency, lookahead, provision=provision_container):
+        self.instance_ids = list(instance_ids)
+        self.capacity = max_concurrency + max(lookahead, 1)
+        self._provision = provision
+        self._slots = threading.Semaphore(self.capacity)
+        self._ready: dict[str, deque[Future]] = {}
+        self._cond = threading.Condition()
+        self._closed = threading.Event()
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.capacity, thread_name_prefix="warm-pool"
+        )
+        self._feeder = threading.Thread(target=self._feed, name="warm-pool-feeder", daemon=True)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def start(self):
+        self._feeder.start()
+
+    def _feed(self):
+        for instance_id in self.instance_ids:
+            while not self._slots.acquire(timeout=1):
+                if self._closed.is_set():
+                    return
+            if self._closed.is_set():
+                self._slots.release()
+                return
+            logging.info(f"Warm pool: provisioning container for {instance_id}")
+            future = self._executor.submit(self._provision, instance_id)
+            with self._cond:
+                self._ready.setdefault(instance_id, deque()).append(future)
+                self._cond.notify_all()
+
+    def acquire(self, instance_id: str) -> str:
+        """Block until the container for `instance_id` is provisioned and return its id."""
+        with self._cond:
+            while not self._ready.get(instance_id):
+                if self._closed.is_set():
+                    raise RuntimeError(f"Warm pool closed before {instance_id} was provisioned")
+                self._cond.wait(timeout=1)
+            future = self._ready[instance_id].popleft()
+        try:
+            container_id = future.result()
+        except Exception:
+            self._slots.release()
+            raise
+        logging.info(f"Warm pool: handing container {container_id} to {instance_id}")
+        return container_id
+
+    def release(self, instance_id: str) -> None:
+        """Free the slot of a container handed out by `acquire` once it has been stopped."""
+        self._slots.release()
+
+    def close(self) -> None:
+        """Stop provisioning and tear down containers nobody claimed."""
+        self._closed.set()
+        with self._cond:
+            self._cond.notify_all()
+        self._feeder.join()
+        with self._cond:
+            leftovers = [f for futures in self._ready.values() for f in futures]
+            self._ready.clear()
+        for future in leftovers:
+            try:
+                container_id = future.result()
+            except Exception:
+                continue
+            logging.info(f"Warm pool: stopping unclaimed container {container_id}")
+            stop_container(container_id)
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,174 @@
+"""
+Submission x instance difficulty matrix and a stratified batch sampler.
+
+Each submission's resolved set is one Python int used as a bitset over the
+instance ids, so per-submission solve rates are popcounts and per-instance solve
+counts for any subset of submissions come from a bit-sliced adder over the rows
+(whole-row integer operations instead of a loop over every resolved id). On top of the matrix, `stratified_sample` picks
+batches whose repo and difficulty mix matches the full benchmark, optionally
+weighted by our own historical results, reproducibly for a given seed.
+"""
+
+import json
+import logging
+import math
+import random
+from collections import defaultdict
+from pathlib import Path
+
+from .reports import report_statuses
+
+
+class DifficultyMatrix:
+    """Boolean submission x instance solve matrix, one int bitset per submission."""
+
+    def __init__(self, submissions: list[str], instance_ids: list[str], rows: list[int]):
+        self.submissions = submissions
+        self.instance_ids = instance_ids
+        self.rows = rows
+
+    @classmethod
+    def from_resolved_index(cls, resolved_index: dict[str, set[str]], instance_ids) -> "DifficultyMatrix":
+        instance_ids = list(instance_ids)
+        position = {instance_id: i for i, instance_id in enumerate(instance_ids)}
+        submissions = sorted(resolved_index)
+        rows = []
+        for submission in submissions:
+            row = 0
+            for instance_id in resolved_index[submission]:
+                i = position.get(instance_id)
+                if i is not None:
+                    row |= 1 << i
+            rows.append(row)
+        return cls(submissions, instance_ids, rows)
+
+    def _rows_for(self, submissions=None) -> list[int]:
+        if submissions is None:
+            return self.rows
+        wanted = set(submissions)
+        return [row for name, row in zip(self.submissions, self.rows) if name in wanted]
+
+    def submission_solve_rates(self) -> dict[str, float]:
+        n = len(self.instance_ids) or 1
+        return {name: row.bit_count() / n for name, row in zip(self.submissions, self.rows)}
+
+    def solve_counts(self, submissions=None) -> list[int]:
+        """Number of the given submissions (default all) that resolved each instance."""
+        # bit-sliced counter: planes[j] holds bit j of every instance's count
+        planes: list[int] = []
+        for row in self._rows_for(submissions):
+            carry = row
+            for j in range(len(planes)):
+                if not carry:
+                    break
+                planes[j], carry = planes[j] ^ carry, planes[j] & carry
+            if carry:
+                planes.append(carry)
+        n = len(self.instance_ids)
+        counts = [0] * n
+        for j, plane in enumerate(planes):
+            weight = 1 << j
+            bits = format(plane, f"0{n}b")[::-1] if n else ""
+            for i, bit in enumerate(bits):
+                if bit == "1":
+                    counts[i] += weight
+        return counts
+
+    def solve_rates(self, submissions=None) -> list[float]:
+        total = len(self._rows_for(submissions)) or 1
+        return [count / total for count in self.solve_counts(submissions)]
+
+    def difficulty_percentiles(self, submissions=None) -> list[float]:
+        """Percentile of each instance in [0, 1), 0 being the most solved; ties share a percentile."""
+        rates = self.solve_rates(submissions)
+        n = len(rates)
+        order = sorted(range(n), key=lambda i: -rates[i])
+        percentiles = [0.0] * n
+        start = 0
+        while start < n:
+            end = start
+            while end + 1 < n and rates[order[end + 1]] == rates[order[start]]:
+                end += 1
+            midpoint = (start + end) / 2 / n
+            for k in range(start, end + 1):
+                percentiles[order[k]] = midpoint
+            start = end + 1
+        return percentiles
+
+
+def load_history(logs_dir) -> dict[str, tuple[int, int]]:
+    """Return instance_id -> (times evaluated, times resolved) from our own harness reports."""
+    history: dict[str, list[int]] = defaultdict(lambda: [0, 0])
+    for path in Path(logs_dir).rglob("*.report.json"):
+        # micro-batch and resume reports are already folded into the run's main report
+        if ".eval" in path.name or ".resume" in path.name:
+            continue
+        try:
+            with open(path, "r") as f:
+                report = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable report {path}: {e}")
+            continue
+        for instance_id, status in report_statuses(report).items():
+            if status in ("resolved_ids", "unresolved_ids", "empty_patch_ids"):
+                history[instance_id][0] += 1
+                history[instance_id][1] += status == "resolved_ids"
+    return {instance_id: (n, r) for instance_id, (n, r) in history.items()}
+
+
+def history_weights(history: dict[str, tuple[int, int]], alpha: float) -> dict[str, float]:
+    """Weight 1 + alpha * our failure rate; alpha > 0 favours instances we tend to miss."""
+    return {
+        instance_id: max(1 + alpha * (1 - resolved / attempts), 1e-6)
+        for instance_id, (attempts, resolved) in history.items()
+        if attempts
+    }
+
+
+def _allocate(sizes: dict, n: int) -> dict:
+    """Split n across strata proportionally to their sizes (largest remainder method)."""
+    total = sum(sizes.values())
+    if not total:
+        return {key: 0 for key in sizes}
+    quotas = {key: n * size / total for key, size in sizes.items()}
+    allocation = {key: min(math.floor(q), sizes[key]) for key, q in quotas.items()}
+    remaining = n - sum(allocation.values())
+    for key in sorted(sizes, key=lambda k: (quotas[k] - math.floor(quotas[k]), sizes[k]), reverse=True):
+        if remaining <= 0:
+            break
+        if allocation[key] < sizes[key]:
+            allocation[key] += 1
+            remaining -= 1
+    return allocation
+
+
+def stratified_sample(
+    matrix: DifficultyMatrix,
+    n: int,
+    repos: dict[str, str] | None = None,
+    bins: int = 3,
+    seed: int | None = None,
+    weights: dict[str, float] | None = None,
+    submissions=None,
+) -> list[str]:
+    """Sample n instances stratified by repo and difficulty percentile bin."""
+    rng = random.Random(seed)
+    percentiles = matrix.difficulty_percentiles(submissions)
+    strata: dict[tuple, list[str]] = defaultdict(list)
+    for instance_id, percentile in zip(matrix.instance_ids, percentiles):
+        difficulty_bin = min(int(percentile * bins), bins - 1)
+        repo = (repos or {}).get(instance_id, "")
+        strata[(repo, difficulty_bin)].append(instance_id)
+
+    allocation = _allocate({key: len(members) for key, members in strata.items()}, n)
+    selected = []
+    for key in sorted(strata):
+        members = strata[key]
+        # weighted sampling without replacement (Efraimidis-Spirakis keys)
+        keyed = sorted(
+            members,
+            key=lambda i: rng.random() ** (1 / (weights or {}).get(i, 1.0)),
+            reverse=True,
+        )
+        selected.extend(keyed[: allocation[key]])
+    return selected
@@ -0,0 +1,79 @@
+"""
+Docker client shared by all threads of a run.
+
+`docker.from_env()` builds a new client (and HTTP connection pool) every time,
+and `containers.get()` costs an API round-trip. Helpers go through one lazily
+created client whose connection pool is sized to the orchestrator's concurrency,
+and container handles are cached until the container is stopped.
+"""
+
+import logging
+import threading
+
+import docker
+
+DEFAULT_POOL_SIZE = 32
+
+_client = None
+# False for a client installed with set_docker_client, which is never replaced
+_client_owned = False
+_pool_size = DEFAULT_POOL_SIZE
+_client_lock = threading.Lock()
+_containers: dict = {}
+_containers_lock = threading.Lock()
+
+
+def get_docker_client():
+    """Return the shared Docker client, creating it on first use."""
+    global _client, _client_owned
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = docker.from_env(max_pool_size=_pool_size)
+                _client_owned = True
+    return _client
+
+
+def configure_docker_client(max_pool_size: int) -> None:
+    """Size the connection pool for `max_pool_size` concurrent API calls; only ever grows it."""
+    global _client, _pool_size
+    with _client_lock:
+        if max_pool_size <= _pool_size:
+            return
+        _pool_size = max_pool_size
+        if _client is not None and _client_owned:
+            old_client, _client = _client, None
+            try:
+                old_client.close()
+            except Exception as e:
+                logging.warning(f"Failed to close Docker client: {e}")
+    with _containers_lock:
+        _containers.clear()
+    logging.info(f"Docker client connection pool size set to {max_pool_size}")
+
+
+def set_docker_client(client) -> None:
+    """Use `client` (e.g. a stand-in backend) for every helper from now on."""
+    global _client, _client_owned
+    with _client_lock:
+        _client = client
+        _client_owned = False
+    with _containers_lock:
+        _containers.clear()
+
+
+def get_container(container_id: str):
+    """Return a cached handle for the container, fetching it once from the daemon."""
+    with _containers_lock:
+        container = _containers.get(container_id)
+    if container is None:
+        container = get_docker_client().containers.get(container_id)
+        with _containers_lock:
+            _containers[container_id] = container
+    return container
+
+
+def forget_container(container_id: str) -> None:
+    """Drop the cached handle of a container that is being stopped or removed."""
+    with _containers_lock:
+        _containers.pop(container_id, None)
@@ -0,0 +1,212 @@
+"""
+Persistent cache of SWE-bench harness results keyed by patch content.
+
+Reruns, empty patches and pass@k attempts that converge produce byte-identical
+`model_patch`es again and again, and each would cost a harness container run.
+Outcomes are stored in a SQLite file in the cache directory keyed by
+(instance_id, sha256(patch), harness version), together with the instance's test
+output and harness report. `evaluate_with_cache` answers cached predictions from
+the cache (restoring their logs where the harness would have written them),
+rejects predictions that cannot apply (`patch_check`), sends only the rest to
+the harness, and writes one merged `<run_id>.report.json`.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from importlib import metadata
+from pathlib import Path
+
+from .patch_check import fast_reject_enabled, validate_predictions
+from .prediction_store import PredictionStore
+from .reports import build_report, load_report, merge_reports, report_statuses, write_report
+from .utils import _run_swe_harness, get_cache_dir
+
+# outcomes that depend only on the patch; errors and incomplete runs are retried
+CACHEABLE_STATUSES = ("resolved_ids", "unresolved_ids", "empty_patch_ids")
+# where the harness writes per-instance logs, relative to the working directory
+HARNESS_LOG_DIR = Path("logs") / "run_evaluation"
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS evals (
+    instance_id TEXT NOT NULL,
+    patch_sha256 TEXT NOT NULL,
+    harness_version TEXT NOT NULL,
+    status TEXT NOT NULL,
+    instance_report TEXT,
+    test_output BLOB,
+    run_id TEXT,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (instance_id, patch_sha256, harness_version)
+)
+"""
+
+_enabled = True
+
+
+def configure_eval_cache(enabled: bool) -> None:
+    global _enabled
+    _enabled = enabled
+
+
+def get_eval_cache_path() -> Path:
+    """Location of the cache, overridable with AWARE_SWE_EVAL_CACHE_PATH."""
+    override = os.environ.get("AWARE_SWE_EVAL_CACHE_PATH")
+    return Path(override) if override else get_cache_dir() / "eval_cache.sqlite"
+
+
+def harness_version() -> str:
+    try:
+        return metadata.version("swebench")
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def patch_sha256(patch: str | None) -> str:
+    return hashlib.sha256((patch or "").encode("utf-8")).hexdigest()
+
+
+def _instance_log_dir(run_id: str, pred: dict) -> Path:
+    return HARNESS_LOG_DIR / run_id / pred["model_name_or_path"].replace("/", "__") / pred["instance_id"]
+
+
+class EvalCache:
+    """SQLite store of harness outcomes; one short-lived connection per call, safe across threads and processes."""
+
+    def __init__(self, path=None, version: str | None = None):
+        self.path = Path(path) if path else get_eval_cache_path()
+        self.version = version or harness_version()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        with closing(self._connect()) as conn, conn:
+            conn.execute(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=60)
+        conn.execute("PRAGMA journal_mode = WAL")
+        return conn
+
+    def lookup(self, preds: dict[str, dict]) -> dict[str, dict]:
+        """Return instance_id -> cached row (status, instance_report, test_output) for the given predictions."""
+        hits = {}
+        with closing(self._connect()) as conn:
+            for instance_id, pred in preds.items():
+                row = conn.execute(
+                    "SELECT status, instance_report, test_output FROM evals "
+                    "WHERE instance_id = ? AND patch_sha256 = ? AND harness_version = ?",
+                    (instance_id, patch_sha256(pred.get("model_patch")), self.version),
+                ).fetchone()
+                if row:
+                    hits[instance_id] = {"status": row[0], "instance_report": row[1], "test_output": row[2]}
+        return hits
+
+    def store(self, report: dict, preds: dict[str, dict], run_id: str) -> int:
+        """Cache the deterministic outcomes of a harness report with the instances' logs; returns rows written."""
+        rows = []
+        for instance_id, status in report_statuses(report).items():
+            if status not in CACHEABLE_STATUSES or instance_id not in preds:
+                continue
+            pred = preds[instance_id]
+            log_dir = _instance_log_dir(run_id, pred)
+            instance_report = test_output = None
+            if (log_dir / "report.json").exists():
+                instance_report = (log_dir / "report.json").read_text()
+            if (log_dir / "test_output.txt").exists():
+                test_output = gzip.compress((log_dir / "test_output.txt").read_bytes())
+            rows.append(
+                (instance_id, patch_sha256(pred.get("model_patch")), self.version, status, instance_report, test_output, run_id, time.time())
+            )
+        with self._lock, closing(self._connect()) as conn, conn:
+            conn.executemany("INSERT OR REPLACE INTO evals VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+
+def _restore_logs(hits: dict[str, dict], preds: dict[str, dict], run_id: str) -> None:
+    for instance_id, hit in hits.items():
+        log_dir = _instance_log_dir(run_id, preds[instance_id])
+        log_dir.mkdir(parents=True, exist_ok=True)
+        if hit["instance_report"]:
+            (log_dir / "report.json").write_text(hit["instance_report"])
+        if hit["test_output"]:
+            (log_dir / "test_output.txt").write_bytes(gzip.decompress(hit["test_output"]))
+
+
+def evaluate_with_cache(predictions_path, instance_ids, report_dir, max_workers: int, run_id: str, cache: EvalCache | None = None) -> Path:
+    """Evaluate through the harness, skipping cached and fast-rejected predictions; returns the report path.
+
+    Rejections (see `patch_check`) are written with their reasons to `<run_id>.rejected.json`.
+    """
+    report_dir = Path(report_dir)
+    report_path = report_dir / f"{run_id}.report.json"
+    preds = PredictionStore(predictions_path).load()
+    submitted = {i: preds[i] for i in instance_ids if i in preds}
+    statuses: dict[str, str] = {}
+
+    if _enabled:
+        cache = cache or EvalCache()
+        hits = cache.lookup(submitted)
+        logging.info(f"Evaluation cache: {len(hits)} of {len(instance_ids)} predictions already evaluated")
+        _restore_logs(hits, preds, run_id)
+        statuses.update({i: hit["status"] for i, hit in hits.items()})
+    else:
+        cache = None
+
+    if fast_reject_enabled():
+        rejected = validate_predictions({i: pred for i, pred in submitted.items() if i not in statuses})
+        if rejected:
+            with open(report_dir / f"{run_id}.rejected.json", "w") as f:
+                json.dump({i: vars(r) for i, r in rejected.items()}, f, indent=2)
+        statuses.update({i: r.status for i, r in rejected.items()})
+
+    reports = [build_report(statuses, statuses)]
+    to_run = [i for i in instance_ids if i not in statuses]
+    if to_run:
+        # with a reused run_id the harness skips instances that already have a report.json and reports
+        # their old outcome, which would then be cached under the new patch
+        for instance_id in to_run:
+            if instance_id in preds:
+                shutil.rmtree(_instance_log_dir(run_id, preds[instance_id]), ignore_errors=True)
+        report_path.unlink(missing_ok=True)
+        _run_swe_harness(predictions_path=predictions_path, instance_ids=to_run, report_dir=report_dir, max_workers=max_workers, run_id=run_id)
+        if report_path.exists():
+            harness_report = load_report(report_path)
+            if cache:
+                stored = cache.store(harness_report, preds, run_id)
+                logging.info(f"Cached {stored} new evaluation result(s) in {cache.path}")
+            reports.append(harness_report)
+        else:
+            logging.warning(f"No harness report for {run_id}")
+    write_report(report_path, merge_reports(reports))
+    return report_path
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect the harness evaluation cache.")
+    parser.add_argument("--path", type=str, default=None, help="Cache file (default: AWARE_SWE_EVAL_CACHE_PATH or the cache directory).")
+    parser.add_argument("--clear", action="store_true", help="Delete every cached result.")
+    args = parser.parse_args()
+
+    cache = EvalCache(args.path)
+    with closing(cache._connect()) as conn, conn:
+        if args.clear:
+            deleted = conn.execute("DELETE FROM evals").rowcount
+            print(f"Deleted {deleted} cached result(s) from {cache.path}")
+            return
+        rows = conn.execute(
+            "SELECT harness_version, status, COUNT(*) FROM evals GROUP BY harness_version, status ORDER BY 1, 2"
+        ).fetchall()
+    print(f"{cache.path}")
+    for version, status, count in rows:
+        print(f"  swebench {version}: {count} {status.removesuffix('_ids')}")
+
+
+if __name__ == "__main__":
+    main()
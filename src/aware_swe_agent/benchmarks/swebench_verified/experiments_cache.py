@@ -0,0 +1,150 @@
+"""
+Persistent, incremental cache of SWE-bench/experiments results.
+
+Only `evaluation/verified/*/results/results.json` is checked out, through a
+shallow, blobless, sparse clone kept in the cache directory and refreshed with a
+shallow fetch. The resolved instance ids of every submission are stored in a
+small JSON index keyed by the checked-out commit, so repeated batch selection
+reads one file instead of walking the repository. A local mirror (a git
+repository or a plain copy of the `evaluation` tree) can be used fully offline.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import subprocess
+import time
+from pathlib import Path
+
+from .utils import get_cache_dir
+
+EXPERIMENTS_REPO_URL = "https://github.com/SWE-bench/experiments.git"
+RESULTS_PATTERN = "/evaluation/verified/*/results/results.json"
+INDEX_VERSION = 1
+# how long a checkout is trusted before fetching again
+REFRESH_INTERVAL_S = 6 * 3600
+
+
+def get_experiments_dir() -> Path:
+    return get_cache_dir() / "swebench_experiments"
+
+
+def _index_path() -> Path:
+    return get_cache_dir() / "swebench_experiments_index.json"
+
+
+def _git(repo_dir: Path, *args: str) -> str:
+    result = subprocess.run(
+        ["git", "-C", str(repo_dir), *args], capture_output=True, text=True, check=True
+    )
+    return result.stdout.strip()
+
+
+def _as_git_url(source: str) -> str:
+    # shallow and filtered clones of a local path only work over the file:// transport
+    if os.path.isdir(source):
+        return Path(source).resolve().as_uri()
+    return source
+
+
+def sync_experiments(source: str | None = None, offline: bool = False, force_fetch: bool = False) -> Path:
+    """Return a directory containing `evaluation/verified`, cloning or fetching only when needed."""
+    if source and os.path.isdir(os.path.join(source, "evaluation", "verified")) and not os.path.isdir(
+        os.path.join(source, ".git")
+    ):
+        return Path(source)
+
+    repo_dir = get_experiments_dir()
+    url = _as_git_url(source or EXPERIMENTS_REPO_URL)
+    if not (repo_dir / ".git").exists():
+        if offline and not source:
+            raise RuntimeError(
+                f"No cached SWE-bench experiments checkout at {repo_dir}; run once online or pass a local mirror"
+            )
+        logging.info(f"Cloning results of {url} into {repo_dir}")
+        repo_dir.parent.mkdir(parents=True, exist_ok=True)
+        subprocess.run(
+            ["git", "clone", "--depth", "1", "--filter=blob:none", "--no-checkout", url, str(repo_dir)],
+            check=True,
+        )
+        _git(repo_dir, "sparse-checkout", "set", "--no-cone", RESULTS_PATTERN)
+        _git(repo_dir, "checkout")
+        index = _read_index()
+        index["fetched_at"] = time.time()
+        _write_index(index)
+        return repo_dir
+
+    index = _read_index()
+    fresh = time.time() - index.get("fetched_at", 0) < REFRESH_INTERVAL_S
+    if offline or (fresh and not force_fetch):
+        return repo_dir
+    try:
+        _git(repo_dir, "remote", "set-url", "origin", url)
+        _git(repo_dir, "fetch", "--depth", "1", "--filter=blob:none", "origin", "HEAD")
+        _git(repo_dir, "reset", "--hard", "FETCH_HEAD")
+        index["fetched_at"] = time.time()
+        _write_index(index)
+    except subprocess.CalledProcessError as e:
+        logging.warning(f"Cannot fetch SWE-bench experiments, using cached checkout: {e.stderr}")
+    return repo_dir
+
+
+def _source_signature(experiments_dir: Path) -> str:
+    """Commit of a git checkout, or a hash of file stats for a plain mirror."""
+    if (experiments_dir / ".git").exists():
+        return _git(experiments_dir, "rev-parse", "HEAD")
+    digest = hashlib.sha256()
+    for path in sorted(experiments_dir.glob("evaluation/verified/*/results/results.json")):
+        stat = path.stat()
+        digest.update(f"{path}:{stat.st_mtime_ns}:{stat.st_size}".encode())
+    return digest.hexdigest()
+
+
+def _list_submissions(experiments_dir: Path) -> list[str]:
+    """All submission directories, including those whose results are not checked out."""
+    if (experiments_dir / ".git").exists():
+        output = _git(experiments_dir, "ls-tree", "-d", "--name-only", "HEAD", "evaluation/verified/")
+        return sorted(Path(line).name for line in output.splitlines() if line)
+    verified_dir = experiments_dir / "evaluation" / "verified"
+    return sorted(p.name for p in verified_dir.iterdir() if p.is_dir())
+
+
+def _read_index() -> dict:
+    try:
+        with open(_index_path(), "r") as f:
+            index = json.load(f)
+        return index if index.get("version") == INDEX_VERSION else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_index(index: dict) -> None:
+    index["version"] = INDEX_VERSION
+    tmp_path = _index_path().with_suffix(".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(index, f)
+    os.replace(tmp_path, _index_path())
+
+
+def load_resolved_index(source: str | None = None, offline: bool = False, force_fetch: bool = False) -> dict[str, set[str]]:
+    """Return submission name -> resolved instance ids for every verified submission."""
+    experiments_dir = sync_experiments(source, offline, force_fetch)
+    signature = _source_signature(experiments_dir)
+    index = _read_index()
+    if index.get("signature") == signature and "submissions" in index:
+        return {name: set(ids) for name, ids in index["submissions"].items()}
+
+    logging.info(f"Indexing SWE-bench experiments results at {experiments_dir}")
+    verified_dir = experiments_dir / "evaluation" / "verified"
+    submissions = {}
+    for name in _list_submissions(experiments_dir):
+        results_json_path = verified_dir / name / "results" / "results.json"
+        resolved = []
+        if results_json_path.exists():
+            with open(results_json_path, "r") as f:
+                resolved = json.load(f).get("resolved", [])
+        submissions[name] = sorted(set(resolved))
+    index.update({"signature": signature, "submissions": submissions})
+    _write_index(index)
+    return {name: set(ids) for name, ids in submissions.items()}
@@ -1,64 +1,37 @@
-import os
-import json
-import subprocess
-import shutil
 import random
-from .utils import get_swebench_verified_data
+from .difficulty import DifficultyMatrix, history_weights, load_history, stratified_sample
+from .experiments_cache import load_resolved_index
+from .instance_index import get_instance_index
 
-def clone_repo_to_tmp():
-    tmp_dir = '/tmp/swebench_repo'
-    repo_url = 'https://github.com/SWE-bench/experiments.git'
-
-    if os.path.exists(tmp_dir):
-        shutil.rmtree(tmp_dir)
-
-    subprocess.run(['git', 'clone', repo_url, tmp_dir])
-    return tmp_dir
-
-
-def get_resolved_instances_from_json(json_path):
-    with open(json_path, 'r') as f:
-        data = json.load(f)
-    return set(data.get("resolved", []))
-
-
-def find_swe_batch(k=10, n_easy=5, n_medium=0, n_hard=0, p_medium=0.5):
-    tmp_dir = clone_repo_to_tmp()
-    verified_dir = os.path.join(tmp_dir, 'evaluation', 'verified')
-
-    subdirs = [d for d in os.listdir(verified_dir) if os.path.isdir(os.path.join(verified_dir, d))]
-    subdirs.sort(reverse=True)
-    recent_submissions = subdirs[:k]
-    resolved_sets = []
+def _recent_matrix(k, mirror, offline):
+    resolved_index = load_resolved_index(source=mirror, offline=offline)
+    recent_submissions = sorted(resolved_index, reverse=True)[:k]
 
     print("Processing the following submissions:")
     for subdir in recent_submissions:
         print(f"- {subdir}")
-        results_json_path = os.path.join(verified_dir, subdir, 'results', 'results.json')
-        if os.path.exists(results_json_path):
-            resolved_instances = get_resolved_instances_from_json(results_json_path)
-            resolved_sets.append(resolved_instances)
-        else:
-            resolved_sets.append(set())
+
+    all_instances = set(get_instance_index().instance_ids())
+    for subdir in recent_submissions:
+        all_instances.update(resolved_index[subdir])
+    # sorted so that a seed reproduces the same batch
+    return DifficultyMatrix.from_resolved_index(
+        {subdir: resolved_index[subdir] for subdir in recent_submissions}, sorted(all_instances)
+    )
+
+
+def find_swe_batch(k=10, n_easy=5, n_medium=0, n_hard=0, p_medium=0.5, mirror=None, offline=False, seed=None):
+    matrix = _recent_matrix(k, mirror, offline)
+    k = len(matrix.submissions)
+    rng = random.Random(seed)
 
     # Count how many times each instance was solved in the last k submissions
-    instance_solved_count = {}
-    for idx, resolved in enumerate(resolved_sets):
-        for instance in resolved:
-            instance_solved_count[instance] = instance_solved_count.get(instance, 0) + 1
-    all_instances = set()
-    for resolved in resolved_sets:
-        all_instances.update(resolved)
-    # Also include instances that were never solved
-    swebench = get_swebench_verified_data()
-    for entry in swebench:
-        all_instances.add(entry['instance_id'])
+    instance_solved_count = matrix.solve_counts()
 
     easy, medium, hard = [], [], []
     lower = int((p_medium - 0.2) * k)
     upper = int((p_medium + 0.2) * k)
-    for instance in all_instances:
-        count = instance_solved_count.get(instance, 0)
+    for instance, count in zip(matrix.instance_ids, instance_solved_count):
         if count == k:
             easy.append(instance)
         elif count == 0:
@@ -68,9 +41,9 @@ def find_swe_batch(k=10, n_easy=5, n_medium=0, n_hard=0, p_medium=0.5):
 
     print(f"Found {len(easy)} easy, {len(medium)} medium, {len(hard)} hard instances to select from.")
     # Sample up to the requested number from each group
-    selected_easy = random.sample(easy, min(n_easy, len(easy))) if easy else []
-    selected_medium = random.sample(medium, min(n_medium, len(medium))) if medium else []
-    selected_hard = random.sample(hard, min(n_hard, len(hard))) if hard else []
+    selected_easy = rng.sample(easy, min(n_easy, len(easy))) if easy else []
+    selected_medium = rng.sample(medium, min(n_medium, len(medium))) if medium else []
+    selected_hard = rng.sample(hard, min(n_hard, len(hard))) if hard else []
 
     if len(selected_easy) < n_easy:
         print(f"Warning: Only found {len(selected_easy)} easy instances (requested {n_easy})")
@@ -82,12 +55,50 @@ def find_swe_batch(k=10, n_easy=5, n_medium=0, n_hard=0, p_medium=0.5):
     result = selected_easy + selected_medium + selected_hard
     print(f"Returned: {len(selected_easy)} easy, {len(selected_medium)} medium, {len(selected_hard)} hard instances.")
 
-    shutil.rmtree(tmp_dir)
+    return result
+
+
+def find_stratified_batch(n, k=10, bins=3, by_repo=True, seed=None, history_dir=None, history_alpha=1.0, mirror=None, offline=False):
+    """Sample n instances whose repo and difficulty mix matches the whole benchmark."""
+    matrix = _recent_matrix(k, mirror, offline)
+    repos = None
+    if by_repo:
+        repos = {row["instance_id"]: row["repo"] for row in get_instance_index().rows(("instance_id", "repo"))}
+    weights = None
+    if history_dir:
+        weights = history_weights(load_history(history_dir), history_alpha)
+        print(f"Weighting by our results on {len(weights)} previously evaluated instances.")
+    result = stratified_sample(matrix, n, repos=repos, bins=bins, seed=seed, weights=weights)
+    print(f"Returned: {len(result)} instances stratified over {bins} difficulty bins{' and repos' if by_repo else ''}.")
     return result
 
 def main():
-    # Default behavior
-    instances = find_swe_batch(k=10, n_easy=5, n_medium=0, n_hard=0, p_medium=0.5)
+    import argparse
+    parser = argparse.ArgumentParser(description="Select a batch of SWE-bench Verified instances by difficulty.")
+    parser.add_argument("--k", type=int, default=10, help="Number of most recent submissions to consider.")
+    parser.add_argument("--n_easy", type=int, default=5)
+    parser.add_argument("--n_medium", type=int, default=0)
+    parser.add_argument("--n_hard", type=int, default=0)
+    parser.add_argument("--p_medium", type=float, default=0.5)
+    parser.add_argument("--mirror", type=str, default=None, help="Local mirror of SWE-bench/experiments (git repo or plain copy).")
+    parser.add_argument("--offline", action="store_true", help="Use the cached checkout without fetching.")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for a reproducible selection.")
+    parser.add_argument("--stratified", type=int, default=0, help="Sample this many instances stratified by repo and difficulty instead of easy/medium/hard counts.")
+    parser.add_argument("--bins", type=int, default=3, help="Number of difficulty percentile bins for --stratified.")
+    parser.add_argument("--no_repo_strata", action="store_true", help="Stratify by difficulty only.")
+    parser.add_argument("--history_dir", type=str, default=None, help="Directory with our harness reports (e.g. logs/run_evaluation) used to weight the sampling.")
+    parser.add_argument("--history_alpha", type=float, default=1.0, help="Extra weight given to instances we failed before; negative favours ones we solved.")
+    args = parser.parse_args()
+    if args.stratified:
+        instances = find_stratified_batch(
+            args.stratified, k=args.k, bins=args.bins, by_repo=not args.no_repo_strata, seed=args.seed,
+            history_dir=args.history_dir, history_alpha=args.history_alpha, mirror=args.mirror, offline=args.offline,
+        )
+    else:
+        instances = find_swe_batch(
+            k=args.k, n_easy=args.n_easy, n_medium=args.n_medium, n_hard=args.n_hard,
+            p_medium=args.p_medium, mirror=args.mirror, offline=args.offline, seed=args.seed,
+        )
     print("Selected instances:", instances)
 
 # Example usage
@@ -0,0 +1,200 @@
+"""
+Cache of derived "qodo-ready" images, one per SWE-bench instance image.
+
+Every container used to reinstall Node.js and the Qodo CLI on startup. Instead, the
+bootstrap runs once per base image and the result is committed as
+`sweb.qodo.x86_64.<issue_key>:<cli_version>-<content_hash>`. The hash covers the
+bootstrap command and the bytes of the local qodo-command-*.tgz (when used), so a
+new CLI package or a changed bootstrap produces a new tag and the old layer is no
+longer picked up. When the CLI version cannot be resolved there is no ready image:
+containers bootstrap from the instance image instead of reusing a layer of
+unknown version.
+"""
+
+import argparse
+import hashlib
+import logging
+import os
+import re
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+
+import docker
+
+from .docker_client import get_docker_client
+from .utils import (
+    _put_file_in_container,
+    find_local_qodo_package,
+    get_bootstrap_command,
+    get_issue_image_name,
+)
+
+READY_IMAGE_PREFIX = "sweb.qodo.x86_64"
+BUILD_TIMEOUT = 1_800
+
+
+@lru_cache(maxsize=None)
+def _file_sha256(path: str, mtime: float, size: int) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@lru_cache(maxsize=None)
+def _npm_cli_version() -> str | None:
+    try:
+        output = subprocess.run(
+            ["npm", "view", "@qodo/command", "version"],
+            capture_output=True,
+            text=True,
+            timeout=30,
+        )
+        if output.returncode == 0 and output.stdout.strip():
+            return output.stdout.strip()
+        logging.warning(f"Cannot resolve @qodo/command version from npm: {output.stderr.strip()}")
+    except Exception as e:
+        logging.warning(f"Cannot resolve @qodo/command version from npm: {e}")
+    logging.warning("Qodo-ready images disabled, containers will bootstrap from the instance image")
+    return None
+
+
+def get_cli_version(local_package: str | None) -> str | None:
+    """Version of the Qodo CLI that the bootstrap would install, or None if unknown."""
+    if local_package:
+        match = re.match(r"qodo-command-(.+)\.tgz$", os.path.basename(local_package))
+        return match.group(1) if match else "local"
+    return _npm_cli_version()
+
+
+def get_ready_image_tag(local_package: str | None = None) -> str | None:
+    """Tag `<cli_version>-<content_hash>` shared by all derived images of one CLI build."""
+    version = get_cli_version(local_package)
+    if version is None:
+        return None
+    digest = hashlib.sha256(get_bootstrap_command(local_package).encode())
+    digest.update(version.encode())
+    if local_package:
+        stat = os.stat(local_package)
+        digest.update(_file_sha256(os.path.abspath(local_package), stat.st_mtime, stat.st_size).encode())
+    safe_version = re.sub(r"[^A-Za-z0-9_.-]", "_", version)
+    return f"{safe_version}-{digest.hexdigest()[:12]}"
+
+
+def get_ready_image_name(instance_id: str, local_package: str | None = None) -> str | None:
+    """Name of the derived qodo-ready image for the instance and the current CLI, None if the CLI version is unknown."""
+    if local_package is None:
+        local_package = find_local_qodo_package()
+    tag = get_ready_image_tag(local_package)
+    if tag is None:
+        return None
+    issue_key = instance_id.replace("__", "_1776_").lower()
+    return f"{READY_IMAGE_PREFIX}.{issue_key}:{tag}"
+
+
+def image_exists(client, image_name: str) -> bool:
+    try:
+        client.images.get(image_name)
+        return True
+    except docker.errors.ImageNotFound:  # type: ignore
+        return False
+    except docker.errors.APIError as e:  # type: ignore
+        logging.warning(f"Cannot inspect image {image_name}: {e}")
+        return False
+
+
+def build_ready_image(instance_id: str, force: bool = False) -> str:
+    """Run the bootstrap once on the instance image and commit the result."""
+    client = get_docker_client()
+    local_package = find_local_qodo_package()
+    ready_image = get_ready_image_name(instance_id, local_package)
+    if ready_image is None:
+        raise RuntimeError("Cannot resolve the Qodo CLI version to tag a qodo-ready image")
+    if not force and image_exists(client, ready_image):
+        logging.info(f"Qodo-ready image {ready_image} already built")
+        return ready_image
+
+    base_image = get_issue_image_name(instance_id)
+    if not image_exists(client, base_image):
+        logging.info(f"Pulling image {base_image}")
+        client.images.pull(base_image)
+
+    logging.info(f"Building qodo-ready image {ready_image} from {base_image}")
+    container = client.containers.create(
+        image=base_image,
+        command=f"bash -c '{get_bootstrap_command(local_package)}'",
+    )
+    try:
+        if local_package:
+            _put_file_in_container(
+                container.id, "/tmp", os.path.basename(local_package), local_package
+            )
+        container.start()
+        result = container.wait(timeout=BUILD_TIMEOUT)
+        if result.get("StatusCode") != 0:
+            tail = container.logs(tail=20).decode(errors="backslashreplace")
+            raise RuntimeError(
+                f"Bootstrap for {instance_id} exited with {result.get('StatusCode')}:\n{tail}"
+            )
+        repository, tag = ready_image.rsplit(":", 1)
+        container.commit(
+            repository=repository,
+            tag=tag,
+            message=f"qodo-ready layer for {base_image}",
+        )
+    finally:
+        container.remove(force=True)
+    logging.info(f"Built qodo-ready image {ready_image}")
+    return ready_image
+
+
+def build_ready_images(instance_ids, max_concurrency: int = 1, force: bool = False) -> dict:
+    """Build qodo-ready images for many instances; returns instance_id -> image or error."""
+    results = {}
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        futures = {
+            executor.submit(build_ready_image, instance_id, force): instance_id
+            for instance_id in instance_ids
+        }
+        for future in as_completed(futures):
+            instance_id = futures[future]
+            try:
+                results[instance_id] = future.result()
+            except Exception as e:
+                logging.error(f"Failed to build qodo-ready image for {instance_id}: {e}")
+                results[instance_id] = e
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-build qodo-ready images for SWE-bench instances.")
+    parser.add_argument("instance_ids", nargs="*", help="Instance IDs to build images for.")
+    parser.add_argument("--from_batch", action="store_true", help="Build for a batch selected by find_swe_batch.")
+    parser.add_argument("--k", type=int, default=10, help="Recent submissions considered by find_swe_batch.")
+    parser.add_argument("--n_easy", type=int, default=5)
+    parser.add_argument("--n_medium", type=int, default=0)
+    parser.add_argument("--n_hard", type=int, default=0)
+    parser.add_argument("--max_concurrency", type=int, default=1, help="Images built in parallel.")
+    parser.add_argument("--force", action="store_true", help="Rebuild even if the image exists.")
+    args = parser.parse_args()
+
+    instance_ids = list(args.instance_ids)
+    if args.from_batch:
+        from .find_swe_batch import find_swe_batch
+
+        instance_ids += find_swe_batch(
+            k=args.k, n_easy=args.n_easy, n_medium=args.n_medium, n_hard=args.n_hard
+        )
+    if not instance_ids:
+        parser.error("no instance ids given (pass ids or --from_batch)")
+
+    results = build_ready_images(instance_ids, args.max_concurrency, args.force)
+    for instance_id, result in results.items():
+        status = result if isinstance(result, str) else f"FAILED: {result}"
+        print(f"{instance_id}: {status}")
+
+
+if __name__ == "__main__":
+    main()
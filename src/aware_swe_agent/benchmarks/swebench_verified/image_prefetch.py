@@ -0,0 +1,181 @@
+"""
+Background prefetch of instance images with disk-watermark LRU eviction.
+
+The per-instance SWE-bench images are multi-GB, so pulling them dominates
+container startup. The prefetcher pulls the images of the next `lookahead`
+queued instances while earlier instances are running. Before each pull, if the
+Docker filesystem is above `high_watermark`, it removes least-recently-used
+`sweb.eval.*` images until usage drops under `low_watermark`. Images of
+instances not yet predicted are never evicted. The harness runs on the same
+images, so those of predicted instances still waiting for evaluation
+(`mark_evaluated`) are only evicted after every image outside the batch; the
+harness pulls them again if needed.
+"""
+
+import logging
+import shutil
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import docker
+
+from .docker_client import get_docker_client
+from .utils import get_issue_image_name, pull_image
+
+EVICTABLE_IMAGE_MARKER = "sweb.eval."
+
+
+class ImagePrefetcher:
+    """Pull images ahead of the scheduler and keep Docker disk usage between two watermarks."""
+
+    def __init__(
+        self,
+        instance_ids,
+        lookahead: int = 4,
+        high_watermark: float = 0.85,
+        low_watermark: float = 0.70,
+        max_parallel_pulls: int = 2,
+        disk_budget_bytes: int = 0,
+    ):
+        if not 0 < low_watermark < high_watermark <= 1:
+            raise ValueError("Watermarks must satisfy 0 < low < high <= 1")
+        self.instance_ids = list(dict.fromkeys(instance_ids))
+        self.lookahead = lookahead
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        # used when the daemon's filesystem is not visible from this host
+        self.disk_budget_bytes = disk_budget_bytes
+        self._started: set[str] = set()
+        self._finished: set[str] = set()
+        self._evaluated: set[str] = set()
+        self._pulls: dict[str, Future] = {}
+        self._last_used: dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._evict_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=max_parallel_pulls, thread_name_prefix="prefetch")
+        self._thread = threading.Thread(target=self._loop, name="image-prefetcher", daemon=True)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def start(self):
+        self._thread.start()
+        self._wakeup.set()
+
+    def close(self):
+        self._closed.set()
+        self._wakeup.set()
+        self._thread.join()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def _touch(self, image_name: str) -> None:
+        with self._lock:
+            self._last_used[image_name] = time.time()
+
+    def _pull(self, instance_id: str) -> str:
+        self.evict_if_needed()
+        image_name = pull_image(instance_id)
+        self._touch(image_name)
+        return image_name
+
+    def ensure(self, instance_id: str) -> str:
+        """Make the image for `instance_id` available, reusing an in-flight prefetch if there is one."""
+        with self._lock:
+            future = self._pulls.get(instance_id)
+        image_name = future.result() if future else self._pull(instance_id)
+        self._touch(image_name)
+        return image_name
+
+    def mark_started(self, instance_id: str) -> None:
+        with self._lock:
+            self._started.add(instance_id)
+        self._touch(get_issue_image_name(instance_id))
+        self._wakeup.set()
+
+    def mark_finished(self, instance_id: str) -> None:
+        with self._lock:
+            self._started.add(instance_id)
+            self._finished.add(instance_id)
+            self._pulls.pop(instance_id, None)
+        self._touch(get_issue_image_name(instance_id))
+        self._wakeup.set()
+
+    def mark_evaluated(self, instance_ids) -> None:
+        """Release the images of instances the harness is done with for eviction."""
+        with self._lock:
+            self._evaluated.update(instance_ids)
+
+    def _loop(self):
+        while not self._closed.is_set():
+            self._wakeup.wait()
+            self._wakeup.clear()
+            if self._closed.is_set():
+                return
+            with self._lock:
+                upcoming = [
+                    i for i in self.instance_ids if i not in self._started
+                ][: self.lookahead]
+                to_pull = [i for i in upcoming if i not in self._pulls]
+                for instance_id in to_pull:
+                    logging.info(f"Prefetching image for {instance_id}")
+                    self._pulls[instance_id] = self._executor.submit(self._pull, instance_id)
+
+    def _needed_images(self) -> tuple[set[str], set[str]]:
+        """Images of instances still to predict, and of predicted ones still to evaluate."""
+        with self._lock:
+            to_predict = {get_issue_image_name(i) for i in self.instance_ids if i not in self._finished}
+            to_evaluate = {
+                get_issue_image_name(i) for i in self._finished if i not in self._evaluated
+            }
+        return to_predict, to_evaluate - to_predict
+
+    def disk_usage(self) -> tuple[int, int] | None:
+        """Return (used, total) bytes for the Docker storage, or None if it cannot be measured."""
+        client = get_docker_client()
+        try:
+            usage = shutil.disk_usage(client.info()["DockerRootDir"])
+            return usage.used, usage.total
+        except (OSError, KeyError):
+            pass
+        if self.disk_budget_bytes:
+            return client.df().get("LayersSize", 0), self.disk_budget_bytes
+        return None
+
+    def evict_if_needed(self) -> list[str]:
+        """Remove least-recently-used unneeded images while usage is above the high watermark."""
+        with self._evict_lock:
+            usage = self.disk_usage()
+            if usage is None or usage[0] / usage[1] < self.high_watermark:
+                return []
+            used, total = usage
+            logging.info(f"Docker disk usage {used / total:.0%} is above {self.high_watermark:.0%}, evicting images")
+            to_predict, to_evaluate = self._needed_images()
+            candidates = []
+            for image in get_docker_client().images.list():
+                tags = [t for t in image.tags if EVICTABLE_IMAGE_MARKER in t]
+                if tags and not set(image.tags) & to_predict:
+                    with self._lock:
+                        last_used = max(self._last_used.get(t, 0.0) for t in image.tags)
+                    # images outside the batch go first, then those still to evaluate
+                    candidates.append((bool(set(image.tags) & to_evaluate), last_used, tags))
+            candidates.sort(key=lambda c: c[:2])
+            evicted = []
+            for _, _, tags in candidates:
+                for tag in tags:
+                    try:
+                        get_docker_client().images.remove(image=tag)
+                        evicted.append(tag)
+                        logging.info(f"Evicted image {tag}")
+                    except docker.errors.APIError as e:  # type: ignore
+                        logging.warning(f"Failed to evict image {tag}: {e}")
+                usage = self.disk_usage()
+                if usage is None or usage[0] / usage[1] < self.low_watermark:
+                    break
+            return evicted
@@ -0,0 +1,206 @@
+"""
+Local on-disk index of SWE-bench Verified instances.
+
+Loading the whole dataset with `load_dataset` for every lookup costs seconds of
+I/O and hundreds of MB per worker thread. The fields the runner and
+`find_swe_batch` need are materialized once into a small SQLite file keyed by
+`instance_id`, which every thread then reads with O(1) lookups.
+"""
+
+import argparse
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+
+from .utils import get_cache_dir, get_swebench_verified_data
+
+INDEX_SCHEMA_VERSION = 1
+DATASET_NAME = "SWE-bench/SWE-bench_Verified"
+INDEX_FIELDS = ("instance_id", "repo", "base_commit", "version", "problem_statement")
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index_path() -> Path:
+    """Location of the index, overridable with AWARE_SWE_INDEX_PATH."""
+    env_path = os.getenv("AWARE_SWE_INDEX_PATH")
+    if env_path:
+        return Path(env_path)
+    return get_cache_dir() / "swebench_verified_index.sqlite"
+
+
+def get_dataset_revision() -> str:
+    """Return the current Hub revision of the dataset, or "" when offline."""
+    try:
+        from huggingface_hub import HfApi
+
+        return HfApi().dataset_info(DATASET_NAME).sha or ""
+    except Exception as e:
+        logging.warning(f"Cannot resolve revision of {DATASET_NAME}: {e}")
+        return ""
+
+
+def build_index(rows, path: Path | None = None, revision: str = "") -> Path:
+    """Write `rows` to a fresh index file and atomically swap it into place."""
+    path = Path(path) if path else get_index_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    if tmp_path.exists():
+        tmp_path.unlink()
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+        conn.execute(
+            "CREATE TABLE instances ("
+            "instance_id TEXT PRIMARY KEY, repo TEXT, base_commit TEXT, "
+            "version TEXT, problem_statement TEXT)"
+        )
+        count = 0
+        for row in rows:
+            conn.execute(
+                "INSERT OR REPLACE INTO instances VALUES (?, ?, ?, ?, ?)",
+                tuple(str(row.get(field) or "") for field in INDEX_FIELDS),
+            )
+            count += 1
+        meta = {
+            "schema_version": str(INDEX_SCHEMA_VERSION),
+            "dataset": DATASET_NAME,
+            "revision": revision,
+            "built_at": str(time.time()),
+            "row_count": str(count),
+        }
+        conn.executemany("INSERT INTO meta VALUES (?, ?)", meta.items())
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp_path, path)
+    logging.info(f"Built instance index with {count} instances at {path}")
+    return path
+
+
+def rebuild_index(path: Path | None = None) -> Path:
+    """Load SWE-bench Verified from the Hub and rebuild the index."""
+    revision = get_dataset_revision()
+    return build_index(get_swebench_verified_data(), path=path, revision=revision)
+
+
+def read_index_meta(path: Path | None = None) -> dict:
+    """Return the meta table of the index, or {} when it is missing or unreadable."""
+    path = Path(path) if path else get_index_path()
+    if not path.exists():
+        return {}
+    try:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            return dict(conn.execute("SELECT key, value FROM meta").fetchall())
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        logging.warning(f"Cannot read instance index at {path}: {e}")
+        return {}
+
+
+def check_index_staleness(
+    path: Path | None = None, check_remote: bool = False, max_age_days: float | None = None
+) -> str:
+    """Return the reason the index is stale, or "" when it is usable as is."""
+    meta = read_index_meta(path)
+    if not meta:
+        return "missing"
+    if meta.get("schema_version") != str(INDEX_SCHEMA_VERSION):
+        return f"schema version {meta.get('schema_version')} != {INDEX_SCHEMA_VERSION}"
+    if max_age_days is not None:
+        age_days = (time.time() - float(meta.get("built_at", 0))) / 86400
+        if age_days > max_age_days:
+            return f"built {age_days:.1f} days ago"
+    if check_remote:
+        remote_revision = get_dataset_revision()
+        if remote_revision and remote_revision != meta.get("revision"):
+            return f"dataset revision changed to {remote_revision}"
+    return ""
+
+
+class InstanceIndex:
+    """Read-only view of the index with one SQLite connection per thread."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA mmap_size = 268435456")
+            self._local.conn = conn
+        return conn
+
+    def get(self, instance_id: str) -> dict | None:
+        row = self._conn().execute(
+            "SELECT * FROM instances WHERE instance_id = ?", (instance_id,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def instance_ids(self) -> list[str]:
+        rows = self._conn().execute("SELECT instance_id FROM instances ORDER BY instance_id")
+        return [row[0] for row in rows]
+
+    def rows(self, fields=INDEX_FIELDS) -> list[dict]:
+        columns = ", ".join(f for f in fields if f in INDEX_FIELDS)
+        rows = self._conn().execute(f"SELECT {columns} FROM instances ORDER BY instance_id")
+        return [dict(row) for row in rows]
+
+    def __contains__(self, instance_id: str) -> bool:
+        return self.get(instance_id) is not None
+
+    def __len__(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM instances").fetchone()[0]
+
+
+def get_instance_index() -> InstanceIndex:
+    """Return the process-wide index, building it on first use if missing or outdated."""
+    global _index
+    with _index_lock:
+        path = get_index_path()
+        if _index is None or _index.path != path:
+            reason = check_index_staleness(path)
+            if reason:
+                logging.info(f"Instance index at {path} needs a rebuild: {reason}")
+                rebuild_index(path)
+            _index = InstanceIndex(path)
+        return _index
+
+
+def get_instance(instance_id: str) -> dict | None:
+    return get_instance_index().get(instance_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the local SWE-bench Verified instance index.")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the index from the Hub dataset.")
+    parser.add_argument("--check", action="store_true", help="Also compare against the current Hub revision.")
+    parser.add_argument("--max_age_days", type=float, default=None, help="Treat older indexes as stale.")
+    parser.add_argument("--path", type=str, default=None, help="Index file (default: cache dir).")
+    args = parser.parse_args()
+
+    path = Path(args.path) if args.path else get_index_path()
+    if args.rebuild:
+        rebuild_index(path)
+    reason = check_index_staleness(path, check_remote=args.check, max_age_days=args.max_age_days)
+    meta = read_index_meta(path)
+    print(f"Index: {path}")
+    for key, value in meta.items():
+        print(f"  {key}: {value}")
+    print(f"Stale: {reason}" if reason else "Up to date")
+    if reason:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
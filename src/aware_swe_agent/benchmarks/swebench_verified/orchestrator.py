@@ -0,0 +1,143 @@
+"""
+Asyncio orchestrator that runs each prediction as a pipeline of bounded stages.
+
+With a flat thread pool the network-bound stages (image pull, npm install) and the
+long solve stage share one concurrency knob. Here every stage has its own
+semaphore, the blocking helpers run in a thread pool, and container teardown is
+scheduled in the background so it never holds up the next solve.
+"""
+
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from .run_swe_instance import (
+    extract_patch,
+    provision_container,
+    save_prediction,
+    solve_instance,
+)
+from .utils import pull_image, stop_container
+
+STAGES = ("pull", "provision", "solve", "patch", "teardown")
+
+
+def parse_stage_limits(spec: str | None, max_concurrency: int) -> dict[str, int]:
+    """Parse "pull=4,solve=16" into per-stage limits; stages not listed default to `max_concurrency`."""
+    limits = {stage: max_concurrency for stage in STAGES}
+    for item in (spec or "").split(","):
+        if not item.strip():
+            continue
+        stage, _, value = item.partition("=")
+        stage = stage.strip()
+        if stage not in STAGES:
+            raise ValueError(f"Unknown stage '{stage}', expected one of {', '.join(STAGES)}")
+        try:
+            limits[stage] = int(value)
+        except ValueError:
+            raise ValueError(f"Stage limit for '{stage}' must be an integer, got '{value.strip()}'") from None
+        if limits[stage] < 1:
+            raise ValueError(f"Stage limit for '{stage}' must be at least 1")
+    return limits
+
+
+class StagedOrchestrator:
+    """Run predictions through the pull, provision, solve, patch and teardown stages."""
+
+    def __init__(self, predictions_path, session_logs_dir, stage_limits: dict[str, int], session_log_options=None, on_complete=None, prefetcher=None):
+        self.predictions_path = predictions_path
+        self.session_logs_dir = session_logs_dir
+        self.stage_limits = stage_limits
+        self.session_log_options = session_log_options
+        self.on_complete = on_complete
+        self.prefetcher = prefetcher
+        self._executor = ThreadPoolExecutor(
+            max_workers=sum(stage_limits.values()), thread_name_prefix="stage"
+        )
+        self._semaphores: dict[str, asyncio.Semaphore] = {}
+        self._admission: asyncio.Semaphore | None = None
+        self._teardowns: set[asyncio.Task] = set()
+
+    async def _stage(self, stage: str, func, *args):
+        async with self._semaphores[stage]:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, func, *args)
+
+    async def _teardown(self, instance_id: str, container_id: str):
+        try:
+            await self._stage("teardown", stop_container, container_id)
+        except Exception as e:
+            logging.warning(f"Teardown of {container_id} for {instance_id} failed: {e}")
+        finally:
+            if self.prefetcher:
+                self.prefetcher.mark_finished(instance_id)
+
+    async def _run_instance(self, instance_id: str):
+        # admission keeps the number of in-flight instances, and so live containers, bounded
+        async with self._admission:
+            try:
+                if self.prefetcher:
+                    self.prefetcher.mark_started(instance_id)
+                    await self._stage("pull", self.prefetcher.ensure, instance_id)
+                else:
+                    await self._stage("pull", pull_image, instance_id)
+                container_id = await self._stage("provision", provision_container, instance_id)
+            except Exception:
+                if self.prefetcher:
+                    self.prefetcher.mark_finished(instance_id)
+                raise
+            try:
+                await self._stage(
+                    "solve",
+                    solve_instance,
+                    instance_id,
+                    container_id,
+                    self.session_logs_dir,
+                    self.session_log_options,
+                )
+                patch = await self._stage("patch", extract_patch, container_id)
+            finally:
+                task = asyncio.create_task(self._teardown(instance_id, container_id))
+                self._teardowns.add(task)
+                task.add_done_callback(self._teardowns.discard)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(
+            self._executor, save_prediction, instance_id, patch, self.predictions_path
+        )
+        logging.info(f"Predict for instance {instance_id} completed")
+        if self.on_complete:
+            self.on_complete(instance_id)
+
+    async def run(self, instance_ids) -> dict[str, Exception]:
+        """Process all instances; returns the instances that failed with their errors."""
+        self._semaphores = {
+            stage: asyncio.Semaphore(limit) for stage, limit in self.stage_limits.items()
+        }
+        self._admission = asyncio.Semaphore(
+            sum(self.stage_limits[stage] for stage in ("pull", "provision", "solve", "patch"))
+        )
+        logging.info(f"Staged orchestrator limits: {self.stage_limits}")
+        try:
+            results = await asyncio.gather(
+                *(self._run_instance(instance_id) for instance_id in instance_ids),
+                return_exceptions=True,
+            )
+            failures = {}
+            for instance_id, result in zip(instance_ids, results):
+                if isinstance(result, Exception):
+                    logging.error(f"Prediction failed for {instance_id}: {result}")
+                    failures[instance_id] = result
+            if self._teardowns:
+                await asyncio.gather(*list(self._teardowns), return_exceptions=True)
+            return failures
+        finally:
+            self._executor.shutdown(wait=True)
+
+
+def run_staged_predictions(
+    instance_ids, predictions_path, session_logs_dir, stage_limits: dict[str, int], session_log_options=None, on_complete=None, prefetcher=None
+) -> dict[str, Exception]:
+    orchestrator = StagedOrchestrator(
+        predictions_path, session_logs_dir, stage_limits, session_log_options, on_complete, prefetcher
+    )
+    return asyncio.run(orchestrator.run(list(instance_ids)))
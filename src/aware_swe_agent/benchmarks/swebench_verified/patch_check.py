@@ -0,0 +1,188 @@
+"""
+Host-side validation of predictions before they reach the SWE-bench harness.
+
+Empty patches, the diff error placeholder and patches that do not apply to the
+instance's base commit cannot resolve anything, yet each would cost a harness
+container run. `validate_predictions` checks every prediction in parallel
+against a cached blobless bare clone of the instance's repository: the files the
+patch touches are materialized from `base_commit` into a scratch directory (one
+`git cat-file --batch` per patch) and the patch is dry-run there with
+`git apply --check`, then with `patch --fuzz=5`, mirroring the harness's own
+fallbacks. Only predictions that fail every check are rejected. Predictions that
+cannot be checked (no checkout, a diff header that cannot be parsed, a failing
+git or patch) pass through to the harness.
+"""
+
+import codecs
+import logging
+import os
+import re
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+from .instance_index import get_instance
+from .prediction_store import _locked
+from .utils import PATCH_ERROR_OUTPUT, get_cache_dir
+
+REPO_URL_TEMPLATE = "https://github.com/{repo}.git"
+_DIFF_START_RE = re.compile(r"^diff --git ", re.MULTILINE)
+# git quotes paths with special or non-ASCII characters (core.quotePath): "a/caf\303\251.py"
+_QUOTED_PATH = r'"(?:[^"\\]|\\.)*"'
+_DIFF_HEADER_RE = re.compile(rf"^diff --git (?P<a>{_QUOTED_PATH}|a/.+?) (?P<b>{_QUOTED_PATH}|b/.+?)$", re.MULTILINE)
+_enabled = True
+
+
+def configure_fast_reject(enabled: bool) -> None:
+    global _enabled
+    _enabled = enabled
+
+
+def fast_reject_enabled() -> bool:
+    return _enabled
+
+
+@dataclass
+class Rejection:
+    status: str
+    reason: str
+    detail: str = ""
+
+
+def get_repos_dir() -> Path:
+    return get_cache_dir() / "repos"
+
+
+def _git(repo_dir: Path, *args: str, input: bytes | None = None) -> bytes:
+    return subprocess.run(
+        ["git", "--git-dir", str(repo_dir), *args], input=input, capture_output=True, check=True
+    ).stdout
+
+
+def ensure_checkout(repo: str, base_commit: str) -> Path:
+    """Return a bare clone of `repo` that contains `base_commit`, cloning or fetching as needed."""
+    repo_dir = get_repos_dir() / f"{repo.replace('/', '__')}.git"
+    repo_dir.parent.mkdir(parents=True, exist_ok=True)
+    url = os.environ.get("AWARE_SWE_REPO_URL_TEMPLATE", REPO_URL_TEMPLATE).format(repo=repo)
+    with _locked(Path(str(repo_dir) + ".lock")):
+        if not repo_dir.exists():
+            logging.info(f"Cloning {url} into {repo_dir}")
+            subprocess.run(
+                ["git", "clone", "--bare", "--filter=blob:none", url, str(repo_dir)], capture_output=True, check=True
+            )
+        try:
+            _git(repo_dir, "cat-file", "-e", f"{base_commit}^{{commit}}")
+        except subprocess.CalledProcessError:
+            _git(repo_dir, "fetch", "--filter=blob:none", "origin", base_commit)
+    return repo_dir
+
+
+def _header_path(token: str) -> str | None:
+    if token.startswith('"'):
+        try:
+            token = codecs.escape_decode(token[1:-1].encode())[0].decode("utf-8")
+        except (ValueError, UnicodeDecodeError):
+            return None
+    return token[2:]
+
+
+def _touched_paths(patch: str) -> list[str] | None:
+    """Pre-image paths of the files the patch modifies, deletes or renames; None if a header cannot be parsed."""
+    paths = []
+    for section in re.split(r"(?m)^(?=diff --git )", patch):
+        if not section.startswith("diff --git "):
+            continue
+        header = _DIFF_HEADER_RE.match(section)
+        path = _header_path(header["a"]) if header else None
+        if path is None:
+            return None
+        if "\nnew file mode" not in section.split("\n@@", 1)[0]:
+            paths.append(path)
+    return paths
+
+
+def _materialize(repo_dir: Path, base_commit: str, paths: list[str], dest: Path) -> None:
+    if not paths:
+        return
+    request = "".join(f"{base_commit}:{path}\n" for path in paths).encode()
+    output = _git(repo_dir, "cat-file", "--batch", input=request)
+    position = 0
+    for path in paths:
+        header_end = output.index(b"\n", position)
+        header = output[position:header_end].split()
+        position = header_end + 1
+        if header[-1] == b"missing":
+            continue
+        size = int(header[2])
+        target = dest / path
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(output[position : position + size])
+        position += size + 1
+
+
+def _dry_run(work_dir: Path, patch_path: Path) -> tuple[bool, str]:
+    result = subprocess.run(["git", "apply", "--check", str(patch_path)], cwd=work_dir, capture_output=True, text=True)
+    if result.returncode == 0:
+        return True, ""
+    fallback = subprocess.run(
+        ["patch", "--batch", "--fuzz=5", "-p1", "--dry-run", "-i", str(patch_path)], cwd=work_dir, capture_output=True, text=True
+    )
+    if fallback.returncode == 0:
+        return True, ""
+    return False, (result.stderr or fallback.stdout).strip()
+
+
+def check_prediction(pred: dict) -> Rejection | None:
+    """Return why the prediction cannot resolve its instance, or None if the harness should run it."""
+    patch = pred.get("model_patch") or ""
+    if not patch.strip():
+        return Rejection("empty_patch_ids", "empty_patch")
+    if patch.strip() == PATCH_ERROR_OUTPUT:
+        return Rejection("unresolved_ids", "patch_extraction_failed", patch.strip())
+    if not _DIFF_START_RE.search(patch):
+        return Rejection("unresolved_ids", "not_a_diff", patch[:200])
+    if "GIT binary patch" in patch:
+        return None
+    paths = _touched_paths(patch)
+    if paths is None:
+        # never reject a diff that cannot be parsed here
+        return None
+    instance = get_instance(pred["instance_id"])
+    if instance is None:
+        return None
+    try:
+        repo_dir = ensure_checkout(instance["repo"], instance["base_commit"])
+        with tempfile.TemporaryDirectory(prefix="patch_check_") as tmp:
+            work_dir = Path(tmp) / "tree"
+            work_dir.mkdir()
+            _materialize(repo_dir, instance["base_commit"], paths, work_dir)
+            patch_path = Path(tmp) / "model.patch"
+            patch_path.write_text(patch if patch.endswith("\n") else patch + "\n")
+            applies, detail = _dry_run(work_dir, patch_path)
+    except (OSError, subprocess.CalledProcessError) as e:
+        detail = e.stderr.decode(errors="replace").strip() if isinstance(getattr(e, "stderr", None), bytes) else str(e)
+        logging.warning(f"Cannot check {pred['instance_id']} against {instance['repo']}, leaving it to the harness: {detail}")
+        return None
+    if not applies:
+        return Rejection("unresolved_ids", "does_not_apply", detail)
+    return None
+
+
+def validate_predictions(preds: dict[str, dict], max_workers: int = 8) -> dict[str, Rejection]:
+    """Check predictions in parallel; returns instance_id -> rejection for those that cannot resolve."""
+    if not preds:
+        return {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = dict(zip(preds, executor.map(check_prediction, preds.values())))
+    rejected = {i: r for i, r in results.items() if r is not None}
+    if rejected:
+        reasons = {}
+        for r in rejected.values():
+            reasons[r.reason] = reasons.get(r.reason, 0) + 1
+        logging.info(
+            f"Rejected {len(rejected)} of {len(preds)} predictions before evaluation: "
+            + ", ".join(f"{n} {reason}" for reason, n in sorted(reasons.items()))
+        )
+    return rejected
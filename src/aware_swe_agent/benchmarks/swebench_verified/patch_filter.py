@@ -0,0 +1,240 @@
+"""
+Streaming extraction and filtering of the agent's patch.
+
+`git diff HEAD` is read from the Docker exec stream chunk by chunk and split
+into per-file sections at `diff --git` headers (found with `str.find`, not a
+per-line loop). Sections whose target path matches the compiled test-path rules
+are dropped without being buffered, and sections above the per-file cap, or
+that would push the patch over the total cap, are left out and listed in the
+`PatchFilterReport`. Only the kept patch is ever held in memory.
+"""
+
+import codecs
+import logging
+import re
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from .docker_client import get_docker_client
+from .tracing import record_span, traced
+
+DEFAULT_TEST_PATTERNS = ("/test/", "/tests/", "/testing/", "test_", "tox.ini")
+DIFF_HEADER = "diff --git a/"
+
+
+def _utf8_size(text: str) -> int:
+    # diffs are mostly ASCII, where the character count already is the byte count
+    return len(text) if text.isascii() else len(text.encode("utf-8"))
+
+
+class PatchFilterRules:
+    """Compiled test-path rules plus per-file and total size caps (0 disables a cap)."""
+
+    def __init__(
+        self,
+        test_patterns=DEFAULT_TEST_PATTERNS,
+        test_regexes=(),
+        max_file_bytes: int = 0,
+        max_total_bytes: int = 0,
+    ):
+        alternatives = [re.escape(p) for p in test_patterns] + list(test_regexes)
+        self.test_path_re = re.compile("|".join(alternatives)) if alternatives else None
+        self.max_file_bytes = max_file_bytes
+        self.max_total_bytes = max_total_bytes
+
+    def is_test_path(self, target_path: str) -> bool:
+        return bool(
+            self.test_path_re
+            and target_path.startswith("b/")
+            and self.test_path_re.search(target_path)
+        )
+
+
+_rules = PatchFilterRules()
+
+
+def configure_patch_filter(rules: PatchFilterRules) -> None:
+    """Use `rules` for every patch extracted from now on."""
+    global _rules
+    _rules = rules
+
+
+def get_patch_filter_rules() -> PatchFilterRules:
+    return _rules
+
+
+@dataclass
+class PatchFilterReport:
+    bytes_in: int = 0
+    bytes_out: int = 0
+    kept_files: int = 0
+    test_files: list[str] = field(default_factory=list)
+    oversized_files: list[tuple[str, int]] = field(default_factory=list)
+    over_total_files: list[tuple[str, int]] = field(default_factory=list)
+
+    def summary(self) -> str:
+        text = (
+            f"kept {self.kept_files} file(s), {self.bytes_out} of {self.bytes_in} bytes; "
+            f"removed {len(self.test_files)} test file(s)"
+        )
+        if self.oversized_files:
+            text += f"; dropped {len(self.oversized_files)} file(s) over the per-file cap: " + ", ".join(
+                f"{path} ({size} bytes)" for path, size in self.oversized_files
+            )
+        if self.over_total_files:
+            text += f"; dropped {len(self.over_total_files)} file(s) over the total cap: " + ", ".join(
+                f"{path} ({size} bytes)" for path, size in self.over_total_files
+            )
+        return text
+
+
+class PatchFilter:
+    """Incremental filter fed with decoded diff text; sizes are counted in UTF-8 bytes."""
+
+    def __init__(self, rules: PatchFilterRules | None = None):
+        self.rules = rules or get_patch_filter_rules()
+        self.report = PatchFilterReport()
+        self._output: list[str] = []
+        self._pending = ""
+        self._line_start = True
+        # current file section: None before the first header (preamble is kept)
+        self._path: str | None = None
+        self._kind = "keep"
+        self._section: list[str] = []
+        self._section_size = 0
+
+    def _start_file(self, header: str) -> None:
+        self._finish_file()
+        target_path = header.split()[-1]
+        self._path = target_path
+        self._section = []
+        self._section_size = 0
+        if self.rules.is_test_path(target_path):
+            self._kind = "test"
+            self.report.test_files.append(target_path)
+        else:
+            self._kind = "keep"
+            self._body(header)
+
+    def _body(self, text: str) -> None:
+        if self._kind == "test":
+            return
+        self._section_size += _utf8_size(text)
+        if self._kind == "oversized":
+            return
+        max_file = self.rules.max_file_bytes
+        if max_file and self._path is not None and self._section_size > max_file:
+            self._kind = "oversized"
+            self._section = []
+            return
+        self._section.append(text)
+
+    def _finish_file(self) -> None:
+        if self._kind == "oversized":
+            self.report.oversized_files.append((self._path, self._section_size))
+        elif self._kind == "keep" and self._section:
+            max_total = self.rules.max_total_bytes
+            if max_total and self.report.bytes_out + self._section_size > max_total:
+                self.report.over_total_files.append((self._path or "<preamble>", self._section_size))
+            else:
+                self._output.extend(self._section)
+                self.report.bytes_out += self._section_size
+                if self._path is not None:
+                    self.report.kept_files += 1
+        self._section = []
+        self._section_size = 0
+
+    def feed(self, text: str) -> None:
+        self.report.bytes_in += _utf8_size(text)
+        buf = self._pending + text
+        pos = 0
+        while pos < len(buf):
+            if not self._line_start:
+                newline = buf.find("\n", pos)
+                if newline == -1:
+                    self._body(buf[pos:])
+                    pos = len(buf)
+                    break
+                self._body(buf[pos : newline + 1])
+                pos = newline + 1
+                self._line_start = True
+            if buf.startswith(DIFF_HEADER, pos):
+                newline = buf.find("\n", pos)
+                if newline == -1:
+                    break
+                self._start_file(buf[pos : newline + 1])
+                pos = newline + 1
+                continue
+            header = buf.find("\n" + DIFF_HEADER, pos)
+            if header != -1:
+                self._body(buf[pos : header + 1])
+                pos = header + 1
+                continue
+            # no header in sight: flush whole lines, and a partial line unless it may be a header
+            rest = buf[pos:]
+            last_newline = rest.rfind("\n")
+            tail = rest[last_newline + 1 :]
+            if DIFF_HEADER.startswith(tail):
+                self._body(rest[: last_newline + 1])
+                pos += last_newline + 1
+                break
+            self._body(rest)
+            self._line_start = False
+            pos = len(buf)
+        self._pending = buf[pos:]
+
+    def close(self) -> str:
+        """Flush the last section and return the filtered patch."""
+        if self._pending:
+            pending, self._pending = self._pending, ""
+            if self._line_start and pending.startswith(DIFF_HEADER):
+                self._start_file(pending)
+            else:
+                self._body(pending)
+        self._finish_file()
+        return "".join(self._output)
+
+
+def filter_patch(model_patch: str, rules: PatchFilterRules | None = None) -> tuple[str, PatchFilterReport]:
+    patch_filter = PatchFilter(rules)
+    patch_filter.feed(model_patch)
+    patch = patch_filter.close()
+    return patch, patch_filter.report
+
+
+@traced("diff")
+def stream_patch_from_container(
+    container_id: str, rules: PatchFilterRules | None = None, repo_root: Path = Path("/testbed")
+) -> tuple[str, PatchFilterReport]:
+    """Filter `git diff HEAD` from the container as it streams; raises RuntimeError if git fails."""
+    client = get_docker_client()
+    exec_id = client.api.exec_create(
+        container_id, ["git", "--no-pager", "diff", "HEAD"], stdout=True, stderr=True, workdir=str(repo_root)
+    )["Id"]
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="backslashreplace")
+    patch_filter = PatchFilter(rules)
+    stderr = []
+    started = time.time()
+    filter_seconds = 0.0
+    for stdout_chunk, stderr_chunk in client.api.exec_start(exec_id, stream=True, demux=True):
+        if stdout_chunk:
+            chunk_started = time.perf_counter()
+            patch_filter.feed(decoder.decode(stdout_chunk))
+            filter_seconds += time.perf_counter() - chunk_started
+        if stderr_chunk:
+            stderr.append(stderr_chunk)
+    patch_filter.feed(decoder.decode(b"", final=True))
+    # filtering is interleaved with the stream; its summed time is recorded as one child span
+    record_span("filter", started, started + filter_seconds, bytes_in=patch_filter.report.bytes_in)
+    exit_code = client.api.exec_inspect(exec_id).get("ExitCode")
+    if exit_code != 0:
+        message = b"".join(stderr).decode(errors="backslashreplace").strip()
+        raise RuntimeError(f"git diff exited with {exit_code}: {message}")
+    patch = patch_filter.close()
+    report = patch_filter.report
+    if report.oversized_files or report.over_total_files:
+        logging.warning(f"Patch from {container_id} was capped: {report.summary()}")
+    else:
+        logging.info(f"Patch from {container_id}: {report.summary()}")
+    return patch, report
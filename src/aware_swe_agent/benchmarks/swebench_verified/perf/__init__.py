@@ -0,0 +1,3 @@
+"""
+Performance benchmarks for the SWE-bench runner's orchestration layer.
+"""
@@ -0,0 +1,83 @@
+"""
+Micro-benchmark of per-call Docker client overhead.
+
+Compares the previous helper pattern, `docker.from_env()` plus `containers.get()`
+on every call, with the shared client and cached container handles, against a
+throwaway container:
+
+    python -m aware_swe_agent.benchmarks.swebench_verified.perf.bench_docker_client --calls 200 --threads 8
+"""
+
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import docker
+
+from ..docker_client import configure_docker_client, get_container, get_docker_client
+
+
+def _per_call_client(container_id: str, op: str) -> None:
+    client = docker.from_env()
+    try:
+        container = client.containers.get(container_id)
+        if op == "exec":
+            container.exec_run("true")
+    finally:
+        client.close()
+
+
+def _shared_client(container_id: str, op: str) -> None:
+    container = get_container(container_id)
+    if op == "exec":
+        container.exec_run("true")
+
+
+def _timed(func, *args) -> float:
+    started = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - started
+
+
+def run_bench(func, container_id: str, op: str, calls: int, threads: int) -> dict:
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        latencies = list(executor.map(lambda _: _timed(func, container_id, op), range(calls)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "mean_ms": 1000 * statistics.mean(latencies),
+        "p50_ms": 1000 * latencies[len(latencies) // 2],
+        "p95_ms": 1000 * latencies[int(len(latencies) * 0.95) - 1],
+        "calls_per_s": calls / elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure per-call Docker client overhead before and after sharing the client.")
+    parser.add_argument("--image", default="alpine:3", help="Image for the throwaway container.")
+    parser.add_argument("--calls", type=int, default=200, help="Calls per variant.")
+    parser.add_argument("--threads", type=int, default=8, help="Concurrent callers.")
+    parser.add_argument("--op", choices=("handle", "exec"), default="exec", help="'handle' only resolves the container, 'exec' also runs `true` in it.")
+    args = parser.parse_args()
+
+    configure_docker_client(2 * args.threads)
+    client = get_docker_client()
+    container = client.containers.run(args.image, "sleep 600", detach=True, remove=True)
+    try:
+        # warm up both paths so image and connection setup are not measured
+        _per_call_client(container.id, args.op)
+        _shared_client(container.id, args.op)
+        for name, func in (("per-call from_env", _per_call_client), ("shared client", _shared_client)):
+            result = run_bench(func, container.id, args.op, args.calls, args.threads)
+            print(
+                f"{name:>18}: mean {result['mean_ms']:.2f} ms, p50 {result['p50_ms']:.2f} ms, "
+                f"p95 {result['p95_ms']:.2f} ms, {result['calls_per_s']:.1f} calls/s"
+            )
+    finally:
+        container.stop(timeout=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+Scaling benchmark of the prediction runner against the fake Docker backend.
+
+Drives `run_swe_instances.run_predictions` (thread pool, warm pool or staged
+orchestrator) and the real `utils` helpers with `FakeDockerClient` installed,
+so only the runner's own overhead is measured. Each concurrency level runs in a
+fresh subprocess and reports instances/hour, peak RSS, peak thread count and
+contention on the shared locks (Docker client, container handles, prediction
+journal, logging handlers):
+
+    python -m aware_swe_agent.benchmarks.swebench_verified.perf.bench_orchestrator --levels 1,4,16,64 --mode staged
+"""
+
+import argparse
+import json
+import logging
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+DEFAULT_LEVELS = "1,2,4,8,16,32,64"
+
+
+class ContentionLock:
+    """Lock that counts acquisitions that had to wait, and for how long."""
+
+    def __init__(self, name: str, reentrant: bool = False):
+        self.name = name
+        self._lock = threading.RLock() if reentrant else threading.Lock()
+        self.acquires = 0
+        self.contended = 0
+        self.wait_s = 0.0
+
+    def acquire(self, blocking=True, timeout=-1):
+        if self._lock.acquire(blocking=False):
+            self.acquires += 1
+            return True
+        if not blocking:
+            return False
+        started = time.perf_counter()
+        acquired = self._lock.acquire(True, timeout)
+        if acquired:
+            # counters are only updated while holding the lock
+            self.acquires += 1
+            self.contended += 1
+            self.wait_s += time.perf_counter() - started
+        return acquired
+
+    def release(self):
+        self._lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def stats(self) -> dict:
+        return {"acquires": self.acquires, "contended": self.contended, "wait_s": self.wait_s}
+
+
+def _instrument_locks(predictions_path: Path) -> list[ContentionLock]:
+    from .. import docker_client, prediction_store
+
+    locks = []
+    docker_client._client_lock = ContentionLock("docker_client")
+    docker_client._containers_lock = ContentionLock("container_handles")
+    locks += [docker_client._client_lock, docker_client._containers_lock]
+    journal_lock = ContentionLock("prediction_journal")
+    prediction_store._thread_locks[str(Path(str(predictions_path) + ".lock"))] = journal_lock
+    locks.append(journal_lock)
+    for i, handler in enumerate(logging.getLogger().handlers):
+        handler.lock = ContentionLock(f"logging_handler_{i}", reentrant=True)
+        locks.append(handler.lock)
+    return locks
+
+
+def _sample_threads(stop: threading.Event, peak: list[int]) -> None:
+    while not stop.wait(0.01):
+        peak[0] = max(peak[0], threading.active_count())
+
+
+def run_level(args) -> dict:
+    """Run one concurrency level in this process and return its measurements."""
+    from ..docker_client import set_docker_client
+    from ..instance_index import build_index
+    from ..prediction_store import PredictionStore
+    from ..run_swe_instances import run_predictions
+    from .fake_docker import FakeDockerClient, FakeLatencies
+
+    work_dir = Path(tempfile.mkdtemp(prefix="bench_orchestrator_"))
+    os.environ["AWARE_SWE_CACHE_DIR"] = str(work_dir / "cache")
+    os.environ["AWARE_SWE_INDEX_PATH"] = str(work_dir / "index.sqlite")
+    instance_ids = [f"bench__repo-{i}" for i in range(args.instances or 2 * args.concurrency)]
+    build_index(
+        [
+            {"instance_id": i, "repo": "bench/repo", "base_commit": "0" * 40, "version": "1.0", "problem_statement": "Fix it."}
+            for i in instance_ids
+        ]
+    )
+    latencies = FakeLatencies(
+        run=args.run_ms / 1000,
+        exec=args.exec_ms / 1000,
+        put_archive=args.put_ms / 1000,
+        stop=args.stop_ms / 1000,
+        remove=args.remove_ms / 1000,
+        pull=args.pull_ms / 1000,
+        bootstrap=args.bootstrap_ms / 1000,
+        solve=args.solve_ms / 1000,
+    )
+    set_docker_client(
+        FakeDockerClient(latencies, session_log_bytes=args.session_kb * 1024, diff_bytes=args.diff_kb * 1024)
+    )
+    predictions_path = work_dir / "preds.json"
+    locks = _instrument_locks(predictions_path)
+
+    stage_limits = None
+    if args.mode == "staged":
+        from ..orchestrator import parse_stage_limits
+
+        stage_limits = parse_stage_limits(args.stage_limits, args.concurrency)
+    warm = args.concurrency if args.mode == "warm" else 0
+
+    # resolve the Qodo CLI version (an npm lookup, cached per process) outside the measurement
+    from ..image_cache import get_ready_image_name
+
+    get_ready_image_name(instance_ids[0])
+
+    stop = threading.Event()
+    peak_threads = [threading.active_count()]
+    sampler = threading.Thread(target=_sample_threads, args=(stop, peak_threads), daemon=True)
+    sampler.start()
+    started = time.perf_counter()
+    run_predictions(
+        instance_ids, predictions_path, work_dir / "sessions", args.concurrency, warm, stage_limits=stage_limits
+    )
+    elapsed = time.perf_counter() - started
+    stop.set()
+    sampler.join()
+
+    saved = len(PredictionStore(predictions_path).load())
+    # ru_maxrss is KiB on Linux
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {
+        "concurrency": args.concurrency,
+        "instances": len(instance_ids),
+        "saved": saved,
+        "elapsed_s": elapsed,
+        "instances_per_hour": 3600 * saved / elapsed if elapsed else 0.0,
+        "peak_rss_mb": peak_rss_mb,
+        "peak_threads": peak_threads[0],
+        "locks": {lock.name: lock.stats() for lock in locks},
+    }
+
+
+def _add_level_arguments(parser):
+    parser.add_argument("--mode", choices=("threads", "warm", "staged"), default="threads", help="Runner: plain thread pool, warm container pool, or asyncio staged orchestrator.")
+    parser.add_argument("--instances", type=int, default=0, help="Instances per level (default: 2 x concurrency).")
+    parser.add_argument("--stage_limits", type=str, default=None, help="Per-stage limits for --mode staged (default: concurrency for every stage).")
+    parser.add_argument("--run_ms", type=float, default=50)
+    parser.add_argument("--exec_ms", type=float, default=5)
+    parser.add_argument("--put_ms", type=float, default=10)
+    parser.add_argument("--stop_ms", type=float, default=20)
+    parser.add_argument("--remove_ms", type=float, default=10)
+    parser.add_argument("--pull_ms", type=float, default=0)
+    parser.add_argument("--bootstrap_ms", type=float, default=100)
+    parser.add_argument("--solve_ms", type=float, default=500)
+    parser.add_argument("--session_kb", type=int, default=256, help="Synthetic session log size per instance.")
+    parser.add_argument("--diff_kb", type=int, default=16, help="Synthetic git diff size per instance.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure runner throughput and overhead with a fake Docker backend.")
+    parser.add_argument("--levels", type=str, default=DEFAULT_LEVELS, help="Comma-separated concurrency levels.")
+    parser.add_argument("--concurrency", type=int, default=0, help=argparse.SUPPRESS)
+    parser.add_argument("--json", action="store_true", help="Print one JSON object per level instead of a table.")
+    _add_level_arguments(parser)
+    args = parser.parse_args()
+
+    if args.concurrency:
+        # worker: one level in a fresh process so that peak RSS is per level
+        logging.basicConfig(level=logging.INFO, stream=open(os.devnull, "w"), force=True)
+        print(json.dumps(run_level(args)))
+        return
+
+    forwarded = [a for a in sys.argv[1:] if a != "--json"]
+    if not args.json:
+        print(f"{'conc':>5} {'inst':>5} {'inst/hour':>11} {'elapsed s':>10} {'peak RSS MB':>12} {'threads':>8} {'lock waits':>11} {'wait ms':>9}")
+    for level in (int(x) for x in args.levels.split(",") if x.strip()):
+        output = subprocess.run(
+            [sys.executable, "-m", __spec__.name, *forwarded, "--concurrency", str(level)],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        if args.json:
+            print(json.dumps(result))
+            continue
+        waits = sum(lock["contended"] for lock in result["locks"].values())
+        wait_ms = 1000 * sum(lock["wait_s"] for lock in result["locks"].values())
+        print(
+            f"{result['concurrency']:>5} {result['saved']:>5} {result['instances_per_hour']:>11.0f} "
+            f"{result['elapsed_s']:>10.2f} {result['peak_rss_mb']:>12.1f} {result['peak_threads']:>8} "
+            f"{waits:>11} {wait_ms:>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Benchmark of patch extraction and test-file filtering on very large diffs.
+
+Generates a synthetic `git diff` (source, test and vendored data files) of the
+requested size and compares the previous pipeline, which holds the whole diff
+and rescans every line against each test pattern, with the streaming filter fed
+in exec-sized chunks. Reports wall time and peak Python memory allocated by the
+filtering itself, and checks the two produce the same patch when no caps are set:
+
+    python -m aware_swe_agent.benchmarks.swebench_verified.perf.bench_patch_filter --size_mb 300
+"""
+
+import argparse
+import random
+import time
+import tracemalloc
+
+from ..patch_filter import PatchFilter, PatchFilterRules
+
+EXEC_CHUNK_SIZE = 64 * 1024
+
+
+def _legacy_remove_patches_to_tests(model_patch: str) -> str:
+    lines = model_patch.splitlines(keepends=True)
+    filtered_lines: list[str] = []
+    test_patterns = ["/test/", "/tests/", "/testing/", "test_", "tox.ini"]
+    is_tests = False
+    for line in lines:
+        if line.startswith("diff --git a/"):
+            target_path = line.split()[-1]
+            is_tests = target_path.startswith("b/") and any(p in target_path for p in test_patterns)
+        if not is_tests:
+            filtered_lines.append(line)
+    return "".join(filtered_lines)
+
+
+def _file_diff(path: str, n_lines: int, rng: random.Random) -> str:
+    lines = [
+        f"diff --git a/{path} b/{path}\n",
+        "index 1111111..2222222 100644\n",
+        f"--- a/{path}\n",
+        f"+++ b/{path}\n",
+    ]
+    for start in range(1, n_lines + 1, 20):
+        hunk = min(20, n_lines - start + 1)
+        lines.append(f"@@ -{start},{hunk} +{start},{hunk} @@\n")
+        lines.extend(f"+{'x' * rng.randint(10, 90)} {start + i}\n" for i in range(hunk))
+    return "".join(lines)
+
+
+def make_diff_chunks(size_mb: float, seed: int = 0):
+    """Yield a synthetic diff of about `size_mb` MB as one string per file section."""
+    rng = random.Random(seed)
+    target = int(size_mb * 1024 * 1024)
+    produced = 0
+    i = 0
+    while produced < target:
+        kind = rng.random()
+        if kind < 0.6:
+            section = _file_diff(f"src/pkg/module_{i}.py", rng.randint(5, 200), rng)
+        elif kind < 0.9:
+            section = _file_diff(f"tests/test_module_{i}.py", rng.randint(5, 200), rng)
+        else:
+            section = _file_diff(f"vendor/data_{i}.json", rng.randint(2000, 20000), rng)
+        produced += len(section)
+        i += 1
+        yield section
+
+
+def _measure(func):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark streaming patch filtering against the previous pipeline.")
+    parser.add_argument("--size_mb", type=float, default=100)
+    parser.add_argument("--max_file_mb", type=float, default=1, help="Per-file cap for the capped streaming run.")
+    parser.add_argument("--max_total_mb", type=float, default=10, help="Total cap for the capped streaming run.")
+    args = parser.parse_args()
+
+    # generated up front so that only the filtering is timed; the exec stream delivers fixed-size chunks
+    sections = list(make_diff_chunks(args.size_mb))
+    chunks = [
+        section[offset : offset + EXEC_CHUNK_SIZE]
+        for section in sections
+        for offset in range(0, len(section), EXEC_CHUNK_SIZE)
+    ]
+    del sections
+
+    def legacy():
+        # the previous pipeline held the full diff in memory before filtering it
+        model_patch = "".join(chunks)
+        return _legacy_remove_patches_to_tests(model_patch)
+
+    def streaming(rules):
+        def run():
+            patch_filter = PatchFilter(rules)
+            for chunk in chunks:
+                patch_filter.feed(chunk)
+            return patch_filter.close(), patch_filter.report
+        return run
+
+    legacy_patch, legacy_s, legacy_peak = _measure(legacy)
+    (stream_patch, _), stream_s, stream_peak = _measure(streaming(PatchFilterRules()))
+    capped_rules = PatchFilterRules(
+        max_file_bytes=int(args.max_file_mb * 1024 * 1024),
+        max_total_bytes=int(args.max_total_mb * 1024 * 1024),
+    )
+    (_, capped_report), capped_s, capped_peak = _measure(streaming(capped_rules))
+
+    print(f"diff size: {args.size_mb:.0f} MB, identical output: {legacy_patch == stream_patch}")
+    print(f"{'pipeline':<22} {'seconds':>8} {'peak MB':>9}  (on top of the generated diff)")
+    print(f"{'legacy':<22} {legacy_s:>8.2f} {legacy_peak / 2**20:>9.1f}")
+    print(f"{'streaming':<22} {stream_s:>8.2f} {stream_peak / 2**20:>9.1f}")
+    print(f"{'streaming + caps':<22} {capped_s:>8.2f} {capped_peak / 2**20:>9.1f}")
+    print(
+        f"caps dropped {len(capped_report.oversized_files)} oversized and "
+        f"{len(capped_report.over_total_files)} over-total files"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""
+In-process stand-in for the Docker client used by the pipeline helpers.
+
+Implements the subset of the docker SDK the helpers call (`containers.run/get`,
+`exec_run`, `put_archive`, `commit`, `stop`, `remove`, `images.get/pull/list/remove`,
+`api.exec_create/exec_start/exec_inspect`, `events`, `info`, `df`) with
+configurable latencies, and streams synthetic session logs and diffs of
+configurable size. Install it with `docker_client.set_docker_client`.
+"""
+
+import itertools
+import threading
+import time
+import uuid
+from collections import namedtuple
+from dataclasses import dataclass
+
+import docker
+
+ExecResult = namedtuple("ExecResult", ["exit_code", "output"])
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+@dataclass
+class FakeLatencies:
+    """Seconds spent by each fake API call."""
+
+    run: float = 0.05
+    exec: float = 0.005
+    put_archive: float = 0.01
+    stop: float = 0.02
+    remove: float = 0.01
+    pull: float = 0.0
+    bootstrap: float = 0.1
+    solve: float = 0.5
+
+
+def synthetic_diff(size_bytes: int) -> bytes:
+    """A `git diff` of roughly `size_bytes`, half source files and half test files."""
+    sections = []
+    produced = 0
+    for i in itertools.count():
+        path = f"tests/test_mod_{i}.py" if i % 2 else f"src/mod_{i}.py"
+        body = "".join(f"+line {n} of {path}\n" for n in range(40))
+        section = (
+            f"diff --git a/{path} b/{path}\nindex 1111111..2222222 100644\n"
+            f"--- a/{path}\n+++ b/{path}\n@@ -1,0 +1,40 @@\n{body}"
+        )
+        sections.append(section)
+        produced += len(section)
+        if produced >= size_bytes:
+            break
+    return "".join(sections).encode()
+
+
+class FakeContainer:
+    def __init__(self, client: "FakeDockerClient", image: str, name: str | None = None):
+        self.client = client
+        self.id = uuid.uuid4().hex
+        self.name = name or self.id[:12]
+        self.image = image
+        self.status = "running"
+
+    def exec_run(self, cmd, **kwargs):
+        self.client._sleep(self.client.latencies.exec)
+        command = cmd if isinstance(cmd, str) else " ".join(cmd)
+        if command.startswith("timeout "):
+            # wait_for_bootstrap: returns once the sentinel appears
+            self.client._sleep(self.client.latencies.bootstrap)
+            return ExecResult(0, b"")
+        if command.startswith("cat "):
+            return ExecResult(1, b"cat: No such file or directory\n")
+        if "kill -" in command:
+            # budget stop script: end the streaming execs running in this container now
+            self.client.api._kill_running(self.id)
+            return ExecResult(0, b"")
+        return ExecResult(0, b"")
+
+    def commit(self, repository=None, tag=None, **kwargs):
+        self.client._sleep(self.client.latencies.put_archive)
+        name = f"{repository}:{tag or 'latest'}"
+        with self.client._lock:
+            self.client._images.add(name)
+        return _Image(name)
+
+    def put_archive(self, path, data):
+        transferred = 0
+        for chunk in [data] if isinstance(data, (bytes, bytearray)) else data:
+            transferred += len(chunk)
+        self.client._count("put_archive_bytes", transferred)
+        self.client._sleep(self.client.latencies.put_archive)
+        return True
+
+    def stop(self, **kwargs):
+        self.client._sleep(self.client.latencies.stop)
+        self.status = "exited"
+
+    def remove(self, **kwargs):
+        self.client._sleep(self.client.latencies.remove)
+        with self.client._lock:
+            self.client._containers.pop(self.id, None)
+            self.client._destroyed.add(self.id)
+
+
+class _Containers:
+    def __init__(self, client: "FakeDockerClient"):
+        self.client = client
+
+    def run(self, image, command=None, name=None, detach=False, **kwargs):
+        self.client._sleep(self.client.latencies.run)
+        container = FakeContainer(self.client, image, name)
+        with self.client._lock:
+            self.client._containers[container.id] = container
+        self.client._count("containers_started")
+        return container
+
+    def get(self, container_id):
+        with self.client._lock:
+            container = self.client._containers.get(container_id)
+        if container is None:
+            raise docker.errors.NotFound(f"No such container: {container_id}")
+        return container
+
+    def list(self, **kwargs):
+        with self.client._lock:
+            return list(self.client._containers.values())
+
+
+class _Image:
+    def __init__(self, tag: str):
+        self.tags = [tag]
+        self.id = uuid.uuid5(uuid.NAMESPACE_DNS, tag).hex
+
+
+class _Images:
+    def __init__(self, client: "FakeDockerClient"):
+        self.client = client
+
+    def get(self, name):
+        if not self.client.has_image(name):
+            raise docker.errors.ImageNotFound(f"No such image: {name}")
+        return _Image(name)
+
+    def pull(self, name, **kwargs):
+        self.client._sleep(self.client.latencies.pull)
+        with self.client._lock:
+            self.client._images.add(name)
+        return _Image(name)
+
+    def list(self, **kwargs):
+        with self.client._lock:
+            return [_Image(tag) for tag in self.client._images]
+
+    def remove(self, image, **kwargs):
+        with self.client._lock:
+            self.client._images.discard(image)
+
+
+class _Events:
+    def __init__(self, destroyed: bool):
+        self._destroyed = destroyed
+
+    def __iter__(self):
+        if self._destroyed:
+            yield {"status": "destroy"}
+
+    def close(self):
+        pass
+
+
+class _LowLevelAPI:
+    def __init__(self, client: "FakeDockerClient"):
+        self.client = client
+        self._execs: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def exec_create(self, container, cmd, **kwargs):
+        exec_id = uuid.uuid4().hex
+        command = cmd if isinstance(cmd, str) else " ".join(cmd)
+        with self._lock:
+            self._execs[exec_id] = {"cmd": command, "container": container, "exit_code": None, "running": False, "killed": False}
+        return {"Id": exec_id}
+
+    def _kill_running(self, container_id: str) -> None:
+        with self._lock:
+            for state in self._execs.values():
+                if state["container"] == container_id and state["running"]:
+                    state["killed"] = True
+
+    def _was_killed(self, exec_id: str) -> bool:
+        with self._lock:
+            return self._execs[exec_id]["killed"]
+
+    def exec_start(self, exec_id, stream=False, demux=False, **kwargs):
+        with self._lock:
+            command = self._execs[exec_id]["cmd"]
+            self._execs[exec_id]["running"] = True
+        if " diff" in command:
+            payload, duration = self.client.diff, self.client.latencies.exec
+        elif "qodo " in command:
+            payload, duration = self.client.session_log, self.client.latencies.solve
+        else:
+            payload, duration = b"", self.client.latencies.exec
+        chunks = [payload[i : i + STREAM_CHUNK_SIZE] for i in range(0, len(payload), STREAM_CHUNK_SIZE)]
+
+        def generate():
+            pause = duration / max(len(chunks), 1)
+            if not chunks:
+                self.client._sleep(duration)
+            exit_code = 0
+            for chunk in chunks:
+                self.client._sleep(pause)
+                if self._was_killed(exec_id):
+                    exit_code = 143
+                    break
+                yield (chunk, None) if demux else chunk
+            with self._lock:
+                self._execs[exec_id].update(exit_code=exit_code, running=False)
+
+        if stream:
+            return generate()
+        output = b"".join(chunk[0] if demux else chunk for chunk in generate())
+        return (output, None) if demux else output
+
+    def exec_inspect(self, exec_id):
+        with self._lock:
+            return {"ExitCode": self._execs.pop(exec_id)["exit_code"]}
+
+
+class FakeDockerClient:
+    """Stand-in for `docker.DockerClient` with configurable latencies and payload sizes."""
+
+    def __init__(
+        self,
+        latencies: FakeLatencies | None = None,
+        session_log_bytes: int = 256 * 1024,
+        diff_bytes: int = 16 * 1024,
+        images_present: bool = True,
+        time_scale: float = 1.0,
+    ):
+        self.latencies = latencies or FakeLatencies()
+        self.session_log = (b"agent step output\n" * (session_log_bytes // 18 + 1))[:session_log_bytes]
+        self.diff = synthetic_diff(diff_bytes)
+        self.images_present = images_present
+        self.time_scale = time_scale
+        self.containers = _Containers(self)
+        self.images = _Images(self)
+        self.api = _LowLevelAPI(self)
+        self.counters: dict[str, int] = {}
+        self._containers: dict[str, FakeContainer] = {}
+        self._images: set[str] = set()
+        self._destroyed: set[str] = set()
+        self._lock = threading.Lock()
+
+    def _sleep(self, seconds: float) -> None:
+        if seconds > 0:
+            time.sleep(seconds * self.time_scale)
+
+    def _count(self, key: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def has_image(self, name: str) -> bool:
+        # derived qodo-ready images are never present, so the bootstrap path is exercised
+        if name.startswith("sweb.qodo."):
+            return False
+        with self._lock:
+            return self.images_present or name in self._images
+
+    def events(self, since=None, until=None, filters=None, decode=False):
+        container_id = (filters or {}).get("container")
+        with self._lock:
+            destroyed = container_id in self._destroyed
+        return _Events(destroyed)
+
+    def info(self):
+        return {"DockerRootDir": "/"}
+
+    def df(self):
+        return {"LayersSize": 0}
+
+    def ping(self):
+        self._sleep(self.latencies.exec)
+        return True
+
+    def close(self):
+        pass
@@ -0,0 +1,106 @@
+"""
+Append-only store for predictions.
+
+Workers append one JSON line per prediction to `<predictions>.jsonl` (fsynced,
+under a thread and file lock), instead of re-reading and rewriting the whole
+predictions file for every instance. `compact` folds the journal into the
+`{instance_id: prediction}` JSON file that `_run_swe_harness` reads.
+"""
+
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import portalocker
+except ImportError:
+    portalocker = None
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+_thread_locks: dict[str, threading.Lock] = {}
+_thread_locks_guard = threading.Lock()
+
+
+@contextmanager
+def _locked(lock_path: Path):
+    """Exclusive lock shared by the threads of this process and, via the lock file, other processes."""
+    with _thread_locks_guard:
+        thread_lock = _thread_locks.setdefault(str(lock_path), threading.Lock())
+    with thread_lock:
+        with open(lock_path, "a") as lockfile:
+            if portalocker:
+                portalocker.lock(lockfile, portalocker.LOCK_EX)
+            elif fcntl:
+                fcntl.flock(lockfile, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if portalocker:
+                    portalocker.unlock(lockfile)
+                elif fcntl:
+                    fcntl.flock(lockfile, fcntl.LOCK_UN)
+
+
+class PredictionStore:
+    """Journal of predictions kept next to the harness `predictions_path`."""
+
+    def __init__(self, predictions_path):
+        self.predictions_path = Path(predictions_path)
+        self.journal_path = self.predictions_path.with_suffix(".jsonl")
+        self.lock_path = Path(str(self.predictions_path) + ".lock")
+
+    def append(self, pred: dict) -> None:
+        """Durably record one prediction; later entries for an instance win."""
+        line = (json.dumps(pred) + "\n").encode("utf-8")
+        with _locked(self.lock_path):
+            with open(self.journal_path, "a+b") as f:
+                # keep a truncated line from a killed writer from swallowing this entry
+                if f.tell() > 0:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        line = b"\n" + line
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def load(self) -> dict:
+        """Return all predictions keyed by instance_id, including a previously compacted file."""
+        preds = {}
+        if self.predictions_path.exists():
+            with open(self.predictions_path, "r") as f:
+                data = json.load(f)
+            if isinstance(data, list):
+                data = {pred["instance_id"]: pred for pred in data}
+            preds.update(data)
+        if self.journal_path.exists():
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                for line_number, line in enumerate(f, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        pred = json.loads(line)
+                    except json.JSONDecodeError:
+                        # a worker killed mid-write leaves a truncated last line
+                        logging.warning(f"Skipping unreadable line {line_number} of {self.journal_path}")
+                        continue
+                    preds[pred["instance_id"]] = pred
+        return preds
+
+    def compact(self) -> Path:
+        """Write the merged predictions to `predictions_path` in the format the harness expects."""
+        with _locked(self.lock_path):
+            preds = self.load()
+            tmp_path = self.predictions_path.with_name(self.predictions_path.name + ".tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(preds, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.predictions_path)
+        logging.info(f"Compacted {len(preds)} predictions into {self.predictions_path}")
+        return self.predictions_path
@@ -0,0 +1,261 @@
+"""
+Host-level rate limiting of model API traffic across concurrent solve sessions.
+
+Every agent session calls the model provider on its own, so at high concurrency
+the sessions together overrun the provider quota and all of them back off at
+once. `RateLimiter` holds one token bucket per API key and per model (plus an
+optional default) shared by every session on the host:
+
+- admission: `solve_instance` takes `session_cost` tokens from the buckets of
+  its key and model before it starts the agent, which spreads session starts
+  out under the quota;
+- proxy (optional): `RateLimitProxy` is a local reverse proxy in front of the
+  provider endpoint that takes one token per request, and pauses the buckets
+  for the `Retry-After` of any 429 that still gets through. Each instance is
+  given its own URL prefix so waits are attributed to it.
+
+Time spent waiting is recorded per instance (a `rate_limit` span in the trace,
+and `RateLimiter.summary()`).
+"""
+
+import json
+import logging
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .tracing import record_span
+
+_UNITS = {"s": 1.0, "sec": 1.0, "min": 60.0, "h": 3600.0, "hour": 3600.0}
+_LIMIT_RE = re.compile(r"^(?P<count>\d+(\.\d+)?)/(?P<unit>[a-z]+)(@(?P<burst>\d+(\.\d+)?))?$")
+_PREFIX_RE = re.compile(r"^/i/(?P<instance_id>[^/]+)(?P<path>/.*)?$")
+# retry-after used for 429 responses without the header
+DEFAULT_RETRY_AFTER_S = 5.0
+_HOP_BY_HOP = {"connection", "keep-alive", "proxy-authenticate", "proxy-authorization", "te", "trailers", "transfer-encoding", "upgrade", "host", "content-length"}
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    rate_per_s: float
+    burst: float = 1.0
+
+
+def parse_rate_limits(spec: str) -> dict[str, RateLimit]:
+    """Parse "key:QODO_API_KEY=120/min@10,model:claude-4-sonnet=60/min" into bucket name -> limit.
+
+    Names are `key:<env var holding the key>`, `model:<model>` or `default`; the
+    optional `@N` is the burst size (default 1).
+    """
+    limits = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        name, _, value = item.strip().partition("=")
+        match = _LIMIT_RE.match(value.strip())
+        if not match or match["unit"] not in _UNITS:
+            raise ValueError(f"Invalid rate limit {item!r}, expected e.g. model:claude-4-sonnet=60/min@5")
+        if name != "default" and not name.startswith(("key:", "model:")):
+            raise ValueError(f"Invalid rate limit name {name!r}, expected key:<name>, model:<name> or default")
+        rate = float(match["count"]) / _UNITS[match["unit"]]
+        limits[name] = RateLimit(rate, float(match["burst"] or 1))
+    return limits
+
+
+class TokenBucket:
+    """Token bucket handing out reservations, so waiters are served in arrival order."""
+
+    def __init__(self, limit: RateLimit):
+        self.limit = limit
+        self._tokens = limit.burst
+        self._at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.limit.burst, self._tokens + (now - self._at) * self.limit.rate_per_s)
+        self._at = now
+
+    def reserve(self, tokens: float = 1.0) -> float:
+        """Take `tokens` (possibly going into debt) and return how long the caller must wait."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= tokens
+            return max(0.0, -self._tokens / self.limit.rate_per_s)
+
+    def pause(self, seconds: float) -> None:
+        """Hand out nothing for the next `seconds` (the provider asked us to back off)."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self._tokens, 0.0) - seconds * self.limit.rate_per_s
+
+
+class RateLimiter:
+    """Buckets per API key and per model, shared by every session on the host."""
+
+    def __init__(self, limits: dict[str, RateLimit], session_cost: float = 1.0):
+        self.buckets = {name: TokenBucket(limit) for name, limit in limits.items()}
+        self.session_cost = session_cost
+        self._waits: dict[str, list[float]] = {}
+        self._lock = threading.Lock()
+
+    def _buckets_for(self, key: str, model: str) -> list[TokenBucket]:
+        buckets = [self.buckets[n] for n in (f"key:{key}", f"model:{model}") if n in self.buckets]
+        if not buckets and "default" in self.buckets:
+            buckets.append(self.buckets["default"])
+        return buckets
+
+    def acquire(self, key: str, model: str, tokens: float = 1.0, instance_id: str | None = None) -> float:
+        """Block until `tokens` are available in every bucket of `key` and `model`; returns the wait."""
+        buckets = self._buckets_for(key, model)
+        if not buckets:
+            return 0.0
+        delay = max(bucket.reserve(tokens) for bucket in buckets)
+        if delay > 0:
+            started = time.time()
+            time.sleep(delay)
+            record_span("rate_limit", started, time.time(), instance_id=instance_id, tokens=tokens)
+        with self._lock:
+            waits = self._waits.setdefault(instance_id or "unattributed", [0.0, 0])
+            waits[0] += delay
+            waits[1] += 1
+        return delay
+
+    def admit(self, instance_id: str, key: str, model: str) -> float:
+        """Admission gate for a new solve session."""
+        waited = self.acquire(key, model, self.session_cost, instance_id)
+        if waited > 0:
+            logging.info(f"Rate limit held {instance_id} for {waited:.1f} seconds before solving")
+        return waited
+
+    def back_off(self, key: str, model: str, seconds: float) -> None:
+        for bucket in self._buckets_for(key, model):
+            bucket.pause(seconds)
+
+    def summary(self) -> dict:
+        with self._lock:
+            waits = {i: {"wait_s": w, "acquisitions": n} for i, (w, n) in self._waits.items()}
+        total = sum(w["wait_s"] for w in waits.values())
+        return {
+            "limits": {name: vars(bucket.limit) for name, bucket in self.buckets.items()},
+            "session_cost": self.session_cost,
+            "total_wait_s": total,
+            "instances": waits,
+        }
+
+
+_limiter: RateLimiter | None = None
+_proxy: "RateLimitProxy | None" = None
+_proxy_env: str | None = None
+
+
+def configure_rate_limiter(limiter: RateLimiter | None, proxy: "RateLimitProxy | None" = None, proxy_env: str | None = None) -> None:
+    """Gate every solve session started from now on through `limiter` (None disables).
+
+    With a `proxy`, sessions get its URL in the `proxy_env` environment variable,
+    which must be the agent's setting for the provider base URL.
+    """
+    global _limiter, _proxy, _proxy_env
+    _limiter, _proxy, _proxy_env = limiter, proxy, proxy_env
+
+
+def get_rate_limiter() -> RateLimiter | None:
+    return _limiter
+
+
+def session_env(instance_id: str) -> dict[str, str]:
+    """Environment variables routing a session's API traffic through the proxy."""
+    if _proxy is None or not _proxy_env:
+        return {}
+    return {_proxy_env: _proxy.url_for(instance_id)}
+
+
+class _ProxyHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logging.debug(f"Rate limit proxy: {format % args}")
+
+    def _forward(self):
+        proxy: RateLimitProxy = self.server.proxy
+        match = _PREFIX_RE.match(self.path)
+        instance_id, path = (match["instance_id"], match["path"] or "/") if match else (None, self.path)
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        model = proxy.model
+        try:
+            model = json.loads(body).get("model") or model
+        except (ValueError, AttributeError):
+            pass
+        proxy.limiter.acquire(proxy.key, model, 1.0, instance_id)
+
+        headers = {k: v for k, v in self.headers.items() if k.lower() not in _HOP_BY_HOP}
+        request = urllib.request.Request(proxy.upstream + path, data=body or None, headers=headers, method=self.command)
+        try:
+            response = urllib.request.urlopen(request, timeout=proxy.timeout)
+        except urllib.error.HTTPError as e:
+            response = e
+        except OSError as e:
+            self.send_error(502, f"Upstream unreachable: {e}")
+            return
+        with response:
+            if response.status == 429:
+                retry_after = response.headers.get("Retry-After")
+                try:
+                    seconds = float(retry_after)
+                except (TypeError, ValueError):
+                    seconds = DEFAULT_RETRY_AFTER_S
+                logging.warning(f"Provider returned 429 for {model}, pausing its rate limit for {seconds:.0f} seconds")
+                proxy.limiter.back_off(proxy.key, model, seconds)
+            self.send_response(response.status)
+            for k, v in response.headers.items():
+                if k.lower() not in _HOP_BY_HOP:
+                    self.send_header(k, v)
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            # stream the response, model APIs answer with server-sent events
+            read = getattr(response, "read1", response.read)
+            while chunk := read(64 * 1024):
+                self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _forward
+
+
+class RateLimitProxy:
+    """Local reverse proxy to `upstream` that takes one token per request.
+
+    Instances reach it at `url_for(instance_id)`; the `/i/<instance_id>` prefix is
+    stripped before forwarding. It is unauthenticated, so it listens on
+    `advertise_host` (the Docker bridge) only, not on every interface.
+    """
+
+    def __init__(self, limiter: RateLimiter, upstream: str, key: str, model: str, port: int = 0, advertise_host: str = "172.17.0.1", timeout: float = 600):
+        self.limiter = limiter
+        self.upstream = upstream.rstrip("/")
+        self.key = key
+        self.model = model
+        self.advertise_host = advertise_host
+        self.timeout = timeout
+        self._server = ThreadingHTTPServer((advertise_host, port), _ProxyHandler)
+        self._server.daemon_threads = True
+        self._server.proxy = self
+        self._thread = threading.Thread(target=self._server.serve_forever, name="rate-limit-proxy", daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def url_for(self, instance_id: str) -> str:
+        return f"http://{self.advertise_host}:{self.port}/i/{instance_id}"
+
+    def start(self):
+        self._thread.start()
+        logging.info(f"Rate limit proxy for {self.upstream} listening on {self.advertise_host}:{self.port}")
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
@@ -0,0 +1,78 @@
+"""
+Readiness signals for instance containers.
+
+Instead of fixed sleeps and polling `which qodo` every few seconds, the bootstrap
+command writes its exit status to a sentinel file when it finishes, and a single
+blocking exec inside the container returns as soon as that file appears. Removal
+is confirmed from the Docker `destroy` event of the container.
+"""
+
+import logging
+import time
+
+from .docker_client import get_container
+from .tracing import traced
+
+BOOTSTRAP_STATUS_PATH = "/tmp/.qodo_bootstrap_status"
+BOOTSTRAP_TIMEOUT = 90
+REMOVAL_TIMEOUT = 60
+# exit status of coreutils `timeout` when the deadline is hit
+_TIMEOUT_EXIT_CODE = 124
+
+
+class BootstrapTimeoutError(RuntimeError):
+    """The container bootstrap did not finish in time (usually a sign of an overloaded host)."""
+
+
+def with_status_sentinel(setup_command: str) -> str:
+    """Run `setup_command`, record its exit status in the sentinel file, then keep the container alive."""
+    return (
+        f"{{ {setup_command}; }}; echo $? > {BOOTSTRAP_STATUS_PATH}.tmp && "
+        f"mv {BOOTSTRAP_STATUS_PATH}.tmp {BOOTSTRAP_STATUS_PATH}; sleep 7200"
+    )
+
+
+@traced("bootstrap")
+def wait_for_bootstrap(container_id: str, timeout: float = BOOTSTRAP_TIMEOUT) -> float:
+    """Block until the container bootstrap has finished and return the time waited.
+
+    Raises RuntimeError if the bootstrap failed, BootstrapTimeoutError if it did not
+    finish within `timeout`.
+    """
+    container = get_container(container_id)
+    started = time.monotonic()
+    wait_script = (
+        f"until [ -f {BOOTSTRAP_STATUS_PATH} ]; do sleep 0.05; done; "
+        f"exit $(cat {BOOTSTRAP_STATUS_PATH})"
+    )
+    exit_code, output = container.exec_run(
+        ["timeout", str(int(timeout)), "sh", "-c", wait_script]
+    )
+    elapsed = time.monotonic() - started
+    if exit_code == _TIMEOUT_EXIT_CODE:
+        raise BootstrapTimeoutError(
+            f"Container bootstrap did not finish after {timeout} seconds, container_id {container_id}"
+        )
+    if exit_code != 0:
+        raise RuntimeError(
+            f"Container bootstrap failed with exit code {exit_code}, container_id {container_id}"
+        )
+    return elapsed
+
+
+def wait_for_removal(client, container_id: str, since: int, timeout: float = REMOVAL_TIMEOUT) -> bool:
+    """Wait for the `destroy` event of the container emitted at or after `since`."""
+    events = client.events(
+        since=since,
+        until=int(time.time() + timeout),
+        filters={"container": container_id, "event": "destroy"},
+        decode=True,
+    )
+    try:
+        for _ in events:
+            return True
+    except Exception as e:
+        logging.warning(f"Cannot confirm removal of container {container_id}: {e}")
+    finally:
+        events.close()
+    return False
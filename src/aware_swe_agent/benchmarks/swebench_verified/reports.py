@@ -0,0 +1,69 @@
+"""
+Helpers for SWE-bench harness run reports (`<run_id>.report.json`).
+"""
+
+import json
+import os
+from pathlib import Path
+
+# Mutually exclusive per-instance outcomes, in the harness report's own keys
+STATUS_KEYS = ("resolved_ids", "unresolved_ids", "error_ids", "empty_patch_ids", "incomplete_ids")
+REPORT_SCHEMA_VERSION = 2
+
+
+def load_report(path) -> dict:
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def build_report(statuses: dict[str, str], submitted_ids) -> dict:
+    """Build a harness-style report from instance_id -> status key (one of STATUS_KEYS)."""
+    ids = {key: sorted(i for i, s in statuses.items() if s == key) for key in STATUS_KEYS}
+    completed_ids = sorted(ids["resolved_ids"] + ids["unresolved_ids"])
+    submitted_ids = sorted(set(submitted_ids))
+    return {
+        "total_instances": len(statuses),
+        "submitted_instances": len(submitted_ids),
+        "completed_instances": len(completed_ids),
+        "resolved_instances": len(ids["resolved_ids"]),
+        "unresolved_instances": len(ids["unresolved_ids"]),
+        "empty_patch_instances": len(ids["empty_patch_ids"]),
+        "error_instances": len(ids["error_ids"]),
+        "completed_ids": completed_ids,
+        "incomplete_ids": ids["incomplete_ids"],
+        "empty_patch_ids": ids["empty_patch_ids"],
+        "submitted_ids": submitted_ids,
+        "resolved_ids": ids["resolved_ids"],
+        "unresolved_ids": ids["unresolved_ids"],
+        "error_ids": ids["error_ids"],
+        "schema_version": REPORT_SCHEMA_VERSION,
+    }
+
+
+def report_statuses(report: dict) -> dict[str, str]:
+    """Return instance_id -> status key for every instance mentioned in the report."""
+    statuses = {}
+    for key in STATUS_KEYS:
+        for instance_id in report.get(key, []):
+            statuses[instance_id] = key
+    return statuses
+
+
+def merge_reports(reports) -> dict:
+    """Merge harness reports; for an instance evaluated more than once, the later report wins."""
+    statuses: dict[str, str] = {}
+    submitted: set[str] = set()
+    for report in reports:
+        submitted.update(report.get("submitted_ids", []))
+        statuses.update(report_statuses(report))
+    return build_report(statuses, submitted)
+
+
+def write_report(path, report: dict) -> Path:
+    """Atomically write a report so readers never see a partial file."""
+    path = Path(path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(report, f, indent=4)
+    os.replace(tmp_path, path)
+    return path
@@ -0,0 +1,116 @@
+"""
+Resume an interrupted `aware-swe-run-instances` run from its output directory.
+
+The instance list is reconciled against the predictions journal, the session
+logs and the harness reports already in `logs/run_evaluation/<run_id>`, so only
+missing or failed work is scheduled again. Re-evaluation runs under a fresh run
+id (`<run_id>.resumeN`) and its report is merged into `<run_id>.report.json`.
+"""
+
+import logging
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from .prediction_store import PredictionStore
+from .reports import load_report, merge_reports, report_statuses, write_report
+from .utils import PATCH_ERROR_OUTPUT
+
+# missing: instances without a prediction; failed: instances whose prediction is
+# an empty patch or a container error; all: both
+RESUME_POLICIES = ("missing", "failed", "all")
+_FINAL_STATUSES = ("resolved_ids", "unresolved_ids", "empty_patch_ids")
+
+
+@dataclass
+class ResumePlan:
+    to_predict: list[str] = field(default_factory=list)
+    to_evaluate: list[str] = field(default_factory=list)
+    skipped: dict[str, str] = field(default_factory=dict)
+    previous_reports: list[dict] = field(default_factory=list)
+
+    def log_summary(self) -> None:
+        logging.info(
+            f"Resume plan: {len(self.to_predict)} to predict, {len(self.to_evaluate)} to evaluate, "
+            f"{len(self.skipped)} skipped"
+        )
+        for instance_id, reason in sorted(self.skipped.items()):
+            logging.info(f"Skipping {instance_id}: {reason}")
+
+
+def is_failed_prediction(pred: dict) -> bool:
+    patch = pred.get("model_patch") or ""
+    return not patch.strip() or patch.strip() == PATCH_ERROR_OUTPUT
+
+
+def find_session_log(output_dir, instance_id: str) -> Path | None:
+    for name in (f"session_{instance_id}.txt", f"session_{instance_id}.txt.gz"):
+        path = Path(output_dir) / name
+        if path.exists():
+            return path
+    return None
+
+
+def load_run_reports(output_dir, run_id: str) -> list[dict]:
+    """All harness reports written for the run so far, oldest first."""
+    output_dir = Path(output_dir)
+    paths = list(output_dir.glob(f"{run_id}.*.report.json"))
+    main_report = output_dir / f"{run_id}.report.json"
+    if main_report.exists():
+        paths.append(main_report)
+    paths.sort(key=lambda p: p.stat().st_mtime)
+    reports = []
+    for path in paths:
+        try:
+            reports.append(load_report(path))
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable report {path}: {e}")
+    return reports
+
+
+def plan_resume(instance_ids, output_dir, run_id: str, policy: str = "missing") -> ResumePlan:
+    """Decide which instances still need a prediction or an evaluation."""
+    if policy not in RESUME_POLICIES:
+        raise ValueError(f"Unknown resume policy '{policy}', expected one of {RESUME_POLICIES}")
+    output_dir = Path(output_dir)
+    preds = PredictionStore(output_dir / "preds.json").load()
+    plan = ResumePlan(previous_reports=load_run_reports(output_dir, run_id))
+    statuses = report_statuses(merge_reports(plan.previous_reports)) if plan.previous_reports else {}
+
+    for instance_id in dict.fromkeys(instance_ids):
+        pred = preds.get(instance_id)
+        if pred is None:
+            if policy == "failed":
+                plan.skipped[instance_id] = "no prediction (policy 'failed' only retries failed predictions)"
+                continue
+            if find_session_log(output_dir, instance_id):
+                logging.info(f"{instance_id} has a session log but no prediction, it was interrupted")
+            plan.to_predict.append(instance_id)
+            continue
+        if is_failed_prediction(pred) and policy in ("failed", "all"):
+            plan.to_predict.append(instance_id)
+            continue
+        status = statuses.get(instance_id)
+        if status in _FINAL_STATUSES:
+            plan.skipped[instance_id] = f"already predicted and evaluated ({status.removesuffix('_ids')})"
+        else:
+            plan.to_evaluate.append(instance_id)
+    return plan
+
+
+def next_resume_run_id(output_dir, run_id: str) -> str:
+    attempt = 1
+    while (Path(output_dir) / f"{run_id}.resume{attempt}.report.json").exists():
+        attempt += 1
+    return f"{run_id}.resume{attempt}"
+
+
+def merge_resumed_report(output_dir, run_id: str, plan: ResumePlan, resume_run_id: str) -> Path:
+    """Fold the report of the resumed evaluation into `<run_id>.report.json`."""
+    output_dir = Path(output_dir)
+    reports = list(plan.previous_reports)
+    resume_report = output_dir / f"{resume_run_id}.report.json"
+    if resume_report.exists():
+        reports.append(load_report(resume_report))
+    else:
+        logging.warning(f"No harness report for {resume_run_id}")
+    return write_report(output_dir / f"{run_id}.report.json", merge_reports(reports))
@@ -3,20 +3,26 @@ import sys
 import time
 import logging
 import random
+from contextlib import nullcontext
 from pathlib import Path
 from dotenv import load_dotenv
-import json
 from .utils import (
     get_problem_statement,
     start_container,
     create_agent_toml_in_container,
-    run_command_in_container,
-    get_patch_output_in_container,
-    remove_patches_to_tests,
+    stream_command_in_container,
     stop_container,
-    _run_swe_harness,
     check_resolved_instances,
+    PATCH_ERROR_OUTPUT,
 )
+from .budgets import BudgetGuard, SessionRecord, get_session_budget, record_session
+from .eval_cache import evaluate_with_cache
+from .patch_filter import stream_patch_from_container
+from .readiness import wait_for_bootstrap
+from .prediction_store import PredictionStore
+from .rate_limit import get_rate_limiter, session_env
+from .session_log import SessionLogWriter
+from .tracing import close_tracing, configure_tracing, traced
 
 load_dotenv()
 model = "claude-4-sonnet"
@@ -29,8 +35,9 @@ template_path  = script_dir / "template_qodo_command_swe_agent.toml"
 predictions_path = None
 report_path = None
 
-def predict(instance_id, predictions_path, session_logs_dir=None):
-    import threading
+@traced("provision")
+def provision_container(instance_id):
+    """Start a container for the instance, install the agent TOML and wait for the Qodo CLI."""
     problem_statement = get_problem_statement(instance_id)
     container_id = start_container(instance_id)
     create_agent_toml_in_container(
@@ -41,85 +48,87 @@ def predict(instance_id, predictions_path, session_logs_dir=None):
         agent_command="solve"
     )
 
-    # pull docker for instance, install npm and qodo command
-    time_to_docker_setup = 0
-    while True:
-        which_qodo = run_command_in_container(container_id, "which qodo")
-        if which_qodo:
-            break
-        time_limit = 90
-        if time_to_docker_setup > time_limit:
-            logging.warning(
-                f"Qodo CLI not found in container after {time_limit} seconds, container_id {container_id}, stopping setup"
-            )
-            stop_container(container_id)
-            raise RuntimeError(
-                f"Qodo CLI not found in container after {time_limit} seconds, container_id {container_id}"
-            )
-        iteration_sleep_time = 5
-        time.sleep(iteration_sleep_time)
-        time_to_docker_setup += iteration_sleep_time
+    # wait for the container bootstrap (npm and qodo command install) to finish
+    try:
+        time_to_docker_setup = wait_for_bootstrap(container_id, timeout=90)
+    except RuntimeError as e:
+        logging.warning(f"{e}, stopping setup")
+        stop_container(container_id)
+        raise
     logging.info(
-        f"Qodo CLI setup completed after {time_to_docker_setup} seconds, container_id {container_id}, instance id {instance_id}"
+        f"Qodo CLI setup completed after {time_to_docker_setup:.1f} seconds, container_id {container_id}, instance id {instance_id}"
     )
+    return container_id
 
-    # run prediction for instance
 
+@traced("solve")
+def solve_instance(instance_id, container_id, session_logs_dir=None, session_log_options=None):
+    """Run the Qodo agent in the container, streaming its session log to disk; returns the exit code."""
     load_dotenv()
     QODO_API_KEY = os.getenv("QODO_API_KEY")  # Loaded from .env if running locally
     cmd = f"export QODO_API_KEY={QODO_API_KEY} && qodo solve --ci --model={model} --max_iterations={max_iter} --debug"
-    session = run_command_in_container(container_id, cmd)
-    # save session log
+    for name, value in session_env(instance_id).items():
+        cmd = f"export {name}={value} && {cmd}"
+    limiter = get_rate_limiter()
+    if limiter:
+        limiter.admit(instance_id, "QODO_API_KEY", model)
+    # stream session log to disk
     if session_logs_dir is None:
         session_logs_dir = logs_path
     else:
         session_logs_dir = Path(session_logs_dir)
     session_logs_dir.mkdir(parents=True, exist_ok=True)
     log_path = session_logs_dir / f"session_{instance_id}.txt"
-    with log_path.open("w", encoding="utf-8") as f:
-        f.write("\n")
-        f.write(session)
-    # extract patch of code diffs
-    model_patch = get_patch_output_in_container(container_id)
-    patch = remove_patches_to_tests(model_patch)
-    stop_container(container_id)
-    time.sleep(5)
-    # save pred to shared file (thread-safe)
+    budget = get_session_budget()
+    guard = BudgetGuard(container_id, budget, instance_id) if budget else None
+    started = time.monotonic()
+    with SessionLogWriter(log_path, **(session_log_options or {})) as session_log:
+        session_log.write(b"\n")
+        with guard or nullcontext():
+            exit_code = stream_command_in_container(container_id, cmd, session_log, guard)
+        if guard and guard.exhausted:
+            session_log.write(f"\n[session budget {guard.hit} exhausted, agent stopped]\n".encode())
+    record_session(
+        SessionRecord(instance_id, time.monotonic() - started, session_log.bytes_written, guard.hit if guard else None, exit_code)
+    )
+    logging.info(
+        f"Session for {instance_id} exited with {exit_code}, {session_log.bytes_written} bytes logged to {session_log.path}"
+    )
+    return exit_code
+
+
+@traced("patch")
+def extract_patch(container_id):
+    """Return the agent's code changes in the container, without changes to tests."""
+    try:
+        patch, _ = stream_patch_from_container(container_id)
+    except Exception as e:
+        logging.warning(f"Cannot run git diff command inside container: {e}")
+        return PATCH_ERROR_OUTPUT
+    return patch
+
+
+@traced("save")
+def save_prediction(instance_id, patch, predictions_path):
+    """Append the prediction to the shared predictions journal (thread and process safe)."""
     pred = {
         "instance_id": instance_id,
         "model_patch": patch,
         "model_name_or_path": "swe_eval_qodo_command"
     }
-    lock_path = str(predictions_path) + ".lock"
-    lock = threading.Lock()
-    with lock:
-        # File lock for thread safety
-        try:
-            import portalocker
-        except ImportError:
-            portalocker = None
-        if portalocker:
-            with open(lock_path, "w") as lockfile:
-                portalocker.lock(lockfile, portalocker.LOCK_EX)
-                if predictions_path.exists():
-                    with open(predictions_path, "r") as f:
-                        all_preds = json.load(f)
-                else:
-                    all_preds = {}
-                all_preds[instance_id] = pred
-                with open(predictions_path, "w") as f:
-                    json.dump(all_preds, f, indent=2)
-                portalocker.unlock(lockfile)
-        else:
-            # Fallback: not process-safe, but thread-safe
-            if predictions_path.exists():
-                with open(predictions_path, "r") as f:
-                    all_preds = json.load(f)
-            else:
-                all_preds = {}
-            all_preds[instance_id] = pred
-            with open(predictions_path, "w") as f:
-                json.dump(all_preds, f, indent=2)
+    PredictionStore(predictions_path).append(pred)
+
+
+def predict(instance_id, predictions_path, session_logs_dir=None, container_id=None, session_log_options=None):
+    if container_id is None:
+        container_id = provision_container(instance_id)
+
+    # run prediction for instance
+    solve_instance(instance_id, container_id, session_logs_dir, session_log_options)
+    # extract patch of code diffs
+    patch = extract_patch(container_id)
+    stop_container(container_id)
+    save_prediction(instance_id, patch, predictions_path)
     logging.info(f"Predict for instance {instance_id} completed")
     return
 
@@ -130,13 +139,8 @@ def eval(predictions_path, instance_ids, max_workers=1, run_id=None, report_dir=
     if report_dir is None:
         report_dir = script_dir
     
-    _run_swe_harness(
-        predictions_path=predictions_path,
-        instance_ids=instance_ids,
-        report_dir=report_dir,
-        max_workers=max_workers,
-        run_id=run_id,
-    )
+    PredictionStore(predictions_path).compact()
+    evaluate_with_cache(predictions_path, instance_ids, report_dir, max_workers, run_id)
     logging.info(f"Evaluation for instances {instance_ids} completed")
     return
 
@@ -147,6 +151,8 @@ def main():
     parser = argparse.ArgumentParser(description="Run a single SWE instance.")
     parser.add_argument("instance_id", help="Instance ID to process.")
     parser.add_argument("--run_id", type=str, default=None, help="Run ID for organizing output files.")
+    parser.add_argument("--attempts", type=int, default=1, help="Solve the instance this many times from one provisioned snapshot; resolved if any attempt resolves.")
+    parser.add_argument("--no_early_stop", action="store_true", help="Run every attempt even after one resolves.")
     args = parser.parse_args()
     
     instance_id = args.instance_id
@@ -167,8 +173,17 @@ def main():
     logging.info(f"Using run_id: {args.run_id}")
     logging.info(f"Output directory: {output_dir}")
     
-    predict(instance_id, predictions_path, output_dir)
-    eval(predictions_path, [instance_id], max_workers=1, run_id=args.run_id, report_dir=output_dir)
+    configure_tracing(output_dir / f"{args.run_id}.trace.jsonl")
+    try:
+        if args.attempts > 1:
+            from .attempts import run_attempt_batch
+
+            run_attempt_batch([instance_id], args.attempts, output_dir, args.run_id, early_stop=not args.no_early_stop)
+        else:
+            predict(instance_id, predictions_path, output_dir)
+            eval(predictions_path, [instance_id], max_workers=1, run_id=args.run_id, report_dir=output_dir)
+    finally:
+        close_tracing()
     
     # Debug: Check if report file exists before trying to read it
     if not report_path.exists():
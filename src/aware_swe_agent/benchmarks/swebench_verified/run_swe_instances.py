@@ -1,29 +1,165 @@
 import sys
 import logging
+import json
 import random
+import time
 from pathlib import Path
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from .run_swe_instance import predict, eval
-
-def run_predictions(instance_ids, predictions_path, session_logs_dir, max_concurrency):
-    futures = []
-    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
-        for instance_id in instance_ids:
-            futures.append(executor.submit(predict, instance_id, predictions_path, session_logs_dir))
-        for future in as_completed(futures):
-            try:
-                future.result()
-            except Exception as e:
-                logging.error(f"Prediction failed: {e}")
+from .run_swe_instance import predict, eval, model as agent_model
+from .adaptive_concurrency import AdaptiveConcurrencyController
+from .attempts import run_attempt_batch
+from .budgets import SessionBudget, configure_session_budget, write_budget_summary
+from .container_pool import WarmContainerPool
+from .docker_client import configure_docker_client
+from .eval_cache import configure_eval_cache
+from .image_prefetch import ImagePrefetcher
+from .patch_check import configure_fast_reject
+from .patch_filter import DEFAULT_TEST_PATTERNS, PatchFilterRules, configure_patch_filter
+from .orchestrator import parse_stage_limits, run_staged_predictions
+from .prediction_store import PredictionStore
+from .readiness import BootstrapTimeoutError
+from .rate_limit import RateLimiter, RateLimitProxy, configure_rate_limiter, parse_rate_limits
+from .schedule import SCHEDULES, DurationModel, lpt_order, makespan_report, write_makespan_report
+from .streaming_eval import StreamingEvaluator
+from .tracing import close_tracing, configure_tracing
+from .resume import RESUME_POLICIES, merge_resumed_report, next_resume_run_id, plan_resume
+
+
+def _predict_instance(instance_id, predictions_path, session_logs_dir, session_log_options=None, pool=None, prefetcher=None):
+    if prefetcher:
+        prefetcher.mark_started(instance_id)
+    try:
+        if pool is None:
+            if prefetcher:
+                prefetcher.ensure(instance_id)
+            predict(instance_id, predictions_path, session_logs_dir, session_log_options=session_log_options)
+            return
+        container_id = pool.acquire(instance_id)
+        try:
+            predict(instance_id, predictions_path, session_logs_dir, container_id=container_id, session_log_options=session_log_options)
+        finally:
+            pool.release(instance_id)
+    finally:
+        if prefetcher:
+            prefetcher.mark_finished(instance_id)
+
+
+def _predict_with_slot(controller, instance_id, predictions_path, session_logs_dir, session_log_options=None, prefetcher=None):
+    with controller.slot():
+        try:
+            _predict_instance(instance_id, predictions_path, session_logs_dir, session_log_options, prefetcher=prefetcher)
+        except BootstrapTimeoutError:
+            controller.report_congestion(f"bootstrap timeout for {instance_id}")
+            raise
+
+
+def run_predictions(instance_ids, predictions_path, session_logs_dir, max_concurrency, warm_containers=0, session_log_options=None, stage_limits=None, on_complete=None, prefetcher=None, adaptive=None):
+    """Predict all instances; `on_complete(instance_id)` is called as each prediction is saved.
+
+    With an `AdaptiveConcurrencyController` as `adaptive`, `max_concurrency` threads are
+    started but only as many predictions as the controller's current limit run at once.
+    """
+    if adaptive and (stage_limits or warm_containers > 0):
+        raise ValueError("Adaptive concurrency cannot be combined with stage limits or a warm container pool")
+    # one connection per concurrent API call, including long-lived streaming execs
+    if stage_limits:
+        configure_docker_client(2 * sum(stage_limits.values()))
+    else:
+        configure_docker_client(2 * (max_concurrency + warm_containers))
+    if stage_limits:
+        run_staged_predictions(instance_ids, predictions_path, session_logs_dir, stage_limits, session_log_options, on_complete, prefetcher)
+        return
+    futures = {}
+    pool = None
+    if warm_containers > 0:
+        pool = WarmContainerPool(instance_ids, max_concurrency, warm_containers)
+        pool.start()
+    try:
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            for instance_id in instance_ids:
+                if adaptive:
+                    future = executor.submit(_predict_with_slot, adaptive, instance_id, predictions_path, session_logs_dir, session_log_options, prefetcher)
+                else:
+                    future = executor.submit(_predict_instance, instance_id, predictions_path, session_logs_dir, session_log_options, pool, prefetcher)
+                futures[future] = instance_id
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    logging.error(f"Prediction failed: {e}")
+                    continue
+                if on_complete:
+                    on_complete(futures[future])
+    finally:
+        if pool:
+            pool.close()
 
 def main():
     import argparse
     parser = argparse.ArgumentParser(description="Run multiple SWE instances in parallel.")
     parser.add_argument("instance_ids", nargs='+', help="List of instance IDs to process.")
     parser.add_argument("--max_workers", type=int, default=1, help="Max workers for swebench harness.")
-    parser.add_argument("--max_concurrency", type=int, default=1, help="Max parallel predictions.")
+    parser.add_argument("--max_concurrency", type=int, default=1, help="Max parallel predictions (the upper bound with --adaptive).")
+    parser.add_argument("--adaptive", action="store_true", help="Ramp concurrency between --min_concurrency and --max_concurrency (AIMD) from CPU, memory, disk I/O and Docker daemon latency.")
+    parser.add_argument("--min_concurrency", type=int, default=1, help="Lower bound and starting point for --adaptive.")
+    parser.add_argument("--adapt_interval_s", type=float, default=15, help="Seconds between --adaptive load samples and adjustments.")
+    parser.add_argument("--warm_containers", type=int, default=0, help="Containers to provision ahead of the running predictions (0 disables the warm pool).")
+    parser.add_argument("--stage_limits", type=str, default=None, help="Use the asyncio orchestrator with per-stage limits, e.g. 'pull=4,provision=8,solve=16,patch=4,teardown=8' (unlisted stages default to --max_concurrency).")
+    parser.add_argument("--budget_wall_clock_min", type=float, default=0, help="Stop an agent session after this many minutes, then save its patch (0 disables).")
+    parser.add_argument("--budget_transcript_mb", type=float, default=0, help="Stop an agent session once its transcript reaches this size (0 disables).")
+    parser.add_argument("--budget_idle_min", type=float, default=0, help="Stop an agent session that printed nothing for this many minutes (0 disables).")
+    parser.add_argument("--attempts", type=int, default=1, help="Solve each instance this many times from one provisioned snapshot (pass@k); attempts are evaluated as they finish.")
+    parser.add_argument("--attempt_concurrency", type=int, default=None, help="Parallel attempts per instance (default: --attempts).")
+    parser.add_argument("--no_early_stop", action="store_true", help="Run every attempt even after one resolves (needed for unbiased pass@k).")
+    parser.add_argument("--prefetch_images", type=int, default=0, help="Pull images for this many upcoming instances in the background (0 disables prefetch).")
+    parser.add_argument("--disk_high_watermark", type=float, default=0.85, help="Docker disk usage fraction above which unneeded sweb.eval images are evicted.")
+    parser.add_argument("--disk_low_watermark", type=float, default=0.70, help="Disk usage fraction eviction brings Docker storage back under.")
+    parser.add_argument("--stream_eval", action="store_true", help="Evaluate predictions in micro-batches while other instances are still solving.")
+    parser.add_argument("--eval_batch_size", type=int, default=10, help="Predictions per streaming evaluation micro-batch.")
+    parser.add_argument("--eval_window_s", type=float, default=600, help="Max seconds a prediction waits before its micro-batch is evaluated.")
+    parser.add_argument("--no_eval_cache", action="store_true", help="Evaluate every prediction even if the same patch was evaluated before.")
+    parser.add_argument("--no_fast_reject", action="store_true", help="Send every prediction to the harness, even ones that are empty or do not apply to the base commit.")
+    parser.add_argument("--session_log_compress", action="store_true", help="Gzip session logs while they are written.")
+    parser.add_argument("--session_log_max_mb", type=float, default=0, help="Rotate session logs above this size (0 disables).")
+    parser.add_argument("--session_log_backups", type=int, default=3, help="Rotated session log files to keep.")
+    parser.add_argument("--patch_max_file_mb", type=float, default=0, help="Leave files whose diff is larger than this out of the patch (0 disables).")
+    parser.add_argument("--patch_max_total_mb", type=float, default=0, help="Leave files out once the patch would exceed this size (0 disables).")
+    parser.add_argument("--test_path_patterns", type=str, default=",".join(DEFAULT_TEST_PATTERNS), help="Comma-separated substrings; patched files whose path contains one are removed from the patch.")
+    parser.add_argument("--schedule", choices=SCHEDULES, default="given", help="'lpt' submits the instances expected to take longest first, from the durations of earlier runs; 'given' keeps command-line order.")
+    parser.add_argument("--history_dir", type=str, default=None, help="Run directories whose traces and session logs --schedule lpt learns from (default: logs/run_evaluation).")
+    parser.add_argument("--rate_limits", type=str, default=None, help="Host-wide model API limits shared by all sessions, e.g. 'key:QODO_API_KEY=120/min@10,model:claude-4-sonnet=60/min' (@N is the burst).")
+    parser.add_argument("--rate_limit_session_cost", type=float, default=1.0, help="Tokens a solve session takes from its buckets before it starts.")
+    parser.add_argument("--rate_limit_proxy_upstream", type=str, default=None, help="Also limit every request through a local proxy to this provider base URL.")
+    parser.add_argument("--rate_limit_proxy_env", type=str, default=None, help="Environment variable the agent reads its provider base URL from; set to the proxy URL in each session.")
+    parser.add_argument("--rate_limit_proxy_host", type=str, default="172.17.0.1", help="Address the proxy listens on and containers reach it at (the Docker bridge gateway by default).")
+    parser.add_argument("--rate_limit_proxy_port", type=int, default=0, help="Proxy port (0 picks a free one).")
     parser.add_argument("--run_id", type=str, default=None, help="Run ID for organizing output files.")
+    parser.add_argument("--resume", choices=RESUME_POLICIES, default=None, help="Resume the run given by --run_id: 'missing' predicts instances without a prediction, 'failed' only retries empty or errored patches, 'all' does both. Unevaluated predictions are evaluated.")
     args = parser.parse_args()
+    if args.resume and args.run_id is None:
+        parser.error("--resume requires --run_id")
+    if args.adaptive and (args.stage_limits or args.warm_containers > 0):
+        parser.error("--adaptive cannot be combined with --stage_limits or --warm_containers")
+    if args.adaptive and not 1 <= args.min_concurrency <= args.max_concurrency:
+        parser.error("--adaptive requires 1 <= --min_concurrency <= --max_concurrency")
+    if args.attempts > 1 and (args.stage_limits or args.warm_containers > 0 or args.stream_eval or args.adaptive or args.resume or args.prefetch_images > 0):
+        parser.error("--attempts cannot be combined with --stage_limits, --warm_containers, --stream_eval, --adaptive, --resume or --prefetch_images")
+    stage_limits = None
+    if args.stage_limits:
+        try:
+            stage_limits = parse_stage_limits(args.stage_limits, args.max_concurrency)
+        except ValueError as e:
+            parser.error(str(e))
+    rate_limits = None
+    if args.rate_limits:
+        try:
+            rate_limits = parse_rate_limits(args.rate_limits)
+        except ValueError as e:
+            parser.error(str(e))
+    if args.rate_limit_proxy_upstream and not rate_limits:
+        parser.error("--rate_limit_proxy_upstream requires --rate_limits")
+    if args.rate_limit_proxy_upstream and not args.rate_limit_proxy_env:
+        parser.error("--rate_limit_proxy_upstream requires --rate_limit_proxy_env, otherwise no session is routed through the proxy")
     
     # Generate run_id if not provided
     if args.run_id is None:
@@ -40,8 +176,136 @@ def main():
     logging.info(f"Using run_id: {args.run_id}")
     logging.info(f"Output directory: {output_dir}")
     
-    run_predictions(args.instance_ids, predictions_path, output_dir, args.max_concurrency)
-    eval(predictions_path, args.instance_ids, args.max_workers, args.run_id, output_dir)
+    session_log_options = {
+        "compress": args.session_log_compress,
+        "max_bytes": int(args.session_log_max_mb * 1024 * 1024),
+        "backup_count": args.session_log_backups,
+    }
+    configure_patch_filter(PatchFilterRules(
+        test_patterns=[p for p in args.test_path_patterns.split(",") if p],
+        max_file_bytes=int(args.patch_max_file_mb * 1024 * 1024),
+        max_total_bytes=int(args.patch_max_total_mb * 1024 * 1024),
+    ))
+    budget = SessionBudget(
+        wall_clock_s=args.budget_wall_clock_min * 60,
+        transcript_bytes=int(args.budget_transcript_mb * 1024 * 1024),
+        idle_s=args.budget_idle_min * 60,
+    )
+    configure_session_budget(budget)
+    configure_eval_cache(not args.no_eval_cache)
+    configure_fast_reject(not args.no_fast_reject)
+    instance_ids = args.instance_ids
+    eval_ids = instance_ids
+    eval_run_id = args.run_id
+    plan = None
+    if args.resume:
+        plan = plan_resume(args.instance_ids, output_dir, args.run_id, args.resume)
+        plan.log_summary()
+        instance_ids = plan.to_predict
+        eval_ids = plan.to_predict + plan.to_evaluate
+        eval_run_id = next_resume_run_id(output_dir, args.run_id)
+        if not eval_ids:
+            logging.info("Nothing left to predict or evaluate")
+            return
+
+    given_ids = instance_ids
+    estimates = None
+    if args.schedule == "lpt":
+        estimates = DurationModel.from_logs(args.history_dir or output_dir.parent).estimates(instance_ids)
+        instance_ids = lpt_order(instance_ids, estimates)
+    # predictions that can run at once, for the makespan prediction
+    workers = stage_limits["solve"] if stage_limits else args.max_concurrency
+
+    trace_path = output_dir / f"{eval_run_id}.trace.jsonl"
+    configure_tracing(trace_path)
+    limiter = proxy = None
+    try:
+        if rate_limits:
+            limiter = RateLimiter(rate_limits, args.rate_limit_session_cost)
+            if args.rate_limit_proxy_upstream:
+                proxy = RateLimitProxy(
+                    limiter, args.rate_limit_proxy_upstream, "QODO_API_KEY", agent_model,
+                    port=args.rate_limit_proxy_port, advertise_host=args.rate_limit_proxy_host,
+                )
+                proxy.start()
+            configure_rate_limiter(limiter, proxy, args.rate_limit_proxy_env)
+
+        if args.attempts > 1:
+            attempt_concurrency = args.attempt_concurrency or args.attempts
+            configure_docker_client(2 * args.max_concurrency * attempt_concurrency)
+            report_path = run_attempt_batch(
+                instance_ids, args.attempts, output_dir, eval_run_id, args.max_concurrency, attempt_concurrency,
+                not args.no_early_stop, session_log_options, args.max_workers,
+            )
+            logging.info(f"Attempts report written to {report_path}")
+            return
+
+        prefetcher = None
+        if args.prefetch_images > 0:
+            prefetcher = ImagePrefetcher(
+                instance_ids, args.prefetch_images, args.disk_high_watermark, args.disk_low_watermark
+            )
+            prefetcher.start()
+
+        adaptive = None
+        if args.adaptive:
+            adaptive = AdaptiveConcurrencyController(
+                args.min_concurrency, args.max_concurrency, interval_s=args.adapt_interval_s
+            )
+            adaptive.start()
+
+        started = time.monotonic()
+        if not args.stream_eval:
+            try:
+                run_predictions(instance_ids, predictions_path, output_dir, args.max_concurrency, args.warm_containers, session_log_options, stage_limits, prefetcher=prefetcher, adaptive=adaptive)
+            finally:
+                if adaptive:
+                    adaptive.close()
+                if prefetcher:
+                    prefetcher.close()
+            if estimates:
+                report = makespan_report(instance_ids, given_ids, estimates, workers, time.monotonic() - started, trace_path)
+                write_makespan_report(report, output_dir / f"{eval_run_id}.schedule.json")
+            eval(predictions_path, eval_ids, args.max_workers, eval_run_id, output_dir)
+        else:
+            evaluator = StreamingEvaluator(
+                predictions_path, eval_run_id, output_dir, args.max_workers, args.eval_batch_size, args.eval_window_s,
+                prefetcher.mark_evaluated if prefetcher else None,
+            )
+            evaluator.start()
+            try:
+                if plan:
+                    for instance_id in plan.to_evaluate:
+                        evaluator.submit(instance_id)
+                run_predictions(instance_ids, predictions_path, output_dir, args.max_concurrency, args.warm_containers, session_log_options, stage_limits, evaluator.submit, prefetcher, adaptive)
+                if estimates:
+                    report = makespan_report(instance_ids, given_ids, estimates, workers, time.monotonic() - started, trace_path)
+                    write_makespan_report(report, output_dir / f"{eval_run_id}.schedule.json")
+            finally:
+                if adaptive:
+                    adaptive.close()
+                if prefetcher:
+                    prefetcher.close()
+                report_path = evaluator.close(eval_ids)
+                PredictionStore(predictions_path).compact()
+            logging.info(f"Streaming evaluation report written to {report_path}")
+
+        if plan:
+            report_path = merge_resumed_report(output_dir, args.run_id, plan, eval_run_id)
+            logging.info(f"Merged resumed evaluation into {report_path}")
+    finally:
+        if budget:
+            write_budget_summary(output_dir / f"{eval_run_id}.budgets.json")
+        if limiter:
+            configure_rate_limiter(None)
+            if proxy:
+                proxy.close()
+            summary = limiter.summary()
+            with open(output_dir / f"{eval_run_id}.rate_limits.json", "w") as f:
+                json.dump(summary, f, indent=2)
+            logging.info(f"Sessions waited {summary['total_wait_s']:.0f} seconds in total for the rate limit")
+        close_tracing()
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
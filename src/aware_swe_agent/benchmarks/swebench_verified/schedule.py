@@ -0,0 +1,207 @@
+"""
+Longest-expected-first ordering of a batch from past run durations.
+
+Predictions are handed to the workers in submission order, so a few long
+instances submitted last stretch the batch tail. `DurationModel` learns how long
+each instance took in earlier runs (prediction spans in `*.trace.jsonl`, and
+session log sizes converted to seconds for runs without a trace) and falls back
+to the repo's median, a fit on problem-statement length, or a default for
+instances never seen. `lpt_order` sorts a batch longest-first (LPT, list
+scheduling within 4/3 of the optimal makespan) and `simulate_makespan` predicts
+the batch wall clock for a given number of workers, which `makespan_report`
+compares with the actual run.
+"""
+
+import heapq
+import json
+import logging
+import re
+import statistics
+from collections import defaultdict
+from pathlib import Path
+
+from .instance_index import get_instance
+from .tracing import load_spans
+
+SCHEDULES = ("given", "lpt")
+# spans that together make up one prediction; "eval" is batch level
+PREDICTION_STAGES = frozenset({"pull", "provision", "solve", "patch", "save", "teardown"})
+# stages that may also run ahead of the worker (image prefetch, warm container pool)
+AHEAD_STAGES = frozenset({"pull", "provision"})
+# largest gap between a pull/provision and the next stage for it to count as the worker's own
+CHAIN_GAP_S = 5.0
+DEFAULT_DURATION_S = 900.0
+_SESSION_LOG_RE = re.compile(r"^session_(?P<instance_id>.+?)\.txt(\.gz)?$")
+
+
+def trace_durations(trace_path, chain_gap_s: float = CHAIN_GAP_S) -> dict[str, float]:
+    """Wall clock of each instance's prediction in one trace: first stage start to last stage end.
+
+    Pull and provision spans only count when they lead into the instance's solve
+    chain (ending within `chain_gap_s` of the next stage); prefetched images and
+    warm containers prepared long before the worker picked the instance up do not.
+    """
+    by_instance: dict[str, list[dict]] = defaultdict(list)
+    for s in load_spans(trace_path):
+        if s["name"] in PREDICTION_STAGES and s["depth"] == 0 and s["instance_id"]:
+            by_instance[s["instance_id"]].append(s)
+    durations = {}
+    for instance_id, spans in by_instance.items():
+        chain = [s for s in spans if s["name"] not in AHEAD_STAGES]
+        if not chain:
+            # the prediction never got past provisioning
+            durations[instance_id] = max(s["end"] for s in spans) - min(s["start"] for s in spans)
+            continue
+        start = min(s["start"] for s in chain)
+        for s in sorted((s for s in spans if s["name"] in AHEAD_STAGES), key=lambda s: s["end"], reverse=True):
+            if start - chain_gap_s <= s["end"] <= start + chain_gap_s:
+                start = min(start, s["start"])
+        durations[instance_id] = max(s["end"] for s in chain) - start
+    return durations
+
+
+def _solve_durations(trace_path) -> dict[str, float]:
+    return {s["instance_id"]: s["duration"] for s in load_spans(trace_path) if s["name"] == "solve" and s["instance_id"]}
+
+
+def _session_log_sizes(run_dir: Path) -> dict[str, int]:
+    sizes: dict[str, int] = defaultdict(int)
+    for path in run_dir.glob("session_*.txt*"):
+        # rotated backups (.txt.1, .txt.1.gz) count towards the same session
+        match = _SESSION_LOG_RE.match(re.sub(r"\.txt\.\d+", ".txt", path.name))
+        if match:
+            sizes[match["instance_id"]] += path.stat().st_size
+    return sizes
+
+
+class DurationModel:
+    """Expected prediction wall clock per instance, learned from earlier runs."""
+
+    def __init__(self, observations: dict[str, list[float]], default_s: float = DEFAULT_DURATION_S):
+        self.observations = observations
+        self.default_s = default_s
+        self._repo_medians = None
+        self._length_fit = None
+        self._global_median = None
+
+    @classmethod
+    def from_logs(cls, logs_dir, default_s: float = DEFAULT_DURATION_S) -> "DurationModel":
+        """Learn from every run directory under `logs_dir`."""
+        observations: dict[str, list[float]] = defaultdict(list)
+        # seconds of solve per byte of transcript, for session logs without a trace
+        rates = []
+        untraced: list[tuple[str, int]] = []
+        logs_dir = Path(logs_dir)
+        run_dirs = sorted(p for p in logs_dir.iterdir() if p.is_dir()) if logs_dir.is_dir() else []
+        for run_dir in run_dirs:
+            sizes = _session_log_sizes(run_dir)
+            traced_ids = set()
+            for trace_path in run_dir.glob("*.trace.jsonl"):
+                try:
+                    durations = trace_durations(trace_path)
+                    solves = _solve_durations(trace_path)
+                except OSError as e:
+                    logging.warning(f"Ignoring unreadable trace {trace_path}: {e}")
+                    continue
+                for instance_id, duration in durations.items():
+                    observations[instance_id].append(duration)
+                    traced_ids.add(instance_id)
+                    if sizes.get(instance_id) and instance_id in solves:
+                        rates.append(solves[instance_id] / sizes[instance_id])
+            untraced += [(i, size) for i, size in sizes.items() if i not in traced_ids and size]
+        if rates and untraced:
+            rate = statistics.median(rates)
+            for instance_id, size in untraced:
+                observations[instance_id].append(size * rate)
+        model = cls(dict(observations), default_s)
+        logging.info(
+            f"Duration model: {len(model.observations)} instance(s) with history, "
+            f"{len(untraced) if rates else 0} estimated from session log size"
+        )
+        return model
+
+    def _fit(self):
+        if self._repo_medians is not None:
+            return
+        by_repo: dict[str, list[float]] = defaultdict(list)
+        points = []
+        for instance_id, durations in self.observations.items():
+            row = get_instance(instance_id)
+            if row is None:
+                continue
+            duration = statistics.median(durations)
+            by_repo[row["repo"]].append(duration)
+            points.append((len(row["problem_statement"] or ""), duration))
+        self._repo_medians = {repo: statistics.median(values) for repo, values in by_repo.items()}
+        if self.observations:
+            self._global_median = statistics.median(d for durations in self.observations.values() for d in durations)
+        if len({x for x, _ in points}) >= 2:
+            fit = statistics.linear_regression([x for x, _ in points], [y for _, y in points])
+            self._length_fit = (fit.intercept, fit.slope)
+
+    def estimate(self, instance_id: str) -> tuple[float, str]:
+        """Return (expected seconds, source) where source is instance, repo, problem_size, global or default."""
+        if self.observations.get(instance_id):
+            return statistics.median(self.observations[instance_id]), "instance"
+        self._fit()
+        row = get_instance(instance_id)
+        if row is not None and row["repo"] in self._repo_medians:
+            return self._repo_medians[row["repo"]], "repo"
+        if row is not None and self._length_fit is not None:
+            intercept, slope = self._length_fit
+            estimate = intercept + slope * len(row["problem_statement"] or "")
+            if estimate > 0:
+                return estimate, "problem_size"
+        if self._global_median is not None:
+            return self._global_median, "global"
+        return self.default_s, "default"
+
+    def estimates(self, instance_ids) -> dict[str, tuple[float, str]]:
+        return {instance_id: self.estimate(instance_id) for instance_id in instance_ids}
+
+
+def lpt_order(instance_ids, estimates: dict[str, tuple[float, str]]) -> list[str]:
+    """Longest expected first; ties keep the given order."""
+    return sorted(instance_ids, key=lambda i: -estimates[i][0])
+
+
+def simulate_makespan(ordered_ids, durations: dict[str, float], workers: int) -> float:
+    """Wall clock of greedy list scheduling: each instance goes to the first worker to become free."""
+    free_at = [0.0] * max(workers, 1)
+    for instance_id in ordered_ids:
+        heapq.heappush(free_at, heapq.heappop(free_at) + durations[instance_id])
+    return max(free_at)
+
+
+def makespan_report(ordered_ids, given_ids, estimates, workers: int, actual_s: float | None = None, trace_path=None) -> dict:
+    """Predicted makespan of the chosen and the given order, and the actual one if the run finished."""
+    expected = {i: estimates[i][0] for i in ordered_ids}
+    report = {
+        "workers": workers,
+        "predicted_makespan_s": simulate_makespan(ordered_ids, expected, workers),
+        "predicted_makespan_given_order_s": simulate_makespan(given_ids, expected, workers),
+        "actual_makespan_s": actual_s,
+        "instances": {},
+    }
+    actual = {}
+    if trace_path is not None and Path(trace_path).exists():
+        actual = trace_durations(trace_path)
+    for position, instance_id in enumerate(ordered_ids):
+        report["instances"][instance_id] = {
+            "position": position,
+            "expected_s": expected[instance_id],
+            "source": estimates[instance_id][1],
+            "actual_s": actual.get(instance_id),
+        }
+    return report
+
+
+def write_makespan_report(report: dict, path) -> Path:
+    path = Path(path)
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    summary = f"Predicted makespan {report['predicted_makespan_s']:.0f}s (given order {report['predicted_makespan_given_order_s']:.0f}s)"
+    if report["actual_makespan_s"] is not None:
+        summary += f", actual {report['actual_makespan_s']:.0f}s"
+    logging.info(f"{summary}; schedule written to {path}")
+    return path
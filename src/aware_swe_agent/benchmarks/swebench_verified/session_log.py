@@ -0,0 +1,74 @@
+"""
+Incremental writer for agent session transcripts.
+
+Output of `qodo solve --debug` is written chunk by chunk as it streams out of the
+container, so memory per instance stays constant however long the transcript
+gets. The log can be gzip-compressed on the fly and capped in size, in which case
+it rotates like `logging.handlers.RotatingFileHandler`: the active file always
+holds the most recent output and older output moves to `.1`, `.2`, ...
+"""
+
+import gzip
+import os
+from pathlib import Path
+
+
+class SessionLogWriter:
+    """Binary sink for a session transcript with optional compression and size-capped rotation."""
+
+    def __init__(self, path, compress: bool = False, max_bytes: int = 0, backup_count: int = 3):
+        self.base_path = Path(path)
+        self.compress = compress
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.bytes_written = 0
+        self._current_bytes = 0
+        self._file = None
+
+    @property
+    def path(self) -> Path:
+        return self._rotated_path(0)
+
+    def _rotated_path(self, index: int) -> Path:
+        name = self.base_path.name if index == 0 else f"{self.base_path.name}.{index}"
+        if self.compress:
+            name += ".gz"
+        return self.base_path.with_name(name)
+
+    def _open(self):
+        self.base_path.parent.mkdir(parents=True, exist_ok=True)
+        if self.compress:
+            self._file = gzip.open(self.path, "wb")
+        else:
+            self._file = open(self.path, "wb")
+        self._current_bytes = 0
+
+    def _rotate(self):
+        self._file.close()
+        if self.backup_count > 0:
+            for index in range(self.backup_count - 1, 0, -1):
+                src = self._rotated_path(index)
+                if src.exists():
+                    os.replace(src, self._rotated_path(index + 1))
+            os.replace(self.path, self._rotated_path(1))
+        self._open()
+
+    def write(self, data: bytes) -> None:
+        if self._file is None:
+            self._open()
+        if self.max_bytes and self._current_bytes and self._current_bytes + len(data) > self.max_bytes:
+            self._rotate()
+        self._file.write(data)
+        self._current_bytes += len(data)
+        self.bytes_written += len(data)
+
+    def close(self) -> None:
+        if self._file is None:
+            self._open()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
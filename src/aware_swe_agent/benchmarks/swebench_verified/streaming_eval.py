@@ -0,0 +1,128 @@
+"""
+Pipelined evaluation of predictions while the rest of the batch is still solving.
+
+Completed predictions are queued and handed to the harness in micro-batches,
+flushed when `batch_size` predictions are waiting or the oldest one has waited
+`window_seconds`. Each micro-batch runs under its own run id
+(`<run_id>.eval<NNN>`), and the merged result is rewritten to
+`<run_id>.report.json` after every micro-batch. `on_evaluated` is called with
+the instance ids of every micro-batch the harness has finished.
+"""
+
+import json
+import logging
+import threading
+import time
+from pathlib import Path
+
+from .prediction_store import PredictionStore
+from .reports import load_report, merge_reports, report_statuses, write_report
+from .eval_cache import evaluate_with_cache
+
+
+class StreamingEvaluator:
+    """Background evaluator fed with instance ids as their predictions land."""
+
+    def __init__(self, predictions_path, run_id, report_dir, max_workers=1, batch_size=10, window_seconds=600, on_evaluated=None):
+        self.predictions_path = Path(predictions_path)
+        self.run_id = run_id
+        self.report_dir = Path(report_dir)
+        self.max_workers = max_workers
+        self.batch_size = max(batch_size, 1)
+        self.window_seconds = window_seconds
+        self.on_evaluated = on_evaluated
+        self.report_path = self.report_dir / f"{run_id}.report.json"
+        self.batch_reports: list[dict] = []
+        # (instance_id, submit time), oldest first
+        self._pending: list[tuple[str, float]] = []
+        self._batch_count = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._loop, name="streaming-eval", daemon=True)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def start(self):
+        self._thread.start()
+
+    def submit(self, instance_id: str) -> None:
+        """Queue an instance whose prediction has been saved."""
+        with self._cond:
+            self._pending.append((instance_id, time.monotonic()))
+            self._cond.notify_all()
+
+    def close(self, instance_ids=None) -> Path:
+        """Evaluate whatever is still queued, wait for it and return the merged report path.
+
+        Instances of `instance_ids` that never reached the evaluator are reported as incomplete.
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        reports = list(self.batch_reports)
+        if instance_ids is not None:
+            evaluated = {i for report in reports for i in report_statuses(report)}
+            missing = [i for i in instance_ids if i not in evaluated]
+            if missing:
+                reports.insert(0, {"incomplete_ids": missing})
+        write_report(self.report_path, merge_reports(reports))
+        return self.report_path
+
+    def _next_batch(self) -> list[str] | None:
+        with self._cond:
+            while True:
+                if len(self._pending) >= self.batch_size:
+                    break
+                if self._pending and (
+                    self._closed or time.monotonic() - self._pending[0][1] >= self.window_seconds
+                ):
+                    break
+                if self._closed:
+                    return None
+                if self._pending:
+                    timeout = self.window_seconds - (time.monotonic() - self._pending[0][1])
+                else:
+                    timeout = None
+                self._cond.wait(timeout=timeout)
+            batch = [instance_id for instance_id, _ in self._pending[: self.batch_size]]
+            self._pending = self._pending[self.batch_size :]
+            return batch
+
+    def _loop(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                self._evaluate(batch)
+            except Exception as e:
+                logging.error(f"Streaming evaluation of {batch} failed: {e}")
+                continue
+            if self.on_evaluated:
+                self.on_evaluated(batch)
+
+    def _evaluate(self, instance_ids: list[str]) -> None:
+        self._batch_count += 1
+        batch_run_id = f"{self.run_id}.eval{self._batch_count:03d}"
+        preds = PredictionStore(self.predictions_path).load()
+        batch_preds = {i: preds[i] for i in instance_ids if i in preds}
+        batch_path = self.report_dir / f"preds.eval{self._batch_count:03d}.json"
+        with open(batch_path, "w") as f:
+            json.dump(batch_preds, f, indent=2)
+        logging.info(f"Streaming evaluation {batch_run_id} of {len(instance_ids)} instances")
+        batch_report_path = evaluate_with_cache(batch_path, instance_ids, self.report_dir, self.max_workers, batch_run_id)
+        if not batch_report_path.exists():
+            logging.warning(f"No harness report for {batch_run_id}")
+            return
+        self.batch_reports.append(load_report(batch_report_path))
+        merged = merge_reports(self.batch_reports)
+        write_report(self.report_path, merged)
+        logging.info(
+            f"Streaming evaluation: {merged['resolved_instances']}/{merged['total_instances']} resolved so far"
+        )
@@ -0,0 +1,314 @@
+"""
+Structured timing spans for the prediction pipeline and a run timeline report.
+
+While tracing is configured, every `@traced` helper (image pull, container
+start, agent TOML install, bootstrap, solve, diff, filter, teardown, harness
+eval) appends one JSON line per call to the run's trace. Spans nest per thread
+and inherit the instance id of their parent; spans that only know a container id
+are attributed through `bind_container`. `close_tracing` also writes the trace
+in Chrome trace format (chrome://tracing, Perfetto), one lane per instance, and
+`aware-swe-trace-summary` prints per-stage percentiles and the batch's critical
+path.
+"""
+
+import bisect
+import functools
+import inspect
+import json
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+
+class Tracer:
+    """Append spans of one run to a JSONL file."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "a", buffering=1)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._containers: dict[str, str] = {}
+
+    def _stack(self) -> list[dict]:
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def bind_container(self, container_id: str, instance_id: str) -> None:
+        with self._lock:
+            self._containers[container_id] = instance_id
+
+    def _resolve_instance(self, instance_id, container_id) -> str | None:
+        if instance_id is None and container_id is not None:
+            with self._lock:
+                instance_id = self._containers.get(container_id)
+        if instance_id is None:
+            stack = self._stack()
+            if stack:
+                instance_id = stack[-1]["instance_id"]
+        return instance_id
+
+    def record(self, name: str, start: float, end: float, instance_id=None, container_id=None, **attrs) -> None:
+        stack = self._stack()
+        entry = {
+            "name": name,
+            "instance_id": self._resolve_instance(instance_id, container_id),
+            "parent": stack[-1]["name"] if stack else None,
+            "depth": len(stack),
+            "start": start,
+            "end": end,
+            "duration": end - start,
+            "thread": threading.current_thread().name,
+        }
+        if attrs:
+            entry["attrs"] = attrs
+        line = json.dumps(entry, default=str) + "\n"
+        with self._lock:
+            if not self._file.closed:
+                self._file.write(line)
+
+    @contextmanager
+    def span(self, name: str, instance_id=None, container_id=None, **attrs):
+        """Time the block; the yielded dict can be filled with attributes for the span."""
+        stack = self._stack()
+        frame = {"name": name, "instance_id": self._resolve_instance(instance_id, container_id)}
+        stack.append(frame)
+        start = time.time()
+        try:
+            yield attrs
+        except BaseException as e:
+            attrs["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            stack.pop()
+            self.record(name, start, time.time(), frame["instance_id"], **attrs)
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+_tracer: Tracer | None = None
+
+
+def configure_tracing(trace_path) -> Tracer:
+    """Start writing spans to `trace_path` (JSONL)."""
+    global _tracer
+    close_tracing()
+    _tracer = Tracer(trace_path)
+    logging.info(f"Tracing stages to {trace_path}")
+    return _tracer
+
+
+def get_tracer() -> Tracer | None:
+    return _tracer
+
+
+def close_tracing() -> Path | None:
+    """Stop tracing and write the Chrome trace next to the JSONL; returns its path."""
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is None:
+        return None
+    tracer.close()
+    chrome_path = tracer.path.with_suffix(".chrome.json")
+    write_chrome_trace(load_spans(tracer.path), chrome_path)
+    logging.info(f"Wrote Chrome trace to {chrome_path}")
+    return chrome_path
+
+
+@contextmanager
+def span(name: str, instance_id=None, container_id=None, **attrs):
+    if _tracer is None:
+        yield attrs
+        return
+    with _tracer.span(name, instance_id, container_id, **attrs) as span_attrs:
+        yield span_attrs
+
+
+def record_span(name: str, start: float, end: float, **attrs) -> None:
+    """Record an already measured interval as a child of the current span."""
+    if _tracer is not None:
+        _tracer.record(name, start, end, **attrs)
+
+
+def bind_container(container_id: str, instance_id: str) -> None:
+    if _tracer is not None:
+        _tracer.bind_container(container_id, instance_id)
+
+
+def traced(name: str):
+    """Decorator wrapping every call in a span, picking up `instance_id`/`container_id` arguments."""
+
+    def decorator(func):
+        signature = inspect.signature(func)
+        ids = [p for p in ("instance_id", "container_id") if p in signature.parameters]
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return func(*args, **kwargs)
+            found = {}
+            if ids:
+                bound = signature.bind_partial(*args, **kwargs).arguments
+                found = {p: bound[p] for p in ids if p in bound}
+            with _tracer.span(name, **found):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def load_spans(path) -> list[dict]:
+    spans = []
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                spans.append(json.loads(line))
+            except ValueError:
+                continue
+    return spans
+
+
+def write_chrome_trace(spans: list[dict], path) -> None:
+    """Write complete ("X") events, one thread lane per instance."""
+    lanes: dict[str, int] = {}
+    events = []
+    origin = min((s["start"] for s in spans), default=0.0)
+    for s in sorted(spans, key=lambda s: s["start"]):
+        lane_name = s["instance_id"] or "batch"
+        if lane_name not in lanes:
+            lanes[lane_name] = len(lanes) + 1
+            events.append(
+                {"name": "thread_name", "ph": "M", "pid": 1, "tid": lanes[lane_name], "args": {"name": lane_name}}
+            )
+        events.append(
+            {
+                "name": s["name"],
+                "cat": "stage",
+                "ph": "X",
+                "ts": (s["start"] - origin) * 1e6,
+                "dur": s["duration"] * 1e6,
+                "pid": 1,
+                "tid": lanes[lane_name],
+                "args": {"thread": s["thread"], **s.get("attrs", {})},
+            }
+        )
+    tmp_path = Path(str(path) + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+    tmp_path.replace(path)
+
+
+def _percentile(sorted_values: list[float], q: float) -> float:
+    # nearest-rank percentile
+    return sorted_values[max(0, math.ceil(q * len(sorted_values)) - 1)]
+
+
+def stage_stats(spans: list[dict]) -> dict[str, dict]:
+    durations: dict[str, list[float]] = {}
+    for s in spans:
+        durations.setdefault(s["name"], []).append(s["duration"])
+    stats = {}
+    for name, values in durations.items():
+        values.sort()
+        stats[name] = {
+            "count": len(values),
+            "p50": _percentile(values, 0.50),
+            "p95": _percentile(values, 0.95),
+            "max": values[-1],
+            "total": sum(values),
+        }
+    return stats
+
+
+def _append_wait(path: list[dict], since: float, span: dict) -> None:
+    gap = span["start"] - since
+    if gap > 1e-3:
+        path.append({"name": "wait", "instance_id": span["instance_id"], "start": since, "end": span["start"], "duration": gap})
+
+
+def critical_path(spans: list[dict], tolerance: float = 0.5) -> list[dict]:
+    """Chain of top-level spans, walked back from the last one to finish, that bounds the batch wall clock.
+
+    Each step goes to the latest span that ended before the current one started
+    (preferring the same instance within `tolerance` seconds); gaps between
+    steps are returned as "wait" entries.
+    """
+    top = sorted((s for s in spans if s["depth"] == 0), key=lambda s: s["end"])
+    if not top:
+        return []
+    ends = [s["end"] for s in top]
+    path = []
+    current = top[-1]
+    while True:
+        path.append(current)
+        # spans [0, n) ended before the current one started
+        n = bisect.bisect_right(ends, current["start"] + 1e-6)
+        if n and top[n - 1] is current:
+            n -= 1
+        if n <= 0:
+            break
+        previous = top[n - 1]
+        for i in range(n - 1, -1, -1):
+            if top[i]["end"] < previous["end"] - tolerance:
+                break
+            if top[i]["instance_id"] == current["instance_id"]:
+                previous = top[i]
+                break
+        _append_wait(path, previous["end"], current)
+        current = previous
+    _append_wait(path, min(s["start"] for s in spans), current)
+    path.reverse()
+    return path
+
+
+def summarize(spans: list[dict]) -> str:
+    if not spans:
+        return "No spans recorded."
+    wall = max(s["end"] for s in spans) - min(s["start"] for s in spans)
+    instances = {s["instance_id"] for s in spans if s["instance_id"]}
+    lines = [f"{len(instances)} instance(s), {len(spans)} spans, batch wall clock {wall:.1f}s", ""]
+    lines.append(f"{'stage':<16} {'count':>6} {'p50 s':>9} {'p95 s':>9} {'max s':>9} {'total s':>10}")
+    for name, st in sorted(stage_stats(spans).items(), key=lambda item: -item[1]["total"]):
+        lines.append(
+            f"{name:<16} {st['count']:>6} {st['p50']:>9.2f} {st['p95']:>9.2f} {st['max']:>9.2f} {st['total']:>10.1f}"
+        )
+
+    path = critical_path(spans)
+    if path:
+        lines += ["", "Critical path:"]
+        per_stage: dict[str, float] = {}
+        for s in path:
+            per_stage[s["name"]] = per_stage.get(s["name"], 0.0) + s["duration"]
+        on_path = sum(per_stage.values())
+        for name, seconds in sorted(per_stage.items(), key=lambda item: -item[1]):
+            lines.append(f"  {name:<14} {seconds:>9.1f}s {seconds / wall if wall else 0:>6.0%}")
+        lines.append(f"  {'(covered)':<14} {on_path:>9.1f}s of {wall:.1f}s")
+        lines += ["", "Critical path steps:"]
+        for s in path:
+            lines.append(f"  {s['name']:<14} {s['duration']:>9.1f}s  {s['instance_id'] or '-'}")
+    return "\n".join(lines)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Summarize a run trace: per-stage percentiles and critical path.")
+    parser.add_argument("trace", help="Trace JSONL written by a run (logs/run_evaluation/<run_id>/<run_id>.trace.jsonl).")
+    parser.add_argument("--chrome", type=str, default=None, help="Also (re)write the Chrome trace to this path.")
+    args = parser.parse_args()
+    spans = load_spans(args.trace)
+    if args.chrome:
+        write_chrome_trace(spans, args.chrome)
+    print(summarize(spans))
+
+
+if __name__ == "__main__":
+    main()
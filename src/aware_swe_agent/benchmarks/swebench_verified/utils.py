@@ -2,20 +2,22 @@ import logging
 import docker
 import uuid
 import time
-import tarfile
-import io
 import os
-import tempfile
 import json
 import tomllib
-import subprocess
 import glob
 from pathlib import Path
 from datasets import load_dataset
 from shutil import move
+from .container_files import agent_bundle_files, put_files_in_container
+from .docker_client import forget_container, get_container, get_docker_client
+from .patch_filter import PatchFilterRules, filter_patch, stream_patch_from_container
+from .readiness import with_status_sentinel, wait_for_removal
+from .tracing import bind_container, traced
 
 logging.basicConfig(level=logging.INFO)
-docker_client = docker.from_env()
+# returned in place of a patch when `git diff` cannot be run in the container
+PATCH_ERROR_OUTPUT = "Cannot run git diff command inside container"
 
 
 def get_issue_image_name(instance_id: str) -> str:
@@ -24,31 +26,72 @@ def get_issue_image_name(instance_id: str) -> str:
     return f"swebench/sweb.eval.x86_64.{issue_key}:latest"
 
 
-def start_container(instance_id) -> str:
-    """Start a docker container for the issue."""
+@traced("pull")
+def pull_image(instance_id: str) -> str:
+    """Make sure the image the instance container starts from is available locally."""
+    from .image_cache import get_ready_image_name, image_exists
+
+    client = get_docker_client()
+    ready_image = get_ready_image_name(instance_id)
+    if ready_image and image_exists(client, ready_image):
+        return ready_image
     image_name = get_issue_image_name(instance_id)
-    logging.info(f"Starting container for {instance_id}")
-    client = docker.from_env()
+    if image_exists(client, image_name):
+        return image_name
     logging.info(f"Pulling image {image_name}")
+    client.images.pull(image_name)
     logging.info(f"Finished pulling image {image_name}")
-    logging.info(f"Starting run for {image_name}")
-    
-    # Check if local package exists using glob pattern
+    return image_name
+
+
+def find_local_qodo_package() -> str | None:
+    """Return the path of a local qodo-command-*.tgz, if one is present."""
     # Look in current directory and up one level (since script runs from scripts/test_w_swebench)
     local_packages = glob.glob("qodo-command-*.tgz") + glob.glob("../../qodo-command-*.tgz")
+    return local_packages[0] if local_packages else None
+
+
+def get_bootstrap_command(local_package: str | None) -> str:
+    """Shell command that configures git and installs nodejs and the Qodo CLI in an instance container."""
     install_command = "npm install -g @qodo/command"
-    setup_commands = []
-    
-    # Debug: Log current directory and search results
-    # logging.info(f"Current working directory: {os.getcwd()}")
-    # logging.info(f"Searching for packages in current dir: {glob.glob('qodo-command-*.tgz')}")
-    # logging.info(f"Searching for packages in parent dir: {glob.glob('../../qodo-command-*.tgz')}")
-    # logging.info(f"All found packages: {local_packages}")
+    if local_package:
+        install_command = f"npm install -g /tmp/{os.path.basename(local_package)}"
+    return (
+        "git config --global user.email a && git config --global user.name a && "
+        "git config --global --add safe.directory /testbed && git commit --allow-empty -am qodo && "
+        "curl -fsSL https://deb.nodesource.com/setup_18.x | bash - && apt-get install -y nodejs && "
+        f"{install_command}"
+    )
+
+
+@traced("container_start")
+def start_container(instance_id) -> str:
+    """Start a docker container for the issue."""
+    from .image_cache import get_ready_image_name, image_exists
+
+    image_name = get_issue_image_name(instance_id)
+    logging.info(f"Starting container for {instance_id}")
+    client = get_docker_client()
+
+    ready_image = get_ready_image_name(instance_id)
+    if ready_image and image_exists(client, ready_image):
+        logging.info(f"Using qodo-ready image {ready_image} for {instance_id}")
+        container = client.containers.run(
+            name=f"sweb.qodo.{instance_id}_{uuid.uuid4().hex[:8]}",
+            image=ready_image,
+            detach=True,
+            command=f"bash -c '{with_status_sentinel('true')}'",
+        )
+        bind_container(container.id, instance_id)
+        logging.info(f"Started {container.id} for {instance_id}")
+        return container.id
+
+    pull_image(instance_id)
+    logging.info(f"Starting run for {image_name}")
     
-    if local_packages:
-        local_package = local_packages[0]  # Use the first match
+    local_package = find_local_qodo_package()
+    if local_package:
         logging.info(f"Found local package {local_package}, will install from local file")
-        install_command = f"npm install -g /tmp/{os.path.basename(local_package)}"
     else:
         logging.info("Local package not found, will install from npm registry")
     
@@ -56,25 +99,19 @@ def start_container(instance_id) -> str:
         name=f"sweb.qodo.{instance_id}_{uuid.uuid4().hex[:8]}",
         image=image_name,
         detach=True,
-        command=f"bash -c 'git config --global user.email a && git config --global user.name a && git config --global --add safe.directory /testbed && git commit --allow-empty -am qodo && curl -fsSL https://deb.nodesource.com/setup_18.x | bash - && apt-get install -y nodejs && {install_command} && sleep 7200'",
+        command=f"bash -c '{with_status_sentinel(get_bootstrap_command(local_package))}'",
     )
+    bind_container(container.id, instance_id)
     
-    # If using local package, copy it to the container
-    if local_packages:
-        local_package = local_packages[0]
-        logging.info(f"Attempting to read local package: {local_package}")
+    # If using local package, stream it into the container
+    if local_package:
         try:
-            with open(local_package, 'rb') as f:
-                package_data = f.read()
-            _put_file_in_container(client, container.id, "/tmp", os.path.basename(local_package), package_data)
+            put_files_in_container(container.id, "/tmp", {os.path.basename(local_package): local_package})
             logging.info(f"Successfully copied {local_package} to container /tmp/{os.path.basename(local_package)}")
         except Exception as e:
             logging.error(f"Failed to copy local package {local_package}: {e}")
-            # Fall back to npm registry installation
-            install_command = "npm install -g @qodo/command"
     
     logging.info(f"Finished startup for {image_name}")
-    time.sleep(10)
     container_id = container.id
     assert container_id is not None
     logging.info(f"Started {container_id} for {instance_id}")
@@ -84,19 +121,21 @@ def start_container(instance_id) -> str:
 def remove_container_image(image_name: str) -> None:
     """Remove a docker image."""
     try:
-        client = docker.from_env()
+        client = get_docker_client()
         client.images.remove(image=image_name, force=True)
         logging.info(f"Removed image {image_name}")
     except docker.errors.APIError as e:  # type: ignore
         logging.warning(f"Failed to remove image {image_name}: {e}")
 
 
+@traced("teardown")
 def stop_container(container_id: str, remove_image: str = "") -> None:
     """Stop a docker container for the issue."""
     container = None
+    client = get_docker_client()
     try:
-        client = docker.from_env()
-        container = client.containers.get(container_id)
+        container = get_container(container_id)
+        forget_container(container_id)
     except Exception as e:
         logging.info(f"Container {container_id} not found: {e}")
 
@@ -111,18 +150,18 @@ def stop_container(container_id: str, remove_image: str = "") -> None:
             logging.warning(f"Failed to stop container {container_id}: {e}")
         try:
             logging.info(f"Removing container {container_id}")
+            since = int(time.time())
             container.remove()
-            time.sleep(10)
-            logging.info(f"Removed container {container_id}")
+            if wait_for_removal(client, container_id, since):
+                logging.info(f"Removed container {container_id}")
+            else:
+                logging.warning(f"Removal of container {container_id} not confirmed")
         except docker.errors.NotFound as e:  # type: ignore
             logging.warning(f"Failed to stop container {container_id}: {e}")
         except docker.errors.APIError as e:  # type: ignore
             logging.warning(f"Failed to stop container {container_id}: {e}")
 
     if remove_image:
-        time_sleep = 20
-        logging.info(f"Sleep for {time_sleep} seconds, await for docker setup")
-        time.sleep(time_sleep)
         remove_container_image(remove_image)
 
 
@@ -130,69 +169,49 @@ def get_patch_output_in_container(
     container_id: str, repo_root: Path = Path("/testbed")
 ) -> str:
     """Generate the patch for the prediction using git diff bash command inside a Docker container."""
-    cmd = [
-        "docker",
-        "exec",
-        container_id,
-        "git",
-        "--no-pager",
-        "diff",
-        "HEAD",
-    ]
     try:
-        diff = subprocess.check_output(
-            cmd,
-            text=True,
-            errors="backslashreplace",
+        diff, _ = stream_patch_from_container(
+            container_id, PatchFilterRules(test_patterns=()), repo_root
         )
         return diff
     except Exception as e:
         logging.warning(f"Cannot run git diff command inside container: %s, {e}")
-        return "Cannot run git diff command inside container"
+        return PATCH_ERROR_OUTPUT
 
 
 def remove_patches_to_tests(model_patch: str) -> str:
-    lines = model_patch.splitlines(keepends=True)
-    filtered_lines: list[str] = []
-    test_patterns = ["/test/", "/tests/", "/testing/", "test_", "tox.ini"]
-    is_tests = False
-
-    for line in lines:
-        if line.startswith("diff --git a/"):
-            target_path = line.split()[-1]
-            is_tests = target_path.startswith("b/") and any(
-                p in target_path for p in test_patterns
-            )
-        if not is_tests:
-            filtered_lines.append(line)
-    return "".join(filtered_lines)
-
-
-def _put_file_in_container(client, container_id, dir_path, file_name, data_bytes):
-    tar_stream = io.BytesIO()
-    with tarfile.open(fileobj=tar_stream, mode="w") as tar:
-        tarinfo = tarfile.TarInfo(file_name)
-        tarinfo.size = len(data_bytes)
-        tar.addfile(tarinfo, io.BytesIO(data_bytes))
-    tar_stream.seek(0)
-    client.containers.get(container_id).put_archive(dir_path, tar_stream.read())
-    logging.info(f"Put file {file_name} in container id {container_id}")
+    patch, _ = filter_patch(model_patch, PatchFilterRules())
+    return patch
+
+
+def _put_file_in_container(container_id, dir_path, file_name, data):
+    """Put one blob (bytes) or host file (path) in the container."""
+    put_files_in_container(container_id, dir_path, {file_name: data})
+
+
 
+def get_cache_dir() -> Path:
+    """Directory for persistent caches, overridable with AWARE_SWE_CACHE_DIR."""
+    cache_dir = Path(
+        os.getenv("AWARE_SWE_CACHE_DIR", Path.home() / ".cache" / "aware_swe_agent")
+    )
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    return cache_dir
 
 
 def get_swebench_verified_data():
     return load_dataset("SWE-bench/SWE-bench_Verified", split="test")
 
 def get_problem_statement(instance_id):
-    swebench = get_swebench_verified_data()
-    filtered_instance = [entry for entry in swebench if entry['instance_id'] == instance_id]
-    problem_statement = filtered_instance[0]['problem_statement'] if filtered_instance else None
+    from .instance_index import get_instance
+
+    instance = get_instance(instance_id)
+    problem_statement = instance['problem_statement'] if instance else None
     return problem_statement
 
 
 def run_command_in_container(container_id: str, command: str) -> str:
-    client = docker.from_env()
-    container = client.containers.get(container_id)
+    container = get_container(container_id)
     shell_command = f'bash -c "{command}"'
     if command != "which qodo":
         logging.info(
@@ -210,13 +229,39 @@ def run_command_in_container(container_id: str, command: str) -> str:
     return output_str
 
 
+def stream_command_in_container(container_id: str, command: str, sink, guard=None) -> int | None:
+    """Run a command in the container, writing its output to `sink` as it arrives; returns the exit code.
+
+    An optional `BudgetGuard` is fed with the output and stops the command when a budget runs out.
+    """
+    client = get_docker_client()
+    shell_command = f'bash -c "{command}"'
+    logging.info(
+        f"Streaming command '{shell_command}' in container id {container_id}"
+    )
+    exec_id = client.api.exec_create(
+        container_id, shell_command, stdout=True, stderr=True
+    )["Id"]
+    for chunk in client.api.exec_start(exec_id, stream=True):
+        if guard is not None:
+            guard.on_output(len(chunk))
+            if guard.hit == "transcript_bytes":
+                # drop output past the transcript budget while the command is being stopped
+                continue
+        sink.write(chunk)
+    return client.api.exec_inspect(exec_id).get("ExitCode")
+
+
+@traced("agent_toml")
 def create_agent_toml_in_container(
     container_id: str,
     repo_root: str,
     problem_statement: str,
     template_path: str,
     agent_command: str,
+    bundle_dir: str | None = None,
 ) -> str:
+    """Install the agent TOML (plus an optional bundle of agent TOMLs) and register it in agent.toml."""
     logging.info(
         f"Create agent file, for command {agent_command} and template at {template_path}"
     )
@@ -229,57 +274,41 @@ def create_agent_toml_in_container(
         .replace("{RESEARCH_INSIGHTS}", " ")
     )
     content = content.replace("{repo_root}", "")
-    client = docker.from_env()
     agents_dir = os.path.join(repo_root, "agents")
-    client.containers.get(container_id).exec_run(f"mkdir -p {agents_dir}")
     instance_toml_path = os.path.join(agents_dir, f"{agent_command}.toml")
-    with tempfile.NamedTemporaryFile("w", delete=False) as tmp:
-        tmp.write(content)
-        tmp_path = tmp.name
-    with open(tmp_path, "rb") as f:
-        _put_file_in_container(
-            client, container_id, agents_dir, f"{agent_command}.toml", f.read()
-        )
-    os.unlink(tmp_path)
-    root_agent_toml_path = os.path.join(repo_root, "agent.toml")
     import_path = f"agents/{agent_command}.toml"
-    exit_code, _ = client.containers.get(container_id).exec_run(
-        f"test -f {root_agent_toml_path}"
+    files = dict(agent_bundle_files(bundle_dir)) if bundle_dir else {}
+    files[import_path] = content.encode()
+
+    root_agent_toml_path = os.path.join(repo_root, "agent.toml")
+    new_imports = list(files)
+    imports = new_imports
+    version = "1.0"
+    exit_code, output = get_container(container_id).exec_run(
+        f"cat {root_agent_toml_path}"
     )
-    if exit_code != 0:
+    if exit_code == 0:
+        try:
+            data = tomllib.loads(output.decode())
+            imports = data.get("imports", [])
+            imports.extend(i for i in new_imports if i not in imports)
+            version = data.get("version", "1.0")
+        except Exception as e:
+            print(f"Failed to parse agent.toml in container: {e}")
+            imports = None
+    if imports is not None:
         root_content = (
             "# Version of the agent configuration standard\n"
-            'version = "1.0"\n'
-            f'imports = ["{import_path}"]\n'
-        )
-        _put_file_in_container(
-            client, container_id, repo_root, "agent.toml", root_content.encode()
-        )
-    else:
-        exit_code, output = client.containers.get(container_id).exec_run(
-            f"cat {root_agent_toml_path}"
+            f'version = "{version}"\n'
+            f"imports = {json.dumps(imports)}\n"
         )
-        if exit_code == 0:
-            try:
-                import io
-                data = tomllib.load(io.BytesIO(output))
-                imports = data.get("imports", [])
-                if import_path not in imports:
-                    imports.append(import_path)
-                version = data.get("version", "1.0")
-                root_content = (
-                    "# Version of the agent configuration standard\n"
-                    f'version = "{version}"\n'
-                    f"imports = {json.dumps(imports)}\n"
-                )
-                _put_file_in_container(
-                    client, container_id, repo_root, "agent.toml", root_content.encode()
-                )
-            except Exception as e:
-                print(f"Failed to parse agent.toml in container: {e}")
+        files["agent.toml"] = root_content.encode()
+    # the agent TOML, the optional bundle and agent.toml go in as one archive
+    put_files_in_container(container_id, repo_root, files)
     return instance_toml_path
 
 
+@traced("eval")
 def _run_swe_harness(
     predictions_path: Path,
     instance_ids: list[str] | None,
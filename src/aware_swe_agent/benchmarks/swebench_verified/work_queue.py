@@ -0,0 +1,391 @@
+"""
+Durable work queue for spreading one run over many Docker hosts.
+
+A coordinator publishes the run's instance ids; workers on any host lease one
+instance at a time, keep the lease alive with heartbeats while it is solved, and
+write the prediction and session log into the run directory on shared storage.
+A lease that is not renewed (the host died) expires and the instance goes back
+to the queue, up to `max_attempts` leases.
+
+`SQLiteWorkQueue` keeps the queue in a SQLite file next to the run on shared
+storage, with every transaction under the same lock file scheme as the
+prediction journal, since SQLite's own locking is unreliable on network file
+systems. `InMemoryWorkQueue` is a single-process stand-in with the same API.
+"""
+
+import argparse
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+from .prediction_store import _locked
+from .schedule import SCHEDULES, DurationModel, lpt_order
+
+DEFAULT_LEASE_S = 300
+DEFAULT_MAX_ATTEMPTS = 3
+STATES = ("queued", "leased", "done", "failed")
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+class InMemoryWorkQueue:
+    """Work queue held in this process; stands in for a broker in tests and single-host runs."""
+
+    def __init__(self, max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        self.max_attempts = max_attempts
+        self._tasks: dict[str, dict[str, dict]] = {}
+        self._lock = threading.Lock()
+
+    def publish(self, run_id: str, instance_ids) -> int:
+        """Queue instances not already in the run; returns how many were added."""
+        with self._lock:
+            tasks = self._tasks.setdefault(run_id, {})
+            added = 0
+            for instance_id in instance_ids:
+                if instance_id not in tasks:
+                    tasks[instance_id] = {"state": "queued", "worker": None, "lease_expires": 0.0, "attempts": 0, "error": None}
+                    added += 1
+            return added
+
+    def _expire(self, tasks: dict, now: float) -> list[str]:
+        expired = []
+        for instance_id, task in tasks.items():
+            if task["state"] == "leased" and task["lease_expires"] < now:
+                task["state"] = "queued" if task["attempts"] < self.max_attempts else "failed"
+                task["error"] = f"lease of {task['worker']} expired"
+                expired.append(instance_id)
+        return expired
+
+    def lease(self, run_id: str, worker_id: str, lease_s: float = DEFAULT_LEASE_S) -> str | None:
+        now = time.time()
+        with self._lock:
+            tasks = self._tasks.get(run_id, {})
+            self._expire(tasks, now)
+            for instance_id, task in tasks.items():
+                if task["state"] == "queued":
+                    task.update(state="leased", worker=worker_id, lease_expires=now + lease_s, attempts=task["attempts"] + 1)
+                    return instance_id
+        return None
+
+    def heartbeat(self, run_id: str, instance_id: str, worker_id: str, lease_s: float = DEFAULT_LEASE_S) -> bool:
+        with self._lock:
+            task = self._tasks.get(run_id, {}).get(instance_id)
+            if not task or task["state"] != "leased" or task["worker"] != worker_id:
+                return False
+            task["lease_expires"] = time.time() + lease_s
+            return True
+
+    def complete(self, run_id: str, instance_id: str, worker_id: str, error: str | None = None) -> None:
+        """Mark a leased instance done, or on error re-queue it until it runs out of attempts."""
+        with self._lock:
+            task = self._tasks.get(run_id, {}).get(instance_id)
+            if not task or task["worker"] != worker_id or task["state"] != "leased":
+                return
+            if error is None:
+                task.update(state="done", error=None)
+            else:
+                task.update(state="queued" if task["attempts"] < self.max_attempts else "failed", error=error)
+
+    def requeue_expired(self, run_id: str) -> list[str]:
+        with self._lock:
+            return self._expire(self._tasks.get(run_id, {}), time.time())
+
+    def tasks(self, run_id: str) -> dict[str, dict]:
+        with self._lock:
+            return {instance_id: dict(task) for instance_id, task in self._tasks.get(run_id, {}).items()}
+
+
+class SQLiteWorkQueue:
+    """Work queue in a SQLite file on storage shared by all hosts."""
+
+    def __init__(self, path, max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        self.max_attempts = max_attempts
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.lock_path = Path(str(self.path) + ".lock")
+        with self._transaction() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS tasks ("
+                "run_id TEXT, instance_id TEXT, state TEXT, worker TEXT, lease_expires REAL, "
+                "attempts INTEGER, error TEXT, seq INTEGER, PRIMARY KEY (run_id, instance_id))"
+            )
+
+    @contextmanager
+    def _transaction(self):
+        # a fresh connection per transaction: workers are threads and hosts, and the
+        # rollback journal (not WAL) is the mode that works on network file systems
+        with _locked(self.lock_path):
+            conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    yield conn
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+            finally:
+                conn.close()
+
+    def publish(self, run_id: str, instance_ids) -> int:
+        with self._transaction() as conn:
+            start = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM tasks WHERE run_id = ?", (run_id,)).fetchone()[0]
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO tasks VALUES (?, ?, 'queued', NULL, 0, 0, NULL, ?)",
+                [(run_id, instance_id, start + i + 1) for i, instance_id in enumerate(instance_ids)],
+            )
+            return conn.total_changes - before
+
+    def _expire_sql(self, conn, run_id: str, now: float) -> list[str]:
+        rows = conn.execute(
+            "SELECT instance_id, worker, attempts FROM tasks WHERE run_id = ? AND state = 'leased' AND lease_expires < ?",
+            (run_id, now),
+        ).fetchall()
+        for row in rows:
+            state = "queued" if row["attempts"] < self.max_attempts else "failed"
+            conn.execute(
+                "UPDATE tasks SET state = ?, error = ? WHERE run_id = ? AND instance_id = ?",
+                (state, f"lease of {row['worker']} expired", run_id, row["instance_id"]),
+            )
+        return [row["instance_id"] for row in rows]
+
+    def lease(self, run_id: str, worker_id: str, lease_s: float = DEFAULT_LEASE_S) -> str | None:
+        now = time.time()
+        with self._transaction() as conn:
+            self._expire_sql(conn, run_id, now)
+            row = conn.execute(
+                "SELECT instance_id FROM tasks WHERE run_id = ? AND state = 'queued' ORDER BY seq LIMIT 1",
+                (run_id,),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE tasks SET state = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1 "
+                "WHERE run_id = ? AND instance_id = ?",
+                (worker_id, now + lease_s, run_id, row["instance_id"]),
+            )
+            return row["instance_id"]
+
+    def heartbeat(self, run_id: str, instance_id: str, worker_id: str, lease_s: float = DEFAULT_LEASE_S) -> bool:
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE tasks SET lease_expires = ? WHERE run_id = ? AND instance_id = ? AND state = 'leased' AND worker = ?",
+                (time.time() + lease_s, run_id, instance_id, worker_id),
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, run_id: str, instance_id: str, worker_id: str, error: str | None = None) -> None:
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT attempts FROM tasks WHERE run_id = ? AND instance_id = ? AND state = 'leased' AND worker = ?",
+                (run_id, instance_id, worker_id),
+            ).fetchone()
+            if row is None:
+                return
+            state = "done" if error is None else ("queued" if row["attempts"] < self.max_attempts else "failed")
+            conn.execute(
+                "UPDATE tasks SET state = ?, error = ? WHERE run_id = ? AND instance_id = ?",
+                (state, error, run_id, instance_id),
+            )
+
+    def requeue_expired(self, run_id: str) -> list[str]:
+        with self._transaction() as conn:
+            return self._expire_sql(conn, run_id, time.time())
+
+    def tasks(self, run_id: str) -> dict[str, dict]:
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT instance_id, state, worker, lease_expires, attempts, error FROM tasks WHERE run_id = ? ORDER BY seq",
+                (run_id,),
+            ).fetchall()
+        return {row["instance_id"]: {k: row[k] for k in row.keys() if k != "instance_id"} for row in rows}
+
+
+_memory_queue = InMemoryWorkQueue()
+
+
+def get_work_queue(url: str, max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+    """`memory://` for the in-process stand-in, otherwise a path (or sqlite:///path) to the queue file."""
+    if url == "memory://":
+        _memory_queue.max_attempts = max_attempts
+        return _memory_queue
+    if url.startswith("sqlite:///"):
+        # sqlite:///relative/path and sqlite:////absolute/path, as in SQLAlchemy URLs
+        url = url[len("sqlite:///") :]
+    return SQLiteWorkQueue(url, max_attempts)
+
+
+def summarize_tasks(tasks: dict[str, dict]) -> dict[str, int]:
+    counts = {state: 0 for state in STATES}
+    for task in tasks.values():
+        counts[task["state"]] += 1
+    return counts
+
+
+class _Heartbeat:
+    """Renews the leases held by one worker until they are released."""
+
+    def __init__(self, queue, run_id: str, worker_id: str, lease_s: float):
+        self.queue = queue
+        self.run_id = run_id
+        self.worker_id = worker_id
+        self.lease_s = lease_s
+        self._held: set[str] = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="lease-heartbeat", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def hold(self, instance_id: str) -> None:
+        with self._lock:
+            self._held.add(instance_id)
+
+    def release(self, instance_id: str) -> None:
+        with self._lock:
+            self._held.discard(instance_id)
+
+    def _loop(self):
+        while not self._stop.wait(self.lease_s / 3):
+            with self._lock:
+                held = list(self._held)
+            for instance_id in held:
+                try:
+                    if not self.queue.heartbeat(self.run_id, instance_id, self.worker_id, self.lease_s):
+                        logging.warning(f"Lease on {instance_id} was lost; another worker may pick it up")
+                        self.release(instance_id)
+                except Exception as e:
+                    logging.warning(f"Heartbeat for {instance_id} failed: {e}")
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def run_worker(
+    queue,
+    run_id: str,
+    output_dir,
+    max_concurrency: int = 1,
+    lease_s: float = DEFAULT_LEASE_S,
+    poll_s: float = 10.0,
+    worker_id: str | None = None,
+    session_log_options=None,
+    predict_fn=None,
+) -> int:
+    """Lease and predict instances of `run_id` until none are queued or leased; returns how many this worker finished."""
+    if predict_fn is None:
+        from .docker_client import configure_docker_client
+        from .run_swe_instance import predict as predict_fn
+
+        configure_docker_client(2 * max_concurrency)
+    worker_id = worker_id or default_worker_id()
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    predictions_path = output_dir / "preds.json"
+    heartbeat = _Heartbeat(queue, run_id, worker_id, lease_s)
+    heartbeat.start()
+    finished = [0]
+    finished_lock = threading.Lock()
+    logging.info(f"Worker {worker_id} joined run {run_id} with {max_concurrency} slot(s)")
+
+    def slot():
+        while True:
+            instance_id = queue.lease(run_id, worker_id, lease_s)
+            if instance_id is None:
+                counts = summarize_tasks(queue.tasks(run_id))
+                if counts["queued"] == 0 and counts["leased"] == 0:
+                    return
+                # other hosts still hold leases that may expire and come back
+                time.sleep(poll_s)
+                continue
+            heartbeat.hold(instance_id)
+            logging.info(f"Worker {worker_id} leased {instance_id}")
+            error = None
+            try:
+                predict_fn(instance_id, predictions_path, output_dir, session_log_options=session_log_options)
+            except Exception as e:
+                logging.error(f"Prediction failed for {instance_id}: {e}")
+                error = f"{type(e).__name__}: {e}"
+            finally:
+                heartbeat.release(instance_id)
+            queue.complete(run_id, instance_id, worker_id, error)
+            if error is None:
+                with finished_lock:
+                    finished[0] += 1
+
+    threads = [threading.Thread(target=slot, name=f"worker-slot-{i}") for i in range(max_concurrency)]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        heartbeat.close()
+    logging.info(f"Worker {worker_id} finished {finished[0]} instance(s) of run {run_id}")
+    return finished[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distribute a SWE-bench run over several hosts through a shared work queue.")
+    parser.add_argument("--run_id", required=True)
+    parser.add_argument("--output_root", type=str, default=None, help="Shared directory holding run directories (default: logs/run_evaluation next to this package).")
+    parser.add_argument("--queue", type=str, default=None, help="Queue URL: a SQLite path on shared storage (default: <output_root>/queue.sqlite) or memory://.")
+    parser.add_argument("--max_attempts", type=int, default=DEFAULT_MAX_ATTEMPTS, help="Leases per instance before it is marked failed.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    publish = subparsers.add_parser("publish", help="Queue instances for the run.")
+    publish.add_argument("instance_ids", nargs="+")
+    publish.add_argument("--schedule", choices=SCHEDULES, default="given", help="'lpt' queues the instances expected to take longest first.")
+    publish.add_argument("--history_dir", type=str, default=None, help="Run directories --schedule lpt learns durations from (default: --output_root).")
+    work = subparsers.add_parser("work", help="Lease and predict instances until the run is drained.")
+    work.add_argument("--max_concurrency", type=int, default=1)
+    work.add_argument("--lease_s", type=float, default=DEFAULT_LEASE_S, help="Lease length; renewed every third of it while solving.")
+    work.add_argument("--poll_s", type=float, default=10.0, help="Wait between lease attempts while other hosts hold the remaining instances.")
+    subparsers.add_parser("status", help="Show queue state for the run.")
+    evaluate = subparsers.add_parser("eval", help="Evaluate the finished predictions of the run.")
+    evaluate.add_argument("--max_workers", type=int, default=1)
+    args = parser.parse_args()
+
+    output_root = Path(args.output_root) if args.output_root else Path(__file__).parent.resolve() / "logs" / "run_evaluation"
+    output_dir = output_root / args.run_id
+    queue = get_work_queue(args.queue or str(output_root / "queue.sqlite"), args.max_attempts)
+
+    if args.command == "publish":
+        instance_ids = args.instance_ids
+        if args.schedule == "lpt":
+            estimates = DurationModel.from_logs(args.history_dir or output_root).estimates(instance_ids)
+            instance_ids = lpt_order(instance_ids, estimates)
+        added = queue.publish(args.run_id, instance_ids)
+        print(f"Queued {added} new instance(s) for run {args.run_id}")
+    elif args.command == "work":
+        run_worker(queue, args.run_id, output_dir, args.max_concurrency, args.lease_s, args.poll_s)
+    elif args.command == "status":
+        queue.requeue_expired(args.run_id)
+        tasks = queue.tasks(args.run_id)
+        print(", ".join(f"{state}: {count}" for state, count in summarize_tasks(tasks).items()))
+        now = time.time()
+        for instance_id, task in tasks.items():
+            if task["state"] == "leased":
+                print(f"  {instance_id}: leased by {task['worker']}, expires in {task['lease_expires'] - now:.0f}s")
+            elif task["state"] == "failed":
+                print(f"  {instance_id}: failed after {task['attempts']} attempt(s): {task['error']}")
+    elif args.command == "eval":
+        from .run_swe_instance import eval
+
+        done = [i for i, task in queue.tasks(args.run_id).items() if task["state"] == "done"]
+        eval(output_dir / "preds.json", done, args.max_workers, args.run_id, output_dir)
+
+
+if __name__ == "__main__":
+    main()